@@ -1,100 +1,651 @@
+import asyncio
+import base64
+import json
 import os
-from typing import List
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+from fastapi import FastAPI, HTTPException, File, Query, Request, UploadFile, Form
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+from pydantic import ValidationError
+from api.responses import accepts, image_response, multipart_response, sse_message
+from api.schemas import (
+    FontCoverageResponse,
+    FontResponse,
+    OfferRequest,
+    OfferResponse,
+    OfferTextsRequest,
+    OfferTextsResponse,
+    RenderRequest,
+    RenderResponse,
+)
 from configs.config import Config
-from generators.image_generator import ImageGenerator
-from generators.text_generator import TextGenerator
-from models import TextStyle
-from services.image_processor import ImageProcessor
-from services.offer_generator_service import OfferGeneratorService
+from contaracts.ai_contract import is_fallback
+from services.batch import TextPrefetcher, iter_jsonl_items, to_ndjson
+from services.container import ServiceContainer
+from services.derivatives import DERIVATIVE_FORMATS
+from services.font_cache import font_cache
+from services.font_registry import FontError, FontTooLargeError, font_registry
+from services.generation_cache import generation_cache_stats
+from services.image_cache import CachedImage, make_etag
+from services.jobs import JobLimitError
+from services.metrics import cache_families, registry
+from services.text_layout import glyph_metrics_cache
+from services.text_mask_cache import text_mask_cache
 
-app = FastAPI()
 
-# Initialize services
-text_generator = TextGenerator(service_name=Config.AI_SERVICE)
-image_generator = ImageGenerator(service_name=Config.AI_SERVICE)
-image_processor = ImageProcessor()
-offer_service = OfferGeneratorService(text_generator, image_generator, image_processor)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if Config.WARM_UP_SERVICES:
+        await run_in_threadpool(services.warm_up)
+    await run_in_threadpool(services.start)
+    retention = None
+    if Config.IMAGE_GC_ENABLED:
+        retention = asyncio.create_task(
+            services.collect_images_periodically(Config.IMAGE_GC_INTERVAL)
+        )
+    yield
+    if retention is not None:
+        retention.cancel()
+    await services.ashutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+async def create_offer(
+    offer_request: OfferRequest, wait: bool = Config.IMAGE_WRITER_WAIT
+) -> OfferResponse:
+    offer_service = services.offer_service
+    style = offer_request.to_text_style()
+    offer_text, generated_image = await offer_service.agenerate_text_and_image(
+        offer_request.prompt,
+        offer_request.word_limit,
+        cache_mode=offer_request.cache_mode,
+    )
+    # Reserved once the generated image is decoded, not while waiting on the
+    # providers, and held through the overlay until both images are encoded,
+    # after which the decoded buffers are released.
+    async with services.memory_budget.areserve():
+        initial_image, final_image = await offer_service.arender_offer(
+            generated_image, offer_text, style
+        )
+        del generated_image
 
+        # Handing off to the writer blocks while its queue is full, and writing
+        # blocks when IMAGE_WRITER_WAIT is set; keep both off the event loop.
+        async with services.limiter.limit("save"):
+            initial_image_filename, final_image_filename = await run_in_threadpool(
+                services.image_processor.save_offer_images,
+                initial_image,
+                final_image,
+                wait,
+            )
+        fallback = [
+            stage
+            for stage, result in (("text", offer_text), ("image", initial_image))
+            if is_fallback(result)
+        ]
+        del initial_image, final_image
 
-class OfferRequest(BaseModel):
-    prompt: str
-    word_limit: int = Config.DEFAULT_WORD_LIMIT
-    font_name: str = Config.DEFAULT_FONT
-    font_size: int = Config.DEFAULT_FONT_SIZE
-    position: str = Config.DEFAULT_TEXT_POSITION
-    text_color: str = Config.DEFAULT_TEXT_COLOR
-    bg_color: str = Config.DEFAULT_BG_COLOR
-    bg_opacity: float = Config.DEFAULT_BG_OPACITY
+    response = OfferResponse(
+        offer_text=offer_text,
+        initial_image_url=f"/images/{initial_image_filename}",
+        final_image_url=f"/images/{final_image_filename}",
+        fallback=fallback or None,
+    )
+    if offer_request.response_mode == "inline":
+        final_image_data = await read_saved_image(final_image_filename)
+        response.final_image_base64 = base64.b64encode(final_image_data.data).decode()
+    return response
 
 
-class OfferResponse(BaseModel):
-    offer_text: str
-    initial_image_url: str
-    final_image_url: str
+async def read_image(image_name: str) -> Optional[CachedImage]:
+    """
+    Get the encoded bytes of a generated image, from the hot cache if possible.
+
+    Waits for the background writer if the image is still being written.
+    """
+    pending_write = services.image_processor.writer.pending(image_name)
+    if pending_write is not None:
+        await asyncio.wrap_future(pending_write)
+
+    cached = services.image_cache.get(image_name)
+    if cached is None:
+        data = await run_in_threadpool(services.image_store.get, image_name)
+        if data is None:
+            return None
+        cached = services.image_cache.put(image_name, data)
+    services.image_index.touch(image_name)
+    return cached
+
+
+async def read_saved_image(image_name: str) -> CachedImage:
+    """read_image for an image the request has just saved, which must exist."""
+    image = await read_image(image_name)
+    if image is None:
+        raise FileNotFoundError(f"Saved image {image_name} is missing from the store")
+    return image
 
 
 @app.post("/generate-offer", response_model=OfferResponse)
 async def generate_offer(offer_request: OfferRequest):
     try:
-        style = TextStyle(
-            font_name=offer_request.font_name,
-            font_size=offer_request.font_size,
-            position=offer_request.position,
-            text_color=Config.TEXT_COLORS[offer_request.text_color],
-            bg_color=Config.BACKGROUND_COLORS[offer_request.bg_color],
-            bg_opacity=offer_request.bg_opacity,
-        )
+        response = await create_offer(offer_request)
+        if offer_request.response_mode == "multipart":
+            final_image_filename = os.path.basename(response.final_image_url)
+            final_image = await read_saved_image(final_image_filename)
+            return multipart_response(
+                response.model_dump_json(), final_image_filename, final_image.data
+            )
+        return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        offer_text, initial_image, final_image = offer_service.generate_offer(
-            offer_request.prompt, offer_request.word_limit, style
-        )
 
-        # Save images
-        initial_image_filename = image_processor.get_timestamp_filename(
-            f"{offer_text[:20]}_initial.jpg"
-        )
-        final_image_filename = image_processor.get_timestamp_filename(
-            f"{offer_text[:20]}_final.jpg"
+async def run_offer_job(request: dict) -> dict:
+    # Images are written before the job completes, so its stages include the
+    # encoding and the result URLs can be fetched right away.
+    response = await create_offer(OfferRequest.model_validate(request), wait=True)
+    return response.model_dump(exclude_none=True)
+
+
+# Built on first use, see ServiceContainer
+services = ServiceContainer(job_runner=run_offer_job)
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(offer_request: OfferRequest):
+    """
+    Start generating an offer in the background.
+
+    Returns the job id right away; progress is available from the status
+    endpoint and as Server-Sent Events.
+    """
+    try:
+        job = services.job_manager.submit(
+            offer_request.model_copy(update={"response_mode": "url"}).model_dump()
         )
+    except JobLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+    }
+
 
-        initial_image_path = os.path.join(Config.IMAGES_FOLDER, initial_image_filename)
-        final_image_path = os.path.join(Config.IMAGES_FOLDER, final_image_filename)
+@app.get("/jobs/stats")
+async def job_stats():
+    return services.job_manager.stats()
 
-        image_processor.save_image(initial_image, initial_image_path)
-        image_processor.save_image(final_image, final_image_path)
 
-        return OfferResponse(
-            offer_text=offer_text,
-            initial_image_url=f"/images/{initial_image_filename}",
-            final_image_url=f"/images/{final_image_filename}",
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = services.job_manager.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    Stream the stage events of a job as Server-Sent Events.
+
+    Every event is a "stage" message with the stage (queued, text, image,
+    download, overlay, encode, saved), its status (started, completed,
+    failed) and the elapsed seconds. The stream ends with a "succeeded" or
+    "failed" message carrying the job. Reconnecting clients resume after the
+    Last-Event-ID they received.
+    """
+    if services.job_manager.store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    last_event_id = request.headers.get("last-event-id", "")
+    start = int(last_event_id) + 1 if last_event_id.isdigit() else 0
+
+    async def stream():
+        index = start
+        async for event in services.job_manager.watch(job_id, start=start):
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            yield sse_message(json.dumps(event), event="stage", event_id=index)
+            index += 1
+        job = services.job_manager.store.get(job_id)
+        if job is not None:
+            yield sse_message(json.dumps(job.to_dict()), event=job.status)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/generate-offer-texts", response_model=OfferTextsResponse)
+async def generate_offer_texts(texts_request: OfferTextsRequest):
+    """
+    Generate alternative offer texts for one prompt, in a single provider call
+    where the AI service supports it.
+    """
+    text_generator = services.text_generator
+    try:
+        async with services.limiter.limit("text", provider=text_generator.service_name):
+            candidates = await text_generator.agenerate_offer_candidates(
+                texts_request.prompt, texts_request.word_limit, texts_request.count
+            )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return OfferTextsResponse(
+        candidates=candidates,
+        fallback=any(is_fallback(text) for text in candidates) or None,
+    )
+
+
+@app.post("/generate-offers/batch")
+async def generate_offers_batch(request: Request):
+    """
+    Generate offers for a JSONL body of OfferRequest objects.
+
+    Results are streamed back as NDJSON in completion order, one line per
+    item, tagged with the index of the item in the request body.
+    """
+    body = (await request.body()).decode("utf-8")
+    items = list(iter_jsonl_items(body.splitlines()))
+    if len(items) > Config.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds {Config.BATCH_MAX_ITEMS} items",
         )
 
+    semaphore = asyncio.Semaphore(Config.BATCH_CONCURRENCY)
+    offer_requests = []
+    for _, line in items:
+        try:
+            offer_requests.append(OfferRequest.model_validate_json(line))
+        except ValidationError:
+            offer_requests.append(None)
+    # Texts of the items are generated in batched provider calls, a window of
+    # items ahead of the items being worked on, which then read them from the
+    # generation cache.
+    prefetcher = TextPrefetcher(
+        services.text_generator, offer_requests, limiter=services.limiter
+    )
+
+    async def process(index: int, line: str) -> dict:
+        async with semaphore:
+            await prefetcher.aready(index)
+            try:
+                offer_request = OfferRequest.model_validate_json(line)
+                response = await create_offer(offer_request)
+                return {"index": index, "status": "ok", **response.model_dump()}
+            except ValidationError as e:
+                return {"index": index, "status": "invalid", "error": str(e)}
+            except Exception as e:
+                return {"index": index, "status": "error", "error": str(e)}
+
+    async def stream_results():
+        prefetching = asyncio.create_task(prefetcher.arun())
+        tasks = [asyncio.create_task(process(index, line)) for index, line in items]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield to_ndjson(await next_result)
+        finally:
+            # The client went away, stop working on the remaining items.
+            prefetching.cancel()
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+@app.post("/render", response_model=RenderResponse)
+async def render(render_request: RenderRequest):
+    """
+    Re-render an already generated image with one or many text styles,
+    without calling the AI services again.
+    """
+    base_image = render_request.base_image
+    if os.path.basename(base_image) != base_image:
+        raise HTTPException(status_code=400, detail="Invalid image name")
+    if not services.image_store.exists(base_image):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    try:
+        styles = [style.to_text_style() for style in render_request.styles]
+    except KeyError as e:
+        raise HTTPException(status_code=422, detail=f"Unknown color: {e}")
+
+    try:
+        async with services.memory_budget.areserve():
+            async with services.limiter.limit("render"):
+                image = await run_in_threadpool(
+                    services.image_processor.load_image, base_image
+                )
+                filenames = await run_in_threadpool(
+                    services.image_processor.render_variants,
+                    image,
+                    render_request.offer_text,
+                    styles,
+                )
+        return RenderResponse(
+            image_urls=[f"/images/{filename}" for filename in filenames]
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/images/{image_name}")
-async def get_image(image_name: str):
-    image_path = os.path.join(Config.IMAGES_FOLDER, image_name)
-    if not os.path.exists(image_path):
+async def get_image(
+    image_name: str,
+    request: Request,
+    w: Optional[int] = Query(default=None, description="Width of a resized variant"),
+    fmt: Optional[str] = Query(default=None, description="jpeg, webp or png"),
+):
+    if os.path.basename(image_name) != image_name:
         raise HTTPException(status_code=404, detail="Image not found")
-    return FileResponse(image_path)
+    if w is not None and w not in Config.DERIVATIVE_WIDTHS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Width must be one of {Config.DERIVATIVE_WIDTHS}",
+        )
+    if fmt is not None and fmt not in DERIVATIVE_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Format must be one of {list(DERIVATIVE_FORMATS)}",
+        )
+
+    try:
+        image = await read_image(image_name)
+    except Exception:
+        raise HTTPException(status_code=500, detail="Image could not be saved")
+    if image is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if w is None and fmt is None:
+        return image_response(request, image_name, image)
+
+    # Pick the format from the Accept header unless it is given explicitly.
+    vary = None
+    if fmt is None:
+        accept = request.headers.get("accept", "")
+        fmt = "webp" if accepts(accept, "image/webp") else "jpeg"
+        vary = "Accept"
+    image_format = DERIVATIVE_FORMATS[fmt]
+    async with services.limiter.limit("derivative"):
+        data = await run_in_threadpool(
+            services.derivative_store.get, image_name, w, image_format
+        )
+    return image_response(
+        request,
+        image_name,
+        CachedImage(data=data, etag=make_etag(data)),
+        media_type=Image.MIME[image_format],
+        vary=vary,
+    )
+
+
+def collect_service_metrics():
+    """
+    Metric families read from the stats of the services at scrape time.
+
+    Services that have not been used yet are left out rather than built.
+    """
+    caches = {
+        "font": font_cache.stats(),
+        "glyph_metrics": glyph_metrics_cache.stats(),
+        "text_mask": text_mask_cache.stats(),
+    }
+    if services.built("image_cache"):
+        caches["image"] = services.image_cache.stats()
+    if services.built("derivative_store"):
+        caches["derivative"] = services.derivative_store.stats()
+    for namespace, stats in generation_cache_stats().items():
+        caches[f"generation_{namespace}"] = stats
+    families = cache_families(caches)
+
+    if services.built("limiter"):
+        families.append(
+            (
+                "offer_limiter_in_flight",
+                "gauge",
+                "Operations holding a concurrency limiter slot.",
+                [
+                    ({"key": key}, count)
+                    for key, count in services.limiter.stats().items()
+                ],
+            )
+        )
+    if services.built("image_processor"):
+        writer = services.image_processor.writer.stats()
+        families += [
+            (
+                "offer_image_writer_pending",
+                "gauge",
+                "Images queued or being written.",
+                [({}, writer["pending"])],
+            ),
+            (
+                "offer_image_writer_failures_total",
+                "counter",
+                "Failed image writes.",
+                [({}, writer["failed"])],
+            ),
+            (
+                "offer_image_writer_deduplicated_total",
+                "counter",
+                "Images not written because identical bytes were stored already.",
+                [({}, writer["deduplicated"])],
+            ),
+        ]
+    if services.built("retention"):
+        retention = services.retention.stats()
+        families += [
+            (
+                "offer_image_retention_deleted_total",
+                "counter",
+                "Images deleted by retention passes.",
+                [
+                    ({"kind": kind}, count)
+                    for kind, count in retention["deleted"].items()
+                ],
+            ),
+            (
+                "offer_image_retention_reclaimed_bytes_total",
+                "counter",
+                "Bytes freed by retention passes.",
+                [({}, retention["bytes_reclaimed"])],
+            ),
+            (
+                "offer_image_store_bytes",
+                "gauge",
+                "Bytes of stored images after the last retention pass.",
+                [({}, retention["bytes_remaining"])],
+            ),
+        ]
+    if services.built("memory_budget"):
+        budget = services.memory_budget.stats()
+        families += [
+            (
+                "offer_memory_budget_reserved_bytes",
+                "gauge",
+                "Bytes of the memory budget held by work in progress.",
+                [({}, budget["reserved_bytes"])],
+            ),
+            (
+                "offer_memory_budget_waiting",
+                "gauge",
+                "Requests waiting for the memory budget.",
+                [({}, budget["waiting"])],
+            ),
+        ]
+    single_flights = []
+    for kind in ("text", "image"):
+        if services.built(f"{kind}_generator"):
+            generator = getattr(services, f"{kind}_generator")
+            stats = generator.single_flight.stats()
+            single_flights.append(({"name": kind}, stats["in_flight"]))
+    families.append(
+        (
+            "offer_single_flight_in_flight",
+            "gauge",
+            "Provider calls other identical requests can join.",
+            single_flights,
+        )
+    )
+    if services.built("job_manager"):
+        jobs = services.job_manager.stats()
+        families += [
+            (
+                "offer_jobs_in_flight",
+                "gauge",
+                "Queued and running jobs.",
+                [({}, jobs["in_flight"])],
+            ),
+            (
+                "offer_jobs_total",
+                "counter",
+                "Finished and rejected jobs.",
+                [
+                    ({"status": status}, jobs[status])
+                    for status in ("succeeded", "failed", "rejected")
+                ],
+            ),
+        ]
+    if services.built("render_pool") and services.render_pool is not None:
+        pool = services.render_pool.stats()
+        families += [
+            (
+                "offer_render_pool_jobs_total",
+                "counter",
+                "Overlays rendered by the render pool.",
+                [
+                    ({"where": "pool"}, pool["submitted"]),
+                    ({"where": "in_process"}, pool["in_process"]),
+                ],
+            ),
+            (
+                "offer_render_pool_restarts_total",
+                "counter",
+                "Restarts of the render pool workers.",
+                [({}, pool["restarts"])],
+            ),
+        ]
+    return families
+
+
+registry.register_collector(collect_service_metrics)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Metrics in the Prometheus text exposition format."""
+    return PlainTextResponse(
+        await run_in_threadpool(registry.render),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@app.get("/derivatives/stats")
+async def derivative_stats():
+    return services.derivative_store.stats()
+
+
+@app.get("/image-cache/stats")
+async def image_cache_stats():
+    return services.image_cache.stats()
+
+
+@app.get("/generation-cache/stats")
+async def generation_cache_statistics():
+    return generation_cache_stats()
+
+
+@app.get("/image-writer/stats")
+async def image_writer_stats():
+    return services.image_processor.writer.stats()
+
+
+@app.get("/text-mask-cache/stats")
+async def text_mask_cache_stats():
+    return text_mask_cache.stats()
+
+
+@app.get("/render-pool/stats")
+async def render_pool_stats():
+    if services.render_pool is None:
+        return {"backend": Config.RENDER_BACKEND}
+    return {"backend": Config.RENDER_BACKEND, **services.render_pool.stats()}
+
+
+@app.get("/fonts/cache-stats", response_model=Dict[str, int])
+async def font_cache_stats():
+    return font_cache.stats()
 
 
 @app.get("/fonts", response_model=List[str])
 async def list_fonts():
-    return os.listdir(Config.FONTS_FOLDER)
+    return await run_in_threadpool(font_registry.names)
+
+
+@app.get("/fonts/{font_name}", response_model=FontResponse)
+async def get_font(font_name: str):
+    info = await run_in_threadpool(font_registry.get, font_name)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Font not found")
+    return FontResponse(
+        name=info.name,
+        family=info.family,
+        style=info.style,
+        axes=info.axes,
+        glyphs=info.glyphs,
+        size=info.size,
+    )
+
+
+@app.get("/fonts/{font_name}/coverage", response_model=FontCoverageResponse)
+async def font_coverage(font_name: str, text: str = Query(max_length=2000)):
+    """Check that the font has glyphs for every character of the text."""
+    missing = await run_in_threadpool(font_registry.missing_glyphs, font_name, text)
+    if missing is None:
+        raise HTTPException(status_code=404, detail="Font not found")
+    return FontCoverageResponse(
+        font_name=font_name, covered=not missing, missing=missing
+    )
+
+
+def font_changed(font_name: str) -> None:
+    font_cache.invalidate(font_name)
+    glyph_metrics_cache.invalidate(font_name)
+    text_mask_cache.invalidate(font_name)
+    if services.built("render_pool") and services.render_pool is not None:
+        # Workers hold their own font caches.
+        services.render_pool.restart()
 
 
 @app.post("/upload-font")
 async def upload_font(font: UploadFile = File(...)):
     try:
-        font_path = os.path.join(Config.FONTS_FOLDER, font.filename)
-        with open(font_path, "wb") as buffer:
-            buffer.write(await font.read())
-        return {"message": f"Font {font.filename} uploaded successfully"}
+        info = await run_in_threadpool(font_registry.install, font.filename, font.file)
+    except FontTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except FontError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    await run_in_threadpool(font_changed, info.name)
+    return {"message": f"Font {info.name} uploaded successfully"}
+
+
+@app.delete("/fonts/{font_name}")
+async def delete_font(font_name: str):
+    try:
+        deleted = await run_in_threadpool(font_registry.delete, font_name)
+    except FontError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Font not found")
+    await run_in_threadpool(font_changed, font_name)
+    return {"message": f"Font {font_name} deleted"}
@@ -0,0 +1,174 @@
+import mimetypes
+import re
+import uuid
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from configs.config import Config
+from services.image_cache import CachedImage, is_content_addressed
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str, length: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range Range header.
+
+    Args:
+        header (str): Value of the Range header.
+        length (int): Size of the full representation.
+
+    Returns:
+        Optional[Tuple[int, int]]: Inclusive (start, end), or None when the
+        header is not a single byte range and the full body should be served.
+
+    Raises:
+        ValueError: If the range cannot be satisfied.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        suffix = int(end)
+        if suffix == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(0, length - suffix), length - 1
+    start = int(start)
+    end = int(end) if end else length - 1
+    if start >= length or end < start:
+        raise ValueError("Unsatisfiable range")
+    return start, min(end, length - 1)
+
+
+def accepts(header: str, media_type: str) -> bool:
+    """
+    Whether an Accept header lists the media type with a q-value above 0.
+
+    Wildcard ranges don't count, since clients send them for formats they
+    can't decode too.
+
+    Args:
+        header (str): Value of the Accept header.
+        media_type (str): The media type, e.g. "image/webp".
+    """
+    quality = 0.0
+    for media_range in header.split(","):
+        name, *parameters = media_range.split(";")
+        if name.strip().lower() != media_type:
+            continue
+        range_quality = 1.0
+        for parameter in parameters:
+            key, _, value = parameter.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    range_quality = float(value)
+                except ValueError:
+                    range_quality = 0.0
+        quality = max(quality, range_quality)
+    return quality > 0
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison.
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def image_response(
+    request: Request,
+    image_name: str,
+    image: CachedImage,
+    media_type: Optional[str] = None,
+    vary: Optional[str] = None,
+) -> Response:
+    """
+    Build the response for an encoded image, honoring conditional and range
+    requests.
+
+    Args:
+        request (Request): The incoming request.
+        image_name (str): Name the image is served under.
+        image (CachedImage): The encoded image and its ETag.
+        media_type (Optional[str]): Content type, guessed from the name if None.
+        vary (Optional[str]): Value of the Vary header, for negotiated content.
+    """
+    headers: Dict[str, str] = {
+        "ETag": image.etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": (
+            f"public, max-age={Config.IMAGE_IMMUTABLE_MAX_AGE}, immutable"
+            if is_content_addressed(image_name)
+            else "no-cache"
+        ),
+    }
+    if vary is not None:
+        headers["Vary"] = vary
+    media_type = (
+        media_type or mimetypes.guess_type(image_name)[0] or "application/octet-stream"
+    )
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and _etag_matches(if_none_match, image.etag):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == image.etag):
+        length = len(image.data)
+        try:
+            byte_range = parse_range(range_header, length)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{length}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+            return Response(
+                content=image.data[start : end + 1],
+                status_code=206,
+                headers=headers,
+                media_type=media_type,
+            )
+
+    return Response(content=image.data, headers=headers, media_type=media_type)
+
+
+def multipart_response(metadata_json: str, image_name: str, data: bytes) -> Response:
+    """Return JSON metadata and the image bytes as a multipart/mixed body."""
+    boundary = uuid.uuid4().hex
+    media_type = mimetypes.guess_type(image_name)[0] or "application/octet-stream"
+    body = b"".join(
+        [
+            f"--{boundary}\r\n".encode(),
+            b"Content-Type: application/json\r\n\r\n",
+            metadata_json.encode("utf-8"),
+            f"\r\n--{boundary}\r\n".encode(),
+            f"Content-Type: {media_type}\r\n".encode(),
+            "Content-Disposition: attachment; "
+            f"filename*=UTF-8''{quote(image_name)}\r\n\r\n".encode(),
+            data,
+            f"\r\n--{boundary}--\r\n".encode(),
+        ]
+    )
+    return Response(content=body, media_type=f"multipart/mixed; boundary={boundary}")
+
+
+def sse_message(
+    data: str, event: Optional[str] = None, event_id: Optional[int] = None
+) -> str:
+    """Format one Server-Sent Events message."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.splitlines() or [""])
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,112 @@
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+from configs.config import Config
+from models import TextStyle
+
+
+class StyleRequest(BaseModel):
+    font_name: str = Config.DEFAULT_FONT
+    font_size: int = Config.DEFAULT_FONT_SIZE
+    position: str = Config.DEFAULT_TEXT_POSITION
+    text_color: str = Config.DEFAULT_TEXT_COLOR
+    bg_color: str = Config.DEFAULT_BG_COLOR
+    bg_opacity: float = Config.DEFAULT_BG_OPACITY
+    # Wrap the text into balanced lines and, with auto_fit, shrink font_size
+    # until it fits max_width x max_height (fractions of the image).
+    wrap: bool = Config.DEFAULT_TEXT_WRAP
+    auto_fit: bool = Config.DEFAULT_TEXT_AUTO_FIT
+    align: Literal[Config.TEXT_ALIGNMENTS] = Config.DEFAULT_TEXT_ALIGN
+    line_spacing: float = Field(Config.DEFAULT_LINE_SPACING, ge=0, le=2)
+    max_width: float = Field(Config.DEFAULT_TEXT_MAX_WIDTH, gt=0, le=1)
+    max_height: float = Field(Config.DEFAULT_TEXT_MAX_HEIGHT, gt=0, le=1)
+    min_font_size: int = Field(Config.TEXT_MIN_FONT_SIZE, ge=1)
+
+    def to_text_style(self) -> TextStyle:
+        return TextStyle(
+            font_name=self.font_name,
+            font_size=self.font_size,
+            position=self.position,
+            text_color=Config.TEXT_COLORS[self.text_color],
+            bg_color=Config.BACKGROUND_COLORS[self.bg_color],
+            bg_opacity=self.bg_opacity,
+            wrap=self.wrap,
+            auto_fit=self.auto_fit,
+            align=self.align,
+            line_spacing=self.line_spacing,
+            max_width=self.max_width,
+            max_height=self.max_height,
+            min_font_size=self.min_font_size,
+        )
+
+
+class OfferRequest(StyleRequest):
+    prompt: str
+    word_limit: int = Config.DEFAULT_WORD_LIMIT
+    # Generation cache mode: "use", "refresh" (regenerate and store) or "bypass"
+    cache_mode: Literal["use", "refresh", "bypass"] = "use"
+    # "url" returns image URLs only, "inline" adds the final image as base64
+    # and "multipart" returns the JSON and the final image as multipart/mixed
+    response_mode: Literal["url", "inline", "multipart"] = "url"
+
+
+class OfferResponse(BaseModel):
+    offer_text: str
+    initial_image_url: str
+    final_image_url: str
+    final_image_base64: Optional[str] = None
+    # Stages ("text", "image") that returned a placeholder because the AI
+    # provider failed
+    fallback: Optional[List[str]] = None
+
+
+class OfferTextsRequest(BaseModel):
+    prompt: str
+    word_limit: int = Config.DEFAULT_WORD_LIMIT
+    # Number of alternative offer texts, e.g. for an A/B test
+    count: int = Field(2, ge=1, le=Config.TEXT_MAX_CANDIDATES)
+
+
+class OfferTextsResponse(BaseModel):
+    candidates: List[str]
+    # True if the provider failed and the candidates are placeholders
+    fallback: Optional[bool] = None
+
+
+class RenderRequest(BaseModel):
+    # Name of a previously generated image, e.g. from initial_image_url
+    base_image: str
+    offer_text: str
+    styles: List[StyleRequest] = Field(
+        min_length=1, max_length=Config.RENDER_MAX_VARIANTS
+    )
+
+
+class RenderResponse(BaseModel):
+    image_urls: List[str]
+
+
+class FontAxis(BaseModel):
+    name: str
+    minimum: int
+    default: int
+    maximum: int
+
+
+class FontResponse(BaseModel):
+    name: str
+    family: str
+    style: str
+    # Variation axes, empty unless it is a variable font
+    axes: List[FontAxis]
+    # Number of Unicode code points the font has glyphs for
+    glyphs: int
+    size: int
+
+
+class FontCoverageResponse(BaseModel):
+    font_name: str
+    covered: bool
+    # Characters of the text the font has no glyph for
+    missing: List[str]
@@ -0,0 +1,66 @@
+import json
+import math
+import os
+from typing import Dict, List, Sequence
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of the values, 0.0 for an empty sequence."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
+
+
+def write_json(path: str, results: dict) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+
+def compare_to_baseline(
+    results: Dict[str, float],
+    baseline: Dict[str, float],
+    margin: float,
+    higher_is_better: Sequence[str] = (),
+) -> List[str]:
+    """
+    Compare flat metric dictionaries against a stored baseline.
+
+    Args:
+        results (Dict[str, float]): Current metrics.
+        baseline (Dict[str, float]): Stored metrics.
+        margin (float): Allowed relative regression, e.g. 0.2 for 20%.
+        higher_is_better (Sequence[str]): Suffixes of metrics where a lower
+            value is the regression (throughput); all others are timings or
+            sizes where a higher value is the regression.
+
+    Returns:
+        List[str]: One message per regressed metric.
+    """
+    regressions = []
+    for name, expected in baseline.items():
+        actual = results.get(name)
+        if actual is None or expected <= 0:
+            continue
+        if any(name.endswith(suffix) for suffix in higher_is_better):
+            regressed = actual < expected * (1 - margin)
+        else:
+            regressed = actual > expected * (1 + margin)
+        if regressed:
+            regressions.append(f"{name}: {actual:.6g} vs baseline {expected:.6g}")
+    return regressions
@@ -0,0 +1,373 @@
+"""
+Micro-benchmark of the text overlay hot path.
+
+Measures font loading, textbbox measurement, RGBA rectangle compositing, text
+drawing, encoding and the complete ImageProcessor.overlay_text_on_image call
+across every font in the fonts folder, all Config.FONT_SIZES, all
+Config.TEXT_POSITIONS, several text lengths and the base image sizes returned
+by the image providers. Time and peak memory are reported per stage:
+
+    python -m benchmarks.overlay --output bench/overlay.json
+    python -m benchmarks.overlay --baseline bench/overlay-baseline.json
+"""
+
+import gc
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import click
+from PIL import Image, ImageDraw, ImageFont
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.common import compare_to_baseline, summarize, write_json
+from configs.config import Config
+
+console = Console()
+
+STAGES = ("font_load", "textbbox", "rectangle", "text", "encode", "overlay")
+IMAGE_SIZES = [(1792, 1024), (1024, 1024)]
+TEXT_LENGTHS = [3, 10, 25]
+ENCODE_FORMATS = ["JPEG", "WEBP", "PNG"]
+
+
+def available_fonts() -> List[str]:
+    return sorted(
+        name
+        for name in os.listdir(Config.FONTS_FOLDER)
+        if name.lower().endswith((".ttf", ".otf"))
+    )
+
+
+def measure(
+    operation: Callable[[], object], repeat: int, trace: bool = True
+) -> Tuple[List[float], int]:
+    """
+    Time an operation and optionally measure its peak traced memory.
+
+    The timed runs do not trace allocations; one extra traced run reports the
+    peak of memory allocated while the operation ran. Pixel buffers Pillow
+    allocates in C are not traced, the process peak RSS covers those.
+
+    Returns:
+        Tuple[List[float], int]: Duration of every run and the peak in bytes,
+        0 when not traced.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start)
+
+    if not trace:
+        return timings, 0
+    gc.collect()
+    tracemalloc.start()
+    try:
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return timings, peak
+
+
+class OverlayBenchmark:
+    """Runs the overlay stages over the cartesian product of the axes."""
+
+    def __init__(
+        self,
+        fonts: Sequence[str],
+        sizes: Sequence[int],
+        positions: Sequence[str],
+        text_lengths: Sequence[int],
+        image_sizes: Sequence[Tuple[int, int]],
+        repeat: int = 1,
+    ):
+        self.fonts = fonts
+        self.sizes = sizes
+        self.positions = positions
+        self.text_lengths = text_lengths
+        self.image_sizes = image_sizes
+        self.repeat = repeat
+        # stage -> axis -> value -> timings, plus the peak memory per stage.
+        self.timings: Dict[str, Dict[str, Dict[str, List[float]]]] = defaultdict(
+            lambda: defaultdict(lambda: defaultdict(list))
+        )
+        self.peaks: Dict[str, int] = defaultdict(int)
+        self.failures: List[str] = []
+
+    def _record(
+        self, stage: str, axes: Dict[str, object], operation, trace: bool = True
+    ) -> None:
+        timings, peak = measure(operation, self.repeat, trace)
+        self.timings[stage]["all"]["all"].extend(timings)
+        for axis, value in axes.items():
+            self.timings[stage][axis][str(value)].extend(timings)
+        self.peaks[stage] = max(self.peaks[stage], peak)
+
+    def _base_images(self) -> Dict[Tuple[int, int], Image.Image]:
+        from services.local_service import LocalImageService
+
+        return {
+            size: LocalImageService(latency=0, jitter=0, failure_rate=0, size=size)
+            .generate_image("overlay benchmark")
+            for size in self.image_sizes
+        }
+
+    def _texts(self) -> Dict[int, str]:
+        from services.local_service import LocalTextService
+
+        service = LocalTextService(latency=0, jitter=0, failure_rate=0)
+        return {
+            length: service.generate_text("overlay benchmark", length)
+            for length in self.text_lengths
+        }
+
+    def run(self) -> None:
+        from models import TextStyle
+        from services.image_processor import ImageProcessor
+        from services.image_writer import encode_image
+
+        images = self._base_images()
+        texts = self._texts()
+        processor = ImageProcessor()
+        fill = Config.BACKGROUND_COLORS[Config.DEFAULT_BG_COLOR] + (
+            int(Config.DEFAULT_BG_OPACITY * 255),
+        )
+        text_color = Config.TEXT_COLORS[Config.DEFAULT_TEXT_COLOR]
+
+        for font_name in self.fonts:
+            path = os.path.join(Config.FONTS_FOLDER, font_name)
+            for font_size in self.sizes:
+                axes = {"font": font_name, "size": font_size}
+                try:
+                    font = ImageFont.truetype(path, font_size)
+                except OSError as e:
+                    self.failures.append(f"{font_name}@{font_size}: {e}")
+                    continue
+                # Uncached load, the cost of a font cache miss.
+                self._record(
+                    "font_load", axes, lambda: ImageFont.truetype(path, font_size)
+                )
+
+                for length, text in texts.items():
+                    axes = {"font": font_name, "size": font_size, "length": length}
+                    scratch = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+                    self._record(
+                        "textbbox",
+                        axes,
+                        lambda: scratch.textbbox((0, 0), text, font=font),
+                    )
+                    bbox = scratch.textbbox((0, 0), text, font=font)
+                    text_size = (bbox[2] - bbox[0], bbox[3] - bbox[1])
+                    padding = max(5, int(font_size * 0.2))
+
+                    for image_size, base in images.items():
+                        image = base.copy()
+                        draw = ImageDraw.Draw(image, "RGBA")
+                        for position in self.positions:
+                            # The position only moves the drawing, memory is
+                            # traced once per image.
+                            trace = position == self.positions[0]
+                            axes = {
+                                "font": font_name,
+                                "size": font_size,
+                                "length": length,
+                                "position": position,
+                                "image": f"{image_size[0]}x{image_size[1]}",
+                            }
+                            x, y = Config.TEXT_POSITIONS[position](
+                                text_size[0], text_size[1], *image_size
+                            )
+                            box = (
+                                max(0, x - padding),
+                                max(0, y - padding),
+                                min(image_size[0], x + text_size[0] + padding),
+                                min(image_size[1], y + text_size[1] + padding),
+                            )
+                            self._record(
+                                "rectangle",
+                                axes,
+                                lambda: draw.rectangle(box, fill=fill),
+                                trace,
+                            )
+                            self._record(
+                                "text",
+                                axes,
+                                lambda: draw.text(
+                                    (x, y), text, font=font, fill=text_color
+                                ),
+                                trace,
+                            )
+                            style = TextStyle(
+                                font_name=font_name,
+                                font_size=font_size,
+                                position=position,
+                                text_color=text_color,
+                                bg_color=Config.BACKGROUND_COLORS[
+                                    Config.DEFAULT_BG_COLOR
+                                ],
+                                bg_opacity=Config.DEFAULT_BG_OPACITY,
+                            )
+                            self._record(
+                                "overlay",
+                                axes,
+                                lambda: processor.overlay_text_on_image(
+                                    image, text, style
+                                ),
+                                trace,
+                            )
+
+        for image_size, base in images.items():
+            final = processor.overlay_text_on_image(
+                base.copy(),
+                texts[max(texts)] if texts else "",
+                TextStyle(
+                    font_name=Config.DEFAULT_FONT,
+                    font_size=Config.DEFAULT_FONT_SIZE,
+                    position=Config.DEFAULT_TEXT_POSITION,
+                    text_color=text_color,
+                    bg_color=Config.BACKGROUND_COLORS[Config.DEFAULT_BG_COLOR],
+                    bg_opacity=Config.DEFAULT_BG_OPACITY,
+                ),
+            )
+            for image_format in ENCODE_FORMATS:
+                axes = {
+                    "format": image_format,
+                    "image": f"{image_size[0]}x{image_size[1]}",
+                }
+                self._record(
+                    "encode", axes, lambda: encode_image(final, image_format)
+                )
+
+    def results(self) -> dict:
+        stages = {}
+        for stage in STAGES:
+            if stage not in self.timings:
+                continue
+            axes = self.timings[stage]
+            stages[stage] = {
+                "summary": summarize(axes["all"]["all"]),
+                "peak_bytes": self.peaks[stage],
+                "by": {
+                    axis: {value: summarize(values) for value, values in groups.items()}
+                    for axis, groups in axes.items()
+                    if axis != "all"
+                },
+            }
+        return {
+            "stages": stages,
+            "failures": self.failures,
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+
+
+def flatten(results: dict) -> Dict[str, float]:
+    """
+    Flat metric names used for baseline comparison.
+
+    Only the per-stage figures are compared; the per-axis breakdowns are too
+    small samples to gate on and are kept in the JSON output for analysis.
+    """
+    metrics = {}
+    for stage, result in results["stages"].items():
+        metrics[f"{stage}.p50"] = result["summary"]["p50"]
+        metrics[f"{stage}.p95"] = result["summary"]["p95"]
+        metrics[f"{stage}.peak_bytes"] = result["peak_bytes"]
+    return metrics
+
+
+def print_results(results: dict) -> None:
+    table = Table(title="Overlay stages")
+    for column in ("stage", "runs", "p50", "p95", "p99", "max", "peak memory"):
+        table.add_column(column)
+    for stage, result in results["stages"].items():
+        summary = result["summary"]
+        table.add_row(
+            stage,
+            str(summary["count"]),
+            f"{summary['p50'] * 1000:.3f} ms",
+            f"{summary['p95'] * 1000:.3f} ms",
+            f"{summary['p99'] * 1000:.3f} ms",
+            f"{summary['max'] * 1000:.3f} ms",
+            f"{result['peak_bytes'] / 1024:.1f} KiB",
+        )
+    console.print(table)
+    for failure in results["failures"]:
+        console.print(f"[yellow]Skipped {failure}[/yellow]")
+
+
+def _split(value: Optional[str], cast=str) -> Optional[List]:
+    return [cast(item) for item in value.split(",")] if value else None
+
+
+@click.command()
+@click.option("--fonts", default=None, help="Comma-separated fonts (default: all)")
+@click.option("--sizes", default=None, help="Comma-separated font sizes")
+@click.option("--positions", default=None, help="Comma-separated text positions")
+@click.option("--text-lengths", default=None, help="Comma-separated word counts")
+@click.option("--image-sizes", default=None, help="e.g. 1792x1024,1024x1024")
+@click.option("--quick", is_flag=True, help="Default font and a few sizes only")
+@click.option("--repeat", default=1, help="Timed runs per case")
+@click.option("--output", default=None, help="Write results as JSON")
+@click.option("--baseline", default=None, help="Baseline JSON of flat metrics")
+@click.option("--margin", default=0.2, help="Allowed regression vs baseline")
+@click.option("--save-baseline", default=None, help="Write flat metrics here")
+def main(
+    fonts,
+    sizes,
+    positions,
+    text_lengths,
+    image_sizes,
+    quick,
+    repeat,
+    output,
+    baseline,
+    margin,
+    save_baseline,
+):
+    if quick:
+        fonts = fonts or Config.DEFAULT_FONT
+        sizes = sizes or "16,32,72"
+        positions = positions or "top-left,center,bottom-right"
+    parsed_sizes = _split(image_sizes)
+    benchmark = OverlayBenchmark(
+        fonts=_split(fonts) or available_fonts(),
+        sizes=_split(sizes, int) or Config.FONT_SIZES,
+        positions=_split(positions) or list(Config.TEXT_POSITIONS),
+        text_lengths=_split(text_lengths, int) or TEXT_LENGTHS,
+        image_sizes=(
+            [tuple(int(part) for part in size.split("x")) for size in parsed_sizes]
+            if parsed_sizes
+            else IMAGE_SIZES
+        ),
+        repeat=repeat,
+    )
+    with console.status("Benchmarking overlay stages..."):
+        benchmark.run()
+    results = benchmark.results()
+    print_results(results)
+
+    metrics = flatten(results)
+    if output:
+        write_json(output, results)
+    if save_baseline:
+        write_json(save_baseline, metrics)
+    if baseline:
+        with open(baseline, "r") as file:
+            regressions = compare_to_baseline(metrics, json.load(file), margin)
+        if regressions:
+            console.print("[bold red]Overlay regressions:[/bold red]")
+            for regression in regressions:
+                console.print(f"  {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Cold start benchmark of the API and the CLI.
+
+Every scenario runs in a fresh interpreter, the way a new container or a CLI
+invocation starts, and is timed from process start to exit:
+
+    api_import          import api.main
+    api_first_request   start the app and serve its first offer with the
+                        offline "local" AI service
+    cli_help            python run_cli.py --help
+
+The modules with the largest cumulative import time of api.main are listed
+as well, to see what a regression comes from:
+
+    python -m benchmarks.startup --repeat 10 --output bench/startup.json
+    python -m benchmarks.startup --baseline bench/startup-baseline.json
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import click
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.common import compare_to_baseline, summarize, write_json
+
+console = Console()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_REQUEST = """
+import asyncio, tempfile
+from configs.config import Config
+Config.IMAGES_FOLDER = tempfile.mkdtemp(prefix="offer-startup-")
+import httpx
+from api.main import app
+
+async def main():
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://s") as c:
+            response = await c.post(
+                "/generate-offer", json={"prompt": "spa", "cache_mode": "bypass"}
+            )
+            response.raise_for_status()
+
+asyncio.run(main())
+"""
+
+SCENARIOS: Dict[str, List[str]] = {
+    "api_import": ["-c", "import api.main"],
+    "api_first_request": ["-c", FIRST_REQUEST],
+    "cli_help": ["run_cli.py", "--help"],
+}
+
+
+def _environment() -> Dict[str, str]:
+    # No provider is called and no API key is needed.
+    return {**os.environ, "AI_SERVICE": "local", "PYTHONDONTWRITEBYTECODE": "1"}
+
+
+def time_scenario(arguments: List[str]) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, *arguments],
+        cwd=ROOT,
+        env=_environment(),
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start
+
+
+def top_imports(module: str, limit: int = 10) -> List[Tuple[str, float]]:
+    """Top-level imports of a module by cumulative import time in seconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=_environment(),
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Nesting is shown by indentation; keep the modules module imports
+        # directly, and module itself.
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth <= 1 and cumulative.strip().isdigit():
+            imports.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:limit]
+
+
+def run(repeat: int) -> dict:
+    # One untimed run warms the file system cache.
+    time_scenario(SCENARIOS["api_import"])
+    scenarios = {
+        name: summarize([time_scenario(arguments) for _ in range(repeat)])
+        for name, arguments in SCENARIOS.items()
+    }
+    return {"scenarios": scenarios, "top_imports": top_imports("api.main")}
+
+
+def flatten(results: dict) -> Dict[str, float]:
+    """Flat metric names used for baseline comparison."""
+    metrics = {}
+    for name, summary in results["scenarios"].items():
+        metrics[f"{name}.p50"] = summary["p50"]
+        metrics[f"{name}.max"] = summary["max"]
+    return metrics
+
+
+def print_results(results: dict) -> None:
+    table = Table(title="Cold start")
+    for column in ("scenario", "runs", "p50", "max"):
+        table.add_column(column)
+    for name, summary in results["scenarios"].items():
+        table.add_row(
+            name,
+            str(summary["count"]),
+            f"{summary['p50'] * 1000:.0f} ms",
+            f"{summary['max'] * 1000:.0f} ms",
+        )
+    console.print(table)
+
+    imports = Table(title="Slowest imports of api.main")
+    imports.add_column("module")
+    imports.add_column("cumulative")
+    for name, seconds in results["top_imports"]:
+        imports.add_row(name, f"{seconds * 1000:.0f} ms")
+    console.print(imports)
+
+
+@click.command()
+@click.option("--repeat", default=5, help="Runs per scenario")
+@click.option("--output", default=None, help="Write results as JSON")
+@click.option("--baseline", default=None, help="Baseline JSON of flat metrics")
+@click.option("--margin", default=0.2, help="Allowed regression vs baseline")
+@click.option("--save-baseline", default=None, help="Write flat metrics here")
+def main(repeat, output, baseline, margin, save_baseline):
+    with console.status("Benchmarking cold starts..."):
+        results = run(repeat)
+    print_results(results)
+
+    metrics = flatten(results)
+    if output:
+        write_json(output, results)
+    if save_baseline:
+        write_json(save_baseline, metrics)
+    if baseline:
+        with open(baseline, "r") as file:
+            regressions = compare_to_baseline(metrics, json.load(file), margin)
+        if regressions:
+            console.print("[bold red]Startup regressions:[/bold red]")
+            for regression in regressions:
+                console.print(f"  {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+End-to-end throughput benchmark of the offer pipeline.
+
+Drives OfferGeneratorService and the FastAPI app with the offline "local" AI
+service at several concurrency levels and reports p50/p95/p99 latency per
+stage and offers/sec. Runs without network access or API keys:
+
+    python -m benchmarks.throughput --concurrency 1,8,32 --requests 200 \\
+        --text-latency 0.5 --image-latency 2 --output bench/throughput.json
+"""
+
+import asyncio
+import functools
+import json
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import click
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.common import compare_to_baseline, summarize, write_json
+from configs.config import Config
+
+console = Console()
+
+
+class StageRecorder:
+    """Records the duration of wrapped methods per stage."""
+
+    def __init__(self):
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self._wrapped = []
+
+    def wrap(self, obj, method_name: str, stage: str) -> None:
+        method = getattr(obj, method_name)
+        timings = self.timings[stage]
+        self._wrapped.append((obj, method_name, obj.__dict__.get(method_name)))
+
+        if asyncio.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    timings.append(time.perf_counter() - start)
+
+        else:
+
+            @functools.wraps(method)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    timings.append(time.perf_counter() - start)
+
+        setattr(obj, method_name, timed)
+
+    def restore(self) -> None:
+        for obj, method_name, original in reversed(self._wrapped):
+            if original is None:
+                delattr(obj, method_name)
+            else:
+                setattr(obj, method_name, original)
+        self._wrapped = []
+
+
+def _use_local_services(text_generator, image_generator, options: dict) -> None:
+    from services.local_service import LocalImageService, LocalTextService
+
+    text_generator.service = LocalTextService(
+        latency=options["text_latency"],
+        jitter=options["jitter"],
+        failure_rate=options["failure_rate"],
+    )
+    image_generator.service = LocalImageService(
+        latency=options["image_latency"],
+        jitter=options["jitter"],
+        failure_rate=options["failure_rate"],
+    )
+
+
+async def _drive(concurrency: int, requests: int, make_offer) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(index: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await make_offer(index)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    wall = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "wall_seconds": wall,
+        "offers_per_sec": len(latencies) / wall if wall else 0.0,
+        "total": summarize(latencies),
+    }
+
+
+async def run_service_benchmark(concurrency: int, requests: int, options: dict) -> dict:
+    """Benchmark OfferGeneratorService.agenerate_offer directly."""
+    from generators.image_generator import ImageGenerator
+    from generators.text_generator import TextGenerator
+    from models import TextStyle
+    from services.generation_cache import CACHE_BYPASS
+    from services.image_processor import ImageProcessor
+    from services.offer_generator_service import OfferGeneratorService
+
+    text_generator = TextGenerator(service_name="local")
+    image_generator = ImageGenerator(service_name="local")
+    _use_local_services(text_generator, image_generator, options)
+    image_processor = ImageProcessor()
+    service = OfferGeneratorService(text_generator, image_generator, image_processor)
+
+    recorder = StageRecorder()
+    recorder.wrap(text_generator, "agenerate_offer_text", "text")
+    recorder.wrap(image_generator, "agenerate_image", "image")
+    recorder.wrap(image_processor, "render_offer", "overlay")
+
+    style = TextStyle(
+        font_name=Config.DEFAULT_FONT,
+        font_size=Config.DEFAULT_FONT_SIZE,
+        position=Config.DEFAULT_TEXT_POSITION,
+        text_color=Config.TEXT_COLORS[Config.DEFAULT_TEXT_COLOR],
+        bg_color=Config.BACKGROUND_COLORS[Config.DEFAULT_BG_COLOR],
+        bg_opacity=Config.DEFAULT_BG_OPACITY,
+    )
+
+    async def make_offer(index: int):
+        return await service.agenerate_offer(
+            f"Benchmark offer {index}",
+            Config.DEFAULT_WORD_LIMIT,
+            style,
+            cache_mode=CACHE_BYPASS,
+        )
+
+    result = await _drive(concurrency, requests, make_offer)
+    result["stages"] = {
+        stage: summarize(timings) for stage, timings in recorder.timings.items()
+    }
+    return result
+
+
+async def run_api_benchmark(concurrency: int, requests: int, options: dict) -> dict:
+    """Benchmark POST /generate-offer through the ASGI app, in process."""
+    import httpx
+
+    import api.main as api
+
+    services = api.services
+    _use_local_services(services.text_generator, services.image_generator, options)
+    recorder = StageRecorder()
+    recorder.wrap(services.text_generator, "agenerate_offer_text", "text")
+    recorder.wrap(services.image_generator, "agenerate_image", "image")
+    recorder.wrap(services.image_processor, "render_offer", "overlay")
+    recorder.wrap(services.image_processor, "save_offer_images", "save")
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark", timeout=None
+    ) as client:
+
+        async def make_offer(index: int):
+            response = await client.post(
+                "/generate-offer",
+                json={"prompt": f"Benchmark offer {index}", "cache_mode": "bypass"},
+            )
+            response.raise_for_status()
+
+        try:
+            result = await _drive(concurrency, requests, make_offer)
+        finally:
+            recorder.restore()
+
+    result["stages"] = {
+        stage: summarize(timings) for stage, timings in recorder.timings.items()
+    }
+    return result
+
+
+def flatten(results: Dict[str, List[dict]]) -> Dict[str, float]:
+    """Flat metric names used for baseline comparison."""
+    metrics = {}
+    for mode, runs in results.items():
+        for run in runs:
+            prefix = f"{mode}.c{run['concurrency']}"
+            metrics[f"{prefix}.offers_per_sec"] = run["offers_per_sec"]
+            metrics[f"{prefix}.total.p95"] = run["total"]["p95"]
+            for stage, summary in run["stages"].items():
+                metrics[f"{prefix}.{stage}.p95"] = summary["p95"]
+    return metrics
+
+
+def print_results(results: Dict[str, List[dict]]) -> None:
+    for mode, runs in results.items():
+        table = Table(title=f"{mode} throughput")
+        columns = ("concurrency", "offers/sec", "errors", "stage", "p50", "p95", "p99")
+        for column in columns:
+            table.add_column(column)
+        for run in runs:
+            rows = {"total": run["total"], **run["stages"]}
+            for position, (stage, summary) in enumerate(rows.items()):
+                first = position == 0
+                table.add_row(
+                    str(run["concurrency"]) if first else "",
+                    f"{run['offers_per_sec']:.1f}" if first else "",
+                    str(run["errors"]) if first else "",
+                    stage,
+                    f"{summary['p50'] * 1000:.1f} ms",
+                    f"{summary['p95'] * 1000:.1f} ms",
+                    f"{summary['p99'] * 1000:.1f} ms",
+                )
+        console.print(table)
+
+
+@click.command()
+@click.option("--concurrency", default="1,4,16", help="Comma-separated levels")
+@click.option("--requests", default=50, help="Offers per concurrency level")
+@click.option("--mode", type=click.Choice(["service", "api", "both"]), default="both")
+@click.option("--text-latency", default=0.0, help="Injected text latency (s)")
+@click.option("--image-latency", default=0.0, help="Injected image latency (s)")
+@click.option("--jitter", default=0.0, help="Uniform latency jitter (s)")
+@click.option("--failure-rate", default=0.0, help="Injected failure rate (0-1)")
+@click.option("--output", default=None, help="Write results as JSON")
+@click.option("--baseline", default=None, help="Baseline JSON of flat metrics")
+@click.option("--margin", default=0.2, help="Allowed regression vs baseline")
+@click.option("--save-baseline", default=None, help="Write flat metrics here")
+def main(
+    concurrency,
+    requests,
+    mode,
+    text_latency,
+    image_latency,
+    jitter,
+    failure_rate,
+    output,
+    baseline,
+    margin,
+    save_baseline,
+):
+    # Keep benchmark images out of the real images folder.
+    Config.IMAGES_FOLDER = tempfile.mkdtemp(prefix="offer-benchmark-")
+    Config.AI_SERVICE = "local"
+    options = {
+        "text_latency": text_latency,
+        "image_latency": image_latency,
+        "jitter": jitter,
+        "failure_rate": failure_rate,
+    }
+    levels = [int(level) for level in concurrency.split(",")]
+    modes = ["service", "api"] if mode == "both" else [mode]
+    runners = {"service": run_service_benchmark, "api": run_api_benchmark}
+
+    async def run_all() -> Dict[str, List[dict]]:
+        # One event loop for every run, the app's limiter is bound to it.
+        return {
+            name: [await runners[name](level, requests, options) for level in levels]
+            for name in modes
+        }
+
+    results = asyncio.run(run_all())
+    print_results(results)
+
+    metrics = flatten(results)
+    if output:
+        write_json(output, {"options": options, "results": results})
+    if save_baseline:
+        write_json(save_baseline, metrics)
+    if baseline:
+        with open(baseline, "r") as file:
+            regressions = compare_to_baseline(
+                metrics,
+                json.load(file),
+                margin,
+                higher_is_better=("offers_per_sec",),
+            )
+        if regressions:
+            console.print("[bold red]Throughput regressions:[/bold red]")
+            for regression in regressions:
+                console.print(f"  {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,48 @@
-import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import click
+from pydantic import ValidationError
 from rich.console import Console
 from rich.panel import Panel
 from rich.progress import Progress, SpinnerColumn, TimeElapsedColumn
 from rich.table import Table
 
+from api.schemas import OfferRequest
 from configs.config import Config
-from generators.image_generator import ImageGenerator
-from generators.text_generator import TextGenerator
 from models import TextStyle
-from services.image_processor import ImageProcessor
+from services.batch import (
+    BatchCheckpoint,
+    TextPrefetcher,
+    item_key,
+    iter_jsonl_items,
+    to_ndjson,
+)
+from services.container import ServiceContainer
+from services.font_registry import font_registry
+from services.generation_cache import CACHE_MODES, CACHE_USE
 from services.offer_generator_service import OfferGeneratorService
+from services.retention import IMAGE_KINDS, KIND_BASE
 
 console = Console()
 
 
+class DefaultCommandGroup(click.Group):
+    """Group that runs the default command when no subcommand is given."""
+
+    default_command = "generate"
+
+    def parse_args(self, ctx, args):
+        if not args or (args[0] not in self.commands and args[0] != "--help"):
+            args = [self.default_command] + list(args)
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultCommandGroup)
+def cli():
+    """Hotel offer image generator."""
+
+
 def validate_word_limit(value):
     try:
         value = int(value)
@@ -65,7 +92,7 @@ def prompt_with_choices(prompt, choices, default):
         console.print("[bold red]Invalid choice. Please try again.[/bold red]")
 
 
-@click.command()
+@cli.command("generate")
 @click.option(
     "--prompt",
     prompt="Enter the hotel offer prompt",
@@ -78,7 +105,13 @@ def prompt_with_choices(prompt, choices, default):
     default=Config.DEFAULT_WORD_LIMIT,
     help="Word limit for the offer text (1-100)",
 )
-def generate_offer(prompt, word_limit):
+@click.option(
+    "--cache-mode",
+    type=click.Choice(CACHE_MODES),
+    default=CACHE_USE,
+    help="Reuse, refresh or bypass cached provider results",
+)
+def generate_offer(prompt, word_limit, cache_mode):
     try:
         # Validate word limit
         while True:
@@ -90,7 +123,7 @@ def generate_offer(prompt, word_limit):
             )
 
         font = prompt_with_choices(
-            "Choose a font", os.listdir(Config.FONTS_FOLDER), Config.DEFAULT_FONT
+            "Choose a font", font_registry.names(), Config.DEFAULT_FONT
         )
         font_size = int(
             prompt_with_choices(
@@ -136,22 +169,10 @@ def generate_offer(prompt, word_limit):
             bg_opacity=bg_opacity,
         )
 
+        services = ServiceContainer()
         with console.status("[bold green]Initializing services...") as status:
-            text_generator = TextGenerator(service_name=Config.AI_SERVICE)
-            image_generator = ImageGenerator(service_name=Config.AI_SERVICE)
-            image_processor = ImageProcessor()
-            service = OfferGeneratorService(
-                text_generator, image_generator, image_processor
-            )
-            status.update("[bold green]Services initialized!")
-
-        with console.status("[bold green]Initializing services...") as status:
-            text_generator = TextGenerator(service_name=Config.AI_SERVICE)
-            image_generator = ImageGenerator(service_name=Config.AI_SERVICE)
-            image_processor = ImageProcessor()
-            service = OfferGeneratorService(
-                text_generator, image_generator, image_processor
-            )
+            service = services.offer_service
+            image_processor = services.image_processor
             status.update("[bold green]Services initialized!")
 
         with Progress(
@@ -187,6 +208,8 @@ def generate_offer(prompt, word_limit):
                 text_progress=update_text_progress,
                 image_progress=update_image_progress,
                 overlay_progress=update_overlay_progress,
+                concurrent=True,
+                cache_mode=cache_mode,
             )
 
         console.print(
@@ -196,17 +219,205 @@ def generate_offer(prompt, word_limit):
             )
         )
 
-        filename = image_processor.get_timestamp_filename(
-            offer_text.lower().strip().replace(" ", "_")
-        )
-
-        initial_image_name = f"{filename}_initial.jpg"
-        image_processor.save_image(initial_image, initial_image_name)
-        console.print(f"[green]Base image saved as:[/green] {initial_image_name}")
+        store = image_processor.writer.store
+        initial_image_name = image_processor.save_image(initial_image, kind=KIND_BASE)
+        if initial_image_name is not None:
+            location = store.location(initial_image_name)
+            console.print(f"[green]Base image saved as:[/green] {location}")
 
-        final_image_name = f"{filename}_final.jpg"
-        image_processor.save_image(final_image, final_image_name)
-        console.print(f"[green]Final image saved as:[/green] {final_image_name}")
+        final_image_name = image_processor.save_image(final_image)
+        if final_image_name is not None:
+            location = store.location(final_image_name)
+            console.print(f"[green]Final image saved as:[/green] {location}")
 
     except Exception as e:
         console.print(f"[bold red]An error occurred:[/bold red] {str(e)}")
+
+
+@cli.command("batch")
+@click.argument("input_file", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="NDJSON results file (default: <input>.results.jsonl)",
+)
+@click.option(
+    "--checkpoint",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Checkpoint file used to resume (default: <input>.checkpoint)",
+)
+@click.option(
+    "--concurrency",
+    default=Config.BATCH_CONCURRENCY,
+    show_default=True,
+    help="Number of offers generated in parallel",
+)
+def batch(input_file, output, checkpoint, concurrency):
+    """Generate offers for every OfferRequest line of a JSONL file."""
+    output = output or f"{input_file}.results.jsonl"
+    checkpoint = BatchCheckpoint(checkpoint or f"{input_file}.checkpoint")
+
+    with open(input_file, "r") as file:
+        items = list(iter_jsonl_items(file))
+    pending = [
+        (index, line)
+        for index, line in items
+        if not checkpoint.is_done(item_key(index, line))
+    ]
+    if len(pending) < len(items):
+        console.print(
+            f"[yellow]Resuming: {len(items) - len(pending)} of {len(items)} "
+            f"items already completed.[/yellow]"
+        )
+
+    services = ServiceContainer()
+    image_processor = services.image_processor
+    service = OfferGeneratorService(
+        services.text_generator,
+        services.image_generator,
+        image_processor,
+        max_workers=2 * concurrency,
+    )
+
+    # Texts of the items are generated in batched provider calls, a window of
+    # items ahead of the items being worked on, which then read them from the
+    # generation cache.
+    offer_requests = []
+    for _, line in pending:
+        try:
+            offer_requests.append(OfferRequest.model_validate_json(line))
+        except ValidationError:
+            offer_requests.append(None)
+    prefetcher = TextPrefetcher(
+        services.text_generator,
+        offer_requests,
+        window=concurrency * Config.TEXT_BATCH_SIZE,
+    )
+    threading.Thread(target=prefetcher.run, name="text-prefetch", daemon=True).start()
+
+    def process(position, index, line):
+        prefetcher.ready(position)
+        try:
+            offer_request = OfferRequest.model_validate_json(line)
+            with services.memory_budget.reserve():
+                offer_text, initial_image, final_image = service.generate_offer(
+                    offer_request.prompt,
+                    offer_request.word_limit,
+                    offer_request.to_text_style(),
+                    concurrent=True,
+                    cache_mode=offer_request.cache_mode,
+                )
+                # Wait for the writes so the checkpoint never lists missing
+                # images.
+                initial_image_name, final_image_name = (
+                    image_processor.save_offer_images(
+                        initial_image, final_image, wait=True
+                    )
+                )
+            return {
+                "index": index,
+                "status": "ok",
+                "offer_text": offer_text,
+                "initial_image": initial_image_name,
+                "final_image": final_image_name,
+            }
+        except ValidationError as e:
+            return {"index": index, "status": "invalid", "error": str(e)}
+        except Exception as e:
+            return {"index": index, "status": "error", "error": str(e)}
+
+    failed = 0
+    with Progress(
+        SpinnerColumn(),
+        *Progress.get_default_columns(),
+        TimeElapsedColumn(),
+        console=console,
+    ) as progress, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        task = progress.add_task(
+            "[green]Generating offers...",
+            total=len(items),
+            completed=len(items) - len(pending),
+        )
+        futures = {
+            executor.submit(process, position, index, line): item_key(index, line)
+            for position, (index, line) in enumerate(pending)
+        }
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                with open(output, "a") as file:
+                    file.write(to_ndjson(result))
+                if result["status"] == "ok":
+                    checkpoint.mark_done(futures[future])
+                else:
+                    failed += 1
+                progress.advance(task)
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            console.print(
+                "[bold yellow]Interrupted. Run the same command again to resume."
+                "[/bold yellow]"
+            )
+            raise
+
+    console.print(
+        Panel(
+            f"[bold cyan]Completed:[/bold cyan] {len(pending) - failed} "
+            f"[bold red]Failed:[/bold red] {failed}\n"
+            f"[bold cyan]Results:[/bold cyan] {output}",
+            expand=False,
+        )
+    )
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+@cli.command("gc")
+@click.option("--dry-run", is_flag=True, help="Only report what would be deleted")
+@click.option(
+    "--reindex",
+    is_flag=True,
+    help="First add stored images missing from the image index",
+)
+@click.option(
+    "--max-bytes",
+    type=int,
+    default=None,
+    help="Size cap of the stored images (default: IMAGE_RETENTION_MAX_BYTES)",
+)
+def gc(dry_run, reindex, max_bytes):
+    """Delete generated images by the retention policies."""
+    services = ServiceContainer()
+    retention = services.retention
+    if max_bytes is not None:
+        retention.max_bytes = max_bytes
+    try:
+        if reindex:
+            added = retention.reindex()
+            console.print(f"[green]Indexed {added} images.[/green]")
+        report = retention.collect(dry_run=dry_run)
+    finally:
+        services.shutdown()
+
+    table = Table(title="Would delete" if dry_run else "Deleted")
+    table.add_column("kind")
+    table.add_column("images", justify="right")
+    for kind in IMAGE_KINDS:
+        table.add_row(kind, str(report.deleted.get(kind, 0)))
+    console.print(table)
+    console.print(
+        Panel(
+            f"[bold cyan]Reclaimed:[/bold cyan] {format_bytes(report.bytes_reclaimed)} "
+            f"[bold cyan]Remaining:[/bold cyan] {format_bytes(report.bytes_remaining)}",
+            expand=False,
+        )
+    )
@@ -1,7 +1,8 @@
 import json
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
-from typing import Tuple, Callable, Dict, List
+from typing import Tuple, Callable, Dict, List, Optional
 
 load_dotenv()
 
@@ -12,7 +13,7 @@ PositionFunction = Callable[[int, int, int, int], Position]
 
 
 class Config:
-    AI_SERVICE = "openai"
+    AI_SERVICE = os.getenv("AI_SERVICE", "openai")
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
     PROMPTS_FILE = os.path.join(BASE_DIR, "prompts.json")
@@ -28,6 +29,36 @@ class Config:
     DEFAULT_WORD_LIMIT = 5
 
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    # "url" downloads the generated image, "b64_json" returns it inline and
+    # saves the second round trip.
+    OPENAI_IMAGE_RESPONSE_FORMAT = os.getenv("OPENAI_IMAGE_RESPONSE_FORMAT", "url")
+
+    # Batched text generation: offers for up to TEXT_BATCH_SIZE prompts are
+    # asked for in one provider call, and at most TEXT_MAX_CANDIDATES
+    # alternative offers for one prompt. Set TEXT_BATCH_JSON_MODE for models
+    # with JSON mode (e.g. gpt-4o); otherwise the reply format is only asked
+    # for in the prompt. Replies are validated either way, items missing from
+    # them are generated one by one.
+    TEXT_BATCH_SIZE = 20
+    TEXT_MAX_CANDIDATES = 8
+    TEXT_BATCH_JSON_MODE = os.getenv("TEXT_BATCH_JSON_MODE", "false").lower() == "true"
+
+    # Provider scheduling: rate limits per model in requests and tokens per
+    # minute (0 means unlimited), retries of 429/5xx and connection errors
+    # with jittered exponential backoff, and optional hedging of slow async
+    # calls after the given seconds.
+    PROVIDER_RATE_LIMITS: Dict[str, Dict[str, int]] = {
+        "gpt-4": {"rpm": 500, "tpm": 10000},
+        "dall-e-3": {"rpm": 7, "tpm": 0},
+    }
+    PROVIDER_RETRIES = int(os.getenv("PROVIDER_RETRIES", "4"))
+    PROVIDER_BACKOFF = 1.0
+    PROVIDER_MAX_BACKOFF = 30.0
+    PROVIDER_HEDGE_AFTER: Dict[str, float] = {}
+    # Return a placeholder text or image when the provider keeps failing,
+    # instead of failing the offer. Placeholders are flagged in the response
+    # and never cached.
+    PROVIDER_FALLBACK = os.getenv("PROVIDER_FALLBACK", "true").lower() == "true"
 
     TEXT_POSITIONS: Dict[str, PositionFunction] = {
         "top-left": lambda text_w, text_h, w, h: (10, 10),
@@ -76,7 +107,179 @@ class Config:
 
     FONT_SIZES = [12, 16, 20, 24, 28, 32, 36, 40, 48, 56, 64, 72]
 
+    # Text layout: wrap the text to a box of MAX_WIDTH x MAX_HEIGHT (fractions
+    # of the image), balance the lines and, with auto fit, shrink the font
+    # size down to TEXT_MIN_FONT_SIZE until the text fits the box.
+    DEFAULT_TEXT_WRAP = True
+    DEFAULT_TEXT_AUTO_FIT = True
+    DEFAULT_TEXT_ALIGN = "center"
+    TEXT_ALIGNMENTS = ("left", "center", "right")
+    # Extra space between lines, as a fraction of the font size
+    DEFAULT_LINE_SPACING = 0.2
+    DEFAULT_TEXT_MAX_WIDTH = 0.9
+    DEFAULT_TEXT_MAX_HEIGHT = 0.5
+    TEXT_MIN_FONT_SIZE = FONT_SIZES[0]
+    # Glyph advances are measured once per font at this size and scaled
+    LAYOUT_REFERENCE_SIZE = 256
+    GLYPH_METRICS_CACHE_SIZE = 64
+    # Rasterized text masks reused for repeated overlays of the same text
+    TEXT_MASK_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+    # Offline "local" AI service, deterministic from the prompt
+    LOCAL_TEXT_LATENCY = float(os.getenv("LOCAL_TEXT_LATENCY", "0"))
+    LOCAL_IMAGE_LATENCY = float(os.getenv("LOCAL_IMAGE_LATENCY", "0"))
+    LOCAL_LATENCY_JITTER = float(os.getenv("LOCAL_LATENCY_JITTER", "0"))
+    LOCAL_FAILURE_RATE = float(os.getenv("LOCAL_FAILURE_RATE", "0"))
+    LOCAL_SERVICE_SEED = 0
+    LOCAL_IMAGE_SIZE = (1792, 1024)
+
+    # Offer generation
+    OFFER_GENERATION_WORKERS = 8
+
+    # Maximum in-flight operations per AI service and per pipeline stage in
+    # the async path. Missing entries are unbounded.
+    PROVIDER_CONCURRENCY: Dict[str, int] = {"openai": 32}
+    STAGE_CONCURRENCY: Dict[str, int] = {
+        "text": 32,
+        "image": 16,
+        "overlay": 4,
+        "render": 2,
+        "derivative": 4,
+        "save": 4,
+    }
+
+    # Memory of the offer pipeline. In single-copy mode an offer keeps one
+    # decoded image: the generated image is encoded first, then the text is
+    # overlaid on it in place instead of on a copy.
+    PIPELINE_SINGLE_COPY = os.getenv("PIPELINE_SINGLE_COPY", "true").lower() == "true"
+    # Bytes reserved by every offer and re-render for its image buffers and
+    # encodings, and the most all of them together may reserve; new work
+    # waits until enough is released. A total of 0 disables the budget.
+    MEMORY_BUDGET_PER_REQUEST = int(
+        os.getenv("MEMORY_BUDGET_PER_REQUEST", str(24 * 1024 * 1024))
+    )
+    MEMORY_BUDGET_TOTAL = int(os.getenv("MEMORY_BUDGET_TOTAL", str(512 * 1024 * 1024)))
+
+    # Download of provider image URLs
+    IMAGE_FETCH_CONNECT_TIMEOUT = 5.0
+    IMAGE_FETCH_READ_TIMEOUT = 30.0
+    IMAGE_FETCH_MAX_BYTES = 20 * 1024 * 1024
+    IMAGE_FETCH_RETRIES = 3
+    IMAGE_FETCH_BACKOFF = 0.5
+    IMAGE_FETCH_MAX_BACKOFF = 10.0
+    IMAGE_FETCH_POOL_SIZE = 32
+
+    # Encoding and writing of output images
+    IMAGE_OUTPUT_EXTENSION = "jpg"
+    IMAGE_SAVE_OPTIONS: Dict[str, dict] = {
+        "JPEG": {"quality": 90, "progressive": True, "optimize": True},
+        "WEBP": {"quality": 85, "method": 4},
+        "PNG": {"compress_level": 6},
+    }
+    IMAGE_WRITER_WORKERS = 4
+    IMAGE_WRITER_QUEUE_SIZE = 32
+    # Wait for images to be written before responding
+    IMAGE_WRITER_WAIT = os.getenv("IMAGE_WRITER_WAIT", "false").lower() == "true"
+
+    # Storage of generated images. "local" keeps them in IMAGES_FOLDER, named
+    # by content hash and sharded into nested folders by its leading digits.
+    IMAGE_STORE = os.getenv("IMAGE_STORE", "local")
+    IMAGE_STORE_SHARD_LEVELS = 2
+
+    # Retention of generated images. Images of a kind are deleted max_age
+    # seconds after they were stored or max_idle seconds after they were last
+    # served (None: no limit); then the least recently served images go until
+    # the store is below IMAGE_RETENTION_MAX_BYTES.
+    IMAGE_RETENTION_POLICIES: Dict[str, Dict[str, Optional[float]]] = {
+        "base": {"max_age": 14 * 24 * 3600, "max_idle": 7 * 24 * 3600},
+        "final": {"max_age": None, "max_idle": 90 * 24 * 3600},
+    }
+    IMAGE_RETENTION_MAX_BYTES = int(
+        os.getenv("IMAGE_RETENTION_MAX_BYTES", str(20 * 1024 * 1024 * 1024))
+    )
+    # Retention passes run by the API in the background
+    IMAGE_GC_ENABLED = os.getenv("IMAGE_GC_ENABLED", "true").lower() == "true"
+    IMAGE_GC_INTERVAL = float(os.getenv("IMAGE_GC_INTERVAL", "3600"))
+    IMAGE_GC_BATCH_SIZE = 500
+
+    # Hot cache of encoded images served by /images
+    IMAGE_CACHE_MAX_BYTES = 128 * 1024 * 1024
+    IMAGE_CACHE_MAX_ENTRY_BYTES = 8 * 1024 * 1024
+    IMAGE_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+    # Resized and re-encoded variants served by /images?w=&fmt=
+    DERIVATIVES_FOLDER = os.path.join(BASE_DIR, "cache", "derivatives")
+    DERIVATIVES_MAX_BYTES = 1024 * 1024 * 1024
+    DERIVATIVE_WIDTHS = [160, 320, 480, 640, 960, 1280, 1792]
+
+    # Re-rendering of generated images
+    RENDER_WORKERS = 4
+    RENDER_MAX_VARIANTS = 32
+
+    # "thread" overlays and encodes in the API process, "process" dispatches
+    # both to a pool of worker processes so rendering can use every core.
+    RENDER_BACKEND = os.getenv("RENDER_BACKEND", "thread")
+    RENDER_POOL_WORKERS = int(os.getenv("RENDER_POOL_WORKERS", os.cpu_count() or 1))
+    RENDER_POOL_QUEUE_SIZE = 16
+    # Smaller images are rendered in process, shipping them to a worker costs
+    # more than it saves.
+    RENDER_POOL_MIN_PIXELS = 512 * 512
+    RENDER_POOL_START_METHOD = "spawn"
+
+    # Asynchronous /jobs API
+    JOB_STORE = "memory"
+    # Queued and running jobs; further submissions are rejected with 429
+    JOBS_MAX_IN_FLIGHT = 64
+    # Finished jobs are kept this long, and at most JOB_STORE_MAX_JOBS jobs
+    JOB_RETENTION_SECONDS = 3600
+    JOB_STORE_MAX_JOBS = 10000
+    JOB_EVENTS_KEEPALIVE = 15.0
+
+    # Metrics exposed on /metrics in the Prometheus text format
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_LATENCY_BUCKETS: List[float] = [
+        0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60
+    ]
+
+    # Batch generation
+    BATCH_CONCURRENCY = 8
+    BATCH_MAX_ITEMS = 10000
+    # Generate the texts of batch items in batched provider calls ahead of
+    # the items, into the generation cache, which the items then read them
+    # from. Texts are generated a window of items at a time, one window ahead
+    # of the items being worked on.
+    BATCH_PREFETCH_TEXTS = True
+    BATCH_PREFETCH_WINDOW = BATCH_CONCURRENCY * TEXT_BATCH_SIZE
+
+    # Concurrent identical generation requests share one provider call
+    SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+    # Generation cache for provider results
+    GENERATION_CACHE_ENABLED = (
+        os.getenv("GENERATION_CACHE_ENABLED", "true").lower() == "true"
+    )
+    GENERATION_CACHE_FOLDER = os.path.join(BASE_DIR, "cache", "generation")
+    GENERATION_CACHE_MEMORY_BYTES = 256 * 1024 * 1024
+    GENERATION_CACHE_DISK_BYTES = 4 * 1024 * 1024 * 1024
+    GENERATION_CACHE_TTL = 7 * 24 * 3600
+
+    # Font cache
+    FONT_CACHE_SIZE = 128
+    # Metadata of the fonts in FONTS_FOLDER, parsed once and kept in this index
+    FONT_INDEX_PATH = os.path.join(BASE_DIR, "cache", "fonts.json")
+    FONT_EXTENSIONS = (".ttf", ".otf")
+    FONT_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+    FONT_UPLOAD_CHUNK_BYTES = 64 * 1024
+    PRELOAD_FONTS = os.getenv("PRELOAD_FONTS", "false").lower() == "true"
+    PRELOAD_FONT_NAMES: List[str] = [DEFAULT_FONT]
+
+    # Build the generation services at API startup instead of on the first
+    # request
+    WARM_UP_SERVICES = os.getenv("WARM_UP_SERVICES", "false").lower() == "true"
+
     @staticmethod
+    @lru_cache(maxsize=1)
     def load_prompts():
+        """Prompts file, parsed once; the returned dict must not be modified."""
         with open(Config.PROMPTS_FILE, "r") as file:
             return json.load(file)
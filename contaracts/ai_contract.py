@@ -1,14 +1,129 @@
+import asyncio
 from abc import ABC, abstractmethod
+from typing import List, Tuple, Union
 from PIL import Image
 
+# Image.info key flagging a placeholder image
+FALLBACK_INFO_KEY = "fallback"
+PLACEHOLDER_IMAGE_SIZE = (1024, 1024)
+
+
+class FallbackText(str):
+    """Placeholder text returned in place of generated text."""
+
+    def __new__(cls, text: str, reason: str):
+        fallback = super().__new__(cls, text)
+        fallback.reason = reason
+        return fallback
+
+
+def fallback_image(image: Image.Image, reason: str) -> Image.Image:
+    """Flag an image as a placeholder returned in place of a generated one."""
+    image.info[FALLBACK_INFO_KEY] = reason
+    return image
+
+
+def placeholder_text(prompt: str) -> str:
+    """Text used in place of an offer the provider failed to generate."""
+    return f"Special offer for {prompt}!"
+
+
+def placeholder_image() -> Image.Image:
+    """Blank image used in place of one the provider failed to generate."""
+    return Image.new("RGB", PLACEHOLDER_IMAGE_SIZE, color="white")
+
+
+def is_placeholder_image(image: Image.Image) -> bool:
+    """
+    Whether an image is the blank placeholder.
+
+    Unlike is_fallback this also recognizes a placeholder read back from
+    bytes, where the fallback flag is lost.
+    """
+    return (
+        image.size == PLACEHOLDER_IMAGE_SIZE
+        and image.mode == "RGB"
+        and image.getextrema() == ((255, 255),) * 3
+    )
+
+
+def is_fallback(result: Union[str, Image.Image]) -> bool:
+    """
+    Whether a service returned a placeholder instead of a generated result.
+
+    Args:
+        result: A text, or an image or anything else with its Image.info,
+            e.g. an encoded image.
+    """
+    if isinstance(result, str):
+        return isinstance(result, FallbackText)
+    return FALLBACK_INFO_KEY in result.info
+
 
 class TextGenerationService(ABC):
     @abstractmethod
     def generate_text(self, prompt: str, word_limit: int) -> str:
         pass
 
+    async def agenerate_text(self, prompt: str, word_limit: int) -> str:
+        """Async variant; services without an async client run in a thread."""
+        return await asyncio.to_thread(self.generate_text, prompt, word_limit)
+
+    def generate_candidates(
+        self, prompt: str, word_limit: int, count: int
+    ) -> List[str]:
+        """
+        Alternative offers for one prompt.
+
+        Services that can return several in one call override this; by
+        default each candidate is a call of its own.
+        """
+        return [self.generate_text(prompt, word_limit) for _ in range(count)]
+
+    async def agenerate_candidates(
+        self, prompt: str, word_limit: int, count: int
+    ) -> List[str]:
+        return await asyncio.gather(
+            *(self.agenerate_text(prompt, word_limit) for _ in range(count))
+        )
+
+    def generate_texts(self, requests: List[Tuple[str, int]]) -> List[str]:
+        """
+        Offers for many (prompt, word_limit) pairs, in the same order.
+
+        Services that can generate them in one call override this; by default
+        each offer is a call of its own.
+        """
+        return [
+            self.generate_text(prompt, word_limit) for prompt, word_limit in requests
+        ]
+
+    async def agenerate_texts(self, requests: List[Tuple[str, int]]) -> List[str]:
+        return await asyncio.gather(
+            *(
+                self.agenerate_text(prompt, word_limit)
+                for prompt, word_limit in requests
+            )
+        )
+
+    def cache_identity(self, prompt: str, word_limit: int) -> dict:
+        """Everything that determines the generated text, used as cache key."""
+        return {
+            "provider": type(self).__name__,
+            "prompt": prompt,
+            "word_limit": word_limit,
+        }
+
 
 class ImageGenerationService(ABC):
     @abstractmethod
     def generate_image(self, prompt: str) -> Image.Image:
         pass
+
+    async def agenerate_image(self, prompt: str) -> Image.Image:
+        """Async variant; services without an async client run in a thread."""
+        return await asyncio.to_thread(self.generate_image, prompt)
+
+    def cache_identity(self, prompt: str) -> dict:
+        """Everything that determines the generated image, used as cache key."""
+        return {"provider": type(self).__name__, "prompt": prompt}
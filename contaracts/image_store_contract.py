@@ -0,0 +1,63 @@
+import hashlib
+from abc import ABC, abstractmethod
+from typing import Iterator, Optional
+
+
+def content_name(data: bytes, extension: str) -> str:
+    """Content-addressed name of encoded image bytes."""
+    return f"{hashlib.sha256(data).hexdigest()}.{extension.lower()}"
+
+
+class ImageStore(ABC):
+    """
+    Storage of generated images.
+
+    Images are stored under the name returned by content_name, so identical
+    bytes are stored once and a name never changes content.
+    """
+
+    def store(self, data: bytes, extension: str) -> str:
+        """
+        Store encoded image bytes under their content-addressed name.
+
+        Args:
+            data (bytes): The encoded image.
+            extension (str): File extension of the image format, e.g. "jpg".
+
+        Returns:
+            str: The name of the image.
+        """
+        name = content_name(data, extension)
+        self.put(name, data)
+        return name
+
+    @abstractmethod
+    def put(self, name: str, data: bytes) -> bool:
+        """Store data under name; returns False if it was stored already."""
+        pass
+
+    @abstractmethod
+    def get(self, name: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def exists(self, name: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete(self, name: str) -> bool:
+        pass
+
+    @abstractmethod
+    def names(self) -> Iterator[str]:
+        """Names of all stored images, in no particular order."""
+        pass
+
+    def size(self, name: str) -> Optional[int]:
+        """Size of an image in bytes, or None if it is not stored."""
+        data = self.get(name)
+        return len(data) if data is not None else None
+
+    def location(self, name: str) -> str:
+        """Where an image is stored, for display."""
+        return name
@@ -0,0 +1,35 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from models import Job
+
+
+class JobStore(ABC):
+    """Storage of offer generation jobs and their stage events."""
+
+    @abstractmethod
+    def create(self, job: Job) -> None:
+        pass
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        pass
+
+    @abstractmethod
+    def add_event(self, job_id: str, event: dict) -> None:
+        pass
+
+    @abstractmethod
+    def set_status(
+        self,
+        job_id: str,
+        status: str,
+        result: Optional[dict] = None,
+        error: Optional[dict] = None,
+    ) -> None:
+        pass
+
+    def events_since(self, job_id: str, index: int) -> List[dict]:
+        """Events of a job from the given position on."""
+        job = self.get(job_id)
+        return job.events[index:] if job is not None else []
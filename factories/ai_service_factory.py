@@ -1,7 +1,8 @@
 from contaracts.ai_contract import TextGenerationService, ImageGenerationService
-from services.openai_service import OpenAITextService, OpenAIImageService
 
 
+# Services are imported when requested, so the clients of providers that are
+# not used, e.g. openai next to local, are never loaded.
 # from services.aws_bedrock_service import AWSBedrockTextService, AWSBedrockImageService
 # from services.ollama_service import OllamaTextService, OllamaImageService
 
@@ -10,7 +11,13 @@ class AIServiceFactory:
     @staticmethod
     def get_text_service(service_name: str) -> TextGenerationService:
         if service_name == "openai":
+            from services.openai_service import OpenAITextService
+
             return OpenAITextService()
+        elif service_name == "local":
+            from services.local_service import LocalTextService
+
+            return LocalTextService()
         # elif service_name == "aws_bedrock":
         #     return AWSBedrockTextService()
         # elif service_name == "ollama":
@@ -21,7 +28,13 @@ class AIServiceFactory:
     @staticmethod
     def get_image_service(service_name: str) -> ImageGenerationService:
         if service_name == "openai":
+            from services.openai_service import OpenAIImageService
+
             return OpenAIImageService()
+        elif service_name == "local":
+            from services.local_service import LocalImageService
+
+            return LocalImageService()
         # elif service_name == "aws_bedrock":
         #     return AWSBedrockImageService()
         # elif service_name == "ollama":
@@ -0,0 +1,11 @@
+from contaracts.image_store_contract import ImageStore
+from services.image_store import LocalImageStore
+
+
+class ImageStoreFactory:
+    @staticmethod
+    def get_image_store(store_name: str) -> ImageStore:
+        if store_name == "local":
+            return LocalImageStore()
+        else:
+            raise ValueError(f"Unknown image store: {store_name}")
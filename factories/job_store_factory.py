@@ -0,0 +1,11 @@
+from contaracts.job_store_contract import JobStore
+from services.jobs import InMemoryJobStore
+
+
+class JobStoreFactory:
+    @staticmethod
+    def get_job_store(store_name: str) -> JobStore:
+        if store_name == "memory":
+            return InMemoryJobStore()
+        else:
+            raise ValueError(f"Unknown job store: {store_name}")
@@ -1,16 +1,117 @@
-from typing import Callable
+import asyncio
+from io import BytesIO
+from typing import Callable, Optional
 from PIL import Image
+from configs.config import Config
+from contaracts.ai_contract import is_fallback, is_placeholder_image
 from factories.ai_service_factory import AIServiceFactory
+from services.generation_cache import (
+    CACHE_USE,
+    CACHE_BYPASS,
+    GenerationCache,
+    get_generation_cache,
+    make_cache_key,
+)
+from services.single_flight import SingleFlight
+
+# Image.info key flagging an image that was handed to several callers
+SHARED_INFO_KEY = "shared"
+
+
+def is_shared(image: Image.Image) -> bool:
+    """Whether other callers got the same image object, so it is read-only."""
+    return bool(image.info.get(SHARED_INFO_KEY))
 
 
 class ImageGenerator:
-    def __init__(self, service_name: str = "openai"):
+    def __init__(
+        self, service_name: str = "openai", cache: Optional[GenerationCache] = None
+    ):
+        self.service_name = service_name
         self.service = AIServiceFactory.get_image_service(service_name)
+        self.cache = cache or get_generation_cache("image")
+        self.single_flight = SingleFlight("image")
+
+    def _request_key(self, prompt: str) -> str:
+        return make_cache_key(self.service.cache_identity(prompt))
+
+    def _cache_key(self, request_key: str, cache_mode: str) -> Optional[str]:
+        if self.cache is None or cache_mode == CACHE_BYPASS:
+            return None
+        return request_key
+
+    def _flight_key(self, request_key: str) -> Optional[str]:
+        return request_key if Config.SINGLE_FLIGHT_ENABLED else None
+
+    def _load_cached(self, key: str) -> Optional[Image.Image]:
+        data = self.cache.get(key)
+        if data is None:
+            return None
+        image = Image.open(BytesIO(data))
+        image.load()
+        # Earlier builds cached placeholders; they count as a miss.
+        if is_placeholder_image(image):
+            self.cache.delete(key)
+            return None
+        return image
+
+    def _store(self, key: str, image: Image.Image) -> None:
+        # Lossless and cheap to encode; the cache holds the provider's pixels.
+        buffer = BytesIO()
+        image.save(buffer, format="PNG", compress_level=1)
+        self.cache.put(key, buffer.getvalue())
+
+    def _generate(self, prompt: str, key: Optional[str]) -> Image.Image:
+        image = self.service.generate_image(prompt)
+        # Placeholders are not cached, the next request asks the provider again.
+        if key and not is_fallback(image):
+            self._store(key, image)
+        return image
+
+    async def _agenerate(self, prompt: str, key: Optional[str]) -> Image.Image:
+        image = await self.service.agenerate_image(prompt)
+        if key and not is_fallback(image):
+            await asyncio.to_thread(self._store, key, image)
+        return image
 
     def generate_image(
-        self, prompt: str, progress_callback: Callable[[float], None] = None
+        self,
+        prompt: str,
+        progress_callback: Callable[[float], None] = None,
+        cache_mode: str = CACHE_USE,
     ) -> Image.Image:
-        image = self.service.generate_image(prompt)
+        request_key = self._request_key(prompt)
+        key = self._cache_key(request_key, cache_mode)
+        image = self._load_cached(key) if key and cache_mode == CACHE_USE else None
+        if image is None:
+            # Identical requests in flight share one provider call, and the
+            # image object; a shared image is only read from here on.
+            image, shared = self.single_flight.do_shared(
+                self._flight_key(request_key), self._generate, prompt, key
+            )
+            if shared:
+                image.info[SHARED_INFO_KEY] = True
         if progress_callback:
             progress_callback(100)  # Assuming image generation is a single step process
         return image
+
+    async def agenerate_image(
+        self,
+        prompt: str,
+        progress_callback: Callable[[float], None] = None,
+        cache_mode: str = CACHE_USE,
+    ) -> Image.Image:
+        request_key = self._request_key(prompt)
+        key = self._cache_key(request_key, cache_mode)
+        image = None
+        if key and cache_mode == CACHE_USE:
+            image = await asyncio.to_thread(self._load_cached, key)
+        if image is None:
+            image, shared = await self.single_flight.ado_shared(
+                self._flight_key(request_key), self._agenerate, prompt, key
+            )
+            if shared:
+                image.info[SHARED_INFO_KEY] = True
+        if progress_callback:
+            progress_callback(100)
+        return image
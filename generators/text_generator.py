@@ -1,18 +1,206 @@
-from typing import Callable
+import asyncio
+from typing import Callable, Dict, List, Optional, Tuple
+from configs.config import Config
+from contaracts.ai_contract import is_fallback, placeholder_text
 from factories.ai_service_factory import AIServiceFactory
+from services.concurrency import ConcurrencyLimiter
+from services.generation_cache import (
+    CACHE_USE,
+    CACHE_BYPASS,
+    GenerationCache,
+    get_generation_cache,
+    make_cache_key,
+)
+from services.single_flight import SingleFlight
 
 
 class TextGenerator:
-    def __init__(self, service_name: str = "openai"):
+    def __init__(
+        self, service_name: str = "openai", cache: Optional[GenerationCache] = None
+    ):
+        self.service_name = service_name
         self.service = AIServiceFactory.get_text_service(service_name)
+        self.cache = cache or get_generation_cache("text")
+        self.single_flight = SingleFlight("text")
+
+    def _request_key(self, prompt: str, word_limit: int) -> str:
+        return make_cache_key(self.service.cache_identity(prompt, word_limit))
+
+    def _cache_key(self, request_key: str, cache_mode: str) -> Optional[str]:
+        if self.cache is None or cache_mode == CACHE_BYPASS:
+            return None
+        return request_key
+
+    def _flight_key(self, request_key: str) -> Optional[str]:
+        return request_key if Config.SINGLE_FLIGHT_ENABLED else None
+
+    def _read_cache(self, key: str, prompt: str) -> Optional[str]:
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+        text = cached.decode("utf-8")
+        # Earlier builds cached placeholders; they count as a miss.
+        if text == placeholder_text(prompt):
+            self.cache.delete(key)
+            return None
+        return text
+
+    def _generate(self, prompt: str, word_limit: int, key: Optional[str]) -> str:
+        text = self.service.generate_text(prompt, word_limit)
+        # Placeholders are not cached, the next request asks the provider again.
+        if key and not is_fallback(text):
+            self.cache.put(key, text.encode("utf-8"))
+        return text
+
+    async def _agenerate(self, prompt: str, word_limit: int, key: Optional[str]) -> str:
+        text = await self.service.agenerate_text(prompt, word_limit)
+        if key and not is_fallback(text):
+            await asyncio.to_thread(self.cache.put, key, text.encode("utf-8"))
+        return text
 
     def generate_offer_text(
         self,
         prompt: str,
         word_limit: int,
         progress_callback: Callable[[float], None] = None,
+        cache_mode: str = CACHE_USE,
     ) -> str:
-        text = self.service.generate_text(prompt, word_limit)
+        request_key = self._request_key(prompt, word_limit)
+        key = self._cache_key(request_key, cache_mode)
+        text = None
+        if key and cache_mode == CACHE_USE:
+            text = self._read_cache(key, prompt)
+        if text is None:
+            # Identical requests in flight share one provider call.
+            text = self.single_flight.do(
+                self._flight_key(request_key), self._generate, prompt, word_limit, key
+            )
         if progress_callback:
             progress_callback(100)  # Assuming text generation is a single step process
         return text
+
+    async def agenerate_offer_text(
+        self,
+        prompt: str,
+        word_limit: int,
+        progress_callback: Callable[[float], None] = None,
+        cache_mode: str = CACHE_USE,
+    ) -> str:
+        request_key = self._request_key(prompt, word_limit)
+        key = self._cache_key(request_key, cache_mode)
+        text = None
+        if key and cache_mode == CACHE_USE:
+            text = await asyncio.to_thread(self._read_cache, key, prompt)
+        if text is None:
+            text = await self.single_flight.ado(
+                self._flight_key(request_key), self._agenerate, prompt, word_limit, key
+            )
+        if progress_callback:
+            progress_callback(100)
+        return text
+
+    def _store_generated(self, request_key: str, text: str, cache_mode: str) -> None:
+        key = self._cache_key(request_key, cache_mode)
+        if key and not is_fallback(text):
+            self.cache.put(key, text.encode("utf-8"))
+
+    def _cached_texts(
+        self, requests: Dict[str, Tuple[str, int]], cache_mode: str
+    ) -> Dict[str, str]:
+        texts: Dict[str, str] = {}
+        if cache_mode != CACHE_USE:
+            return texts
+        for request_key, (prompt, _) in requests.items():
+            key = self._cache_key(request_key, cache_mode)
+            cached = self._read_cache(key, prompt) if key else None
+            if cached is not None:
+                texts[request_key] = cached
+        return texts
+
+    def _batches(self, missing: List[str]) -> List[List[str]]:
+        size = Config.TEXT_BATCH_SIZE
+        return [missing[start : start + size] for start in range(0, len(missing), size)]
+
+    def generate_offer_texts(
+        self, requests: List[Tuple[str, int]], cache_mode: str = CACHE_USE
+    ) -> List[str]:
+        """
+        Generate offer texts for many prompts.
+
+        Texts not in the generation cache are asked for in batched provider
+        calls of up to TEXT_BATCH_SIZE prompts, and cached like texts
+        generated one by one. Repeated requests are generated once.
+
+        Args:
+            requests (List[Tuple[str, int]]): (prompt, word_limit) pairs.
+            cache_mode (str): Generation cache mode, "use", "refresh" or
+                "bypass".
+
+        Returns:
+            List[str]: The offer texts, in the order of requests.
+        """
+        keys = [self._request_key(*request) for request in requests]
+        unique = dict(zip(keys, requests))
+        texts = self._cached_texts(unique, cache_mode)
+        missing = [request_key for request_key in unique if request_key not in texts]
+        for batch in self._batches(missing):
+            generated = self.service.generate_texts([unique[key] for key in batch])
+            for request_key, text in zip(batch, generated):
+                texts[request_key] = text
+                self._store_generated(request_key, text, cache_mode)
+        return [texts[request_key] for request_key in keys]
+
+    async def agenerate_offer_texts(
+        self,
+        requests: List[Tuple[str, int]],
+        cache_mode: str = CACHE_USE,
+        limiter: Optional[ConcurrencyLimiter] = None,
+    ) -> List[str]:
+        """
+        Async variant of generate_offer_texts; batches are sent concurrently,
+        each provider call holding a "text" slot of the limiter, if given.
+        """
+        keys = [self._request_key(*request) for request in requests]
+        unique = dict(zip(keys, requests))
+        texts = await asyncio.to_thread(self._cached_texts, unique, cache_mode)
+        missing = [request_key for request_key in unique if request_key not in texts]
+        batches = self._batches(missing)
+
+        async def generate(batch: List[str]) -> List[str]:
+            batch_requests = [unique[key] for key in batch]
+            if limiter is None:
+                return await self.service.agenerate_texts(batch_requests)
+            async with limiter.limit("text", provider=self.service_name):
+                return await self.service.agenerate_texts(batch_requests)
+
+        results = await asyncio.gather(*(generate(batch) for batch in batches))
+        for batch, generated in zip(batches, results):
+            for request_key, text in zip(batch, generated):
+                texts[request_key] = text
+                await asyncio.to_thread(
+                    self._store_generated, request_key, text, cache_mode
+                )
+        return [texts[request_key] for request_key in keys]
+
+    def generate_offer_candidates(
+        self, prompt: str, word_limit: int, count: int
+    ) -> List[str]:
+        """
+        Generate alternative offer texts for one prompt, e.g. for A/B tests, in
+        one provider call where the service supports it. Candidates are not
+        cached.
+
+        Args:
+            prompt (str): The hotel offer prompt.
+            word_limit (int): Word limit for each offer text.
+            count (int): Number of candidates.
+
+        Returns:
+            List[str]: The candidates.
+        """
+        return self.service.generate_candidates(prompt, word_limit, count)
+
+    async def agenerate_offer_candidates(
+        self, prompt: str, word_limit: int, count: int
+    ) -> List[str]:
+        return await self.service.agenerate_candidates(prompt, word_limit, count)
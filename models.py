@@ -1,5 +1,7 @@
-from dataclasses import dataclass
-from typing import Tuple
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional, Tuple
+
+from configs.config import Config
 
 
 @dataclass
@@ -10,3 +12,32 @@ class TextStyle:
     text_color: Tuple[int, int, int]
     bg_color: Tuple[int, int, int]
     bg_opacity: float
+    # Layout, see the text layout settings in Config. With auto_fit,
+    # font_size is the largest size tried.
+    wrap: bool = Config.DEFAULT_TEXT_WRAP
+    auto_fit: bool = Config.DEFAULT_TEXT_AUTO_FIT
+    align: str = Config.DEFAULT_TEXT_ALIGN
+    line_spacing: float = Config.DEFAULT_LINE_SPACING
+    max_width: float = Config.DEFAULT_TEXT_MAX_WIDTH
+    max_height: float = Config.DEFAULT_TEXT_MAX_HEIGHT
+    min_font_size: int = Config.TEXT_MIN_FONT_SIZE
+
+
+@dataclass
+class Job:
+    id: str
+    request: dict
+    # "queued", "running", "succeeded" or "failed"
+    status: str = "queued"
+    created_at: float = 0.0
+    updated_at: float = 0.0
+    events: List[dict] = field(default_factory=list)
+    result: Optional[dict] = None
+    error: Optional[dict] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> dict:
+        return asdict(self)
@@ -1,4 +1,4 @@
-from cli.main import generate_offer
+from cli.main import cli
 
 if __name__ == "__main__":
-    generate_offer()
+    cli()
@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Set, Tuple
+
+from configs.config import Config
+from services.generation_cache import CACHE_USE
+
+if TYPE_CHECKING:
+    from api.schemas import OfferRequest
+    from generators.text_generator import TextGenerator
+    from services.concurrency import ConcurrencyLimiter
+
+logger = logging.getLogger(__name__)
+
+
+def iter_jsonl_items(lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (index, line) for every non-blank line of a JSONL document.
+
+    The index counts non-blank lines only, so it is stable regardless of
+    trailing newlines or blank separator lines.
+    """
+    index = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        yield index, line
+        index += 1
+
+
+def item_key(index: int, line: str) -> str:
+    """Identify a batch item by its position and content."""
+    digest = hashlib.sha256(line.encode("utf-8")).hexdigest()[:16]
+    return f"{index}:{digest}"
+
+
+class BatchCheckpoint:
+    """
+    Append-only record of completed batch items.
+
+    Every completed item is written and flushed as soon as it finishes, so an
+    interrupted run can be resumed without regenerating finished items.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.completed: Set[str] = set()
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                self.completed = {line.strip() for line in file if line.strip()}
+
+    def is_done(self, key: str) -> bool:
+        return key in self.completed
+
+    def mark_done(self, key: str) -> None:
+        with self._lock:
+            with open(self.path, "a") as file:
+                file.write(key + "\n")
+                file.flush()
+            self.completed.add(key)
+
+
+def to_ndjson(result: dict) -> str:
+    return json.dumps(result) + "\n"
+
+
+def texts_to_prefetch(
+    text_generator: "TextGenerator", offer_requests: Iterable["OfferRequest"]
+) -> List[Tuple[str, int]]:
+    """
+    (prompt, word_limit) of the batch items whose texts are worth generating
+    up front: those of items reading the generation cache, when there are
+    several of them.
+    """
+    if not Config.BATCH_PREFETCH_TEXTS or text_generator.cache is None:
+        return []
+    requests = [
+        (offer_request.prompt, offer_request.word_limit)
+        for offer_request in offer_requests
+        if offer_request.cache_mode == CACHE_USE
+    ]
+    return requests if len(requests) > 1 else []
+
+
+def prefetch_texts(
+    text_generator: "TextGenerator", offer_requests: Iterable["OfferRequest"]
+) -> None:
+    """
+    Generate the texts of batch items in batched provider calls, into the
+    generation cache that the items then read them from.
+
+    Failures are logged only; the items then generate their texts one by one.
+    """
+    requests = texts_to_prefetch(text_generator, offer_requests)
+    if not requests:
+        return
+    try:
+        text_generator.generate_offer_texts(requests)
+    except Exception as e:
+        logger.warning(f"Prefetching batch texts failed: {str(e)}")
+
+
+async def aprefetch_texts(
+    text_generator: "TextGenerator",
+    offer_requests: Iterable["OfferRequest"],
+    limiter: Optional["ConcurrencyLimiter"] = None,
+) -> None:
+    """
+    Async variant of prefetch_texts; each provider call holds a "text" slot
+    of the limiter, if given.
+    """
+    requests = texts_to_prefetch(text_generator, offer_requests)
+    if not requests:
+        return
+    try:
+        await text_generator.agenerate_offer_texts(requests, limiter=limiter)
+    except Exception as e:
+        logger.warning(f"Prefetching batch texts failed: {str(e)}")
+
+
+class TextPrefetcher:
+    """
+    Prefetches the texts of batch items a window of items at a time, one
+    window ahead of the items being worked on.
+
+    The first items only wait for the texts of their own window rather than
+    of the whole batch, and the texts of later windows are generated while
+    the images of earlier items are. Items are numbered by their position in
+    the batch; invalid items are None.
+    """
+
+    def __init__(
+        self,
+        text_generator: "TextGenerator",
+        offer_requests: List[Optional["OfferRequest"]],
+        limiter: Optional["ConcurrencyLimiter"] = None,
+        window: Optional[int] = None,
+    ):
+        self.text_generator = text_generator
+        self.limiter = limiter
+        self.window = window or Config.BATCH_PREFETCH_WINDOW
+        self.windows = [
+            [
+                offer_request
+                for offer_request in offer_requests[start : start + self.window]
+                if offer_request is not None
+            ]
+            for start in range(0, len(offer_requests), self.window)
+        ]
+        # Whether an item of a window was started, and its texts prefetched;
+        # threading events for the thread variants, asyncio ones otherwise.
+        self._started = [threading.Event() for _ in self.windows]
+        self._prefetched = [threading.Event() for _ in self.windows]
+        self._astarted = [asyncio.Event() for _ in self.windows]
+        self._aprefetched = [asyncio.Event() for _ in self.windows]
+
+    def run(self) -> None:
+        """Prefetch the windows in order, on a thread of its own."""
+        for number, offer_requests in enumerate(self.windows):
+            if number > 0:
+                self._started[number - 1].wait()
+            try:
+                prefetch_texts(self.text_generator, offer_requests)
+            finally:
+                self._prefetched[number].set()
+
+    def ready(self, position: int) -> None:
+        """Wait until the window of the item at position is prefetched."""
+        number = position // self.window
+        self._started[number].set()
+        self._prefetched[number].wait()
+
+    async def arun(self) -> None:
+        """Async variant of run, as a task of its own."""
+        for number, offer_requests in enumerate(self.windows):
+            if number > 0:
+                await self._astarted[number - 1].wait()
+            try:
+                await aprefetch_texts(self.text_generator, offer_requests, self.limiter)
+            finally:
+                self._aprefetched[number].set()
+
+    async def aready(self, position: int) -> None:
+        """Async variant of ready."""
+        number = position // self.window
+        self._astarted[number].set()
+        await self._aprefetched[number].wait()
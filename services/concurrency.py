@@ -0,0 +1,74 @@
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from configs.config import Config
+
+
+class ConcurrencyLimiter:
+    """
+    Bounds the number of in-flight operations per provider and per stage.
+
+    Keys without a configured limit are not bounded. A provider slot is
+    acquired before the stage slot, so work waiting on a busy provider does
+    not hold a stage slot.
+    """
+
+    def __init__(
+        self,
+        provider_limits: Dict[str, int] = None,
+        stage_limits: Dict[str, int] = None,
+    ):
+        self.provider_limits = dict(
+            Config.PROVIDER_CONCURRENCY if provider_limits is None else provider_limits
+        )
+        self.stage_limits = dict(
+            Config.STAGE_CONCURRENCY if stage_limits is None else stage_limits
+        )
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Dict[str, int] = {}
+
+    def _semaphore(self, key: str, limit: Optional[int]) -> Optional[asyncio.Semaphore]:
+        if not limit:
+            return None
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.Semaphore(limit)
+        return self._semaphores[key]
+
+    @asynccontextmanager
+    async def _acquire(self, key: str, limit: Optional[int]) -> AsyncIterator[None]:
+        semaphore = self._semaphore(key, limit)
+        if semaphore is not None:
+            await semaphore.acquire()
+        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            self._in_flight[key] -= 1
+            if semaphore is not None:
+                semaphore.release()
+
+    @asynccontextmanager
+    async def limit(self, stage: str, provider: str = None) -> AsyncIterator[None]:
+        """
+        Hold a slot for the given stage and, optionally, provider.
+
+        Args:
+            stage (str): Pipeline stage, e.g. "text", "image", "overlay", "save".
+            provider (str): AI service name the stage calls, if any.
+        """
+        async with AsyncExitStack() as stack:
+            if provider is not None:
+                await stack.enter_async_context(
+                    self._acquire(
+                        f"provider:{provider}", self.provider_limits.get(provider)
+                    )
+                )
+            await stack.enter_async_context(
+                self._acquire(f"stage:{stage}", self.stage_limits.get(stage))
+            )
+            yield
+
+    def stats(self) -> Dict[str, int]:
+        """Number of operations currently holding a slot, per key."""
+        return dict(self._in_flight)
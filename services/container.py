@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import threading
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional
+
+from configs.config import Config
+
+if TYPE_CHECKING:
+    from contaracts.image_store_contract import ImageStore
+    from generators.image_generator import ImageGenerator
+    from generators.text_generator import TextGenerator
+    from services.concurrency import ConcurrencyLimiter
+    from services.derivatives import DerivativeStore
+    from services.image_cache import EncodedImageCache
+    from services.image_processor import ImageProcessor
+    from services.jobs import JobManager
+    from services.memory_budget import MemoryBudget
+    from services.offer_generator_service import OfferGeneratorService
+    from services.render_pool import RenderPool
+    from services.retention import ImageIndex, ImageRetention
+
+JobRunner = Callable[[dict], Awaitable[dict]]
+
+
+class ServiceContainer:
+    """
+    Lazily built services shared by the API and the CLI.
+
+    Every service is created, and its module imported, on first use, so
+    importing the API or starting the CLI costs neither provider clients nor
+    folders nor worker pools until a request needs them. Services are built
+    once per container, also when first used from several threads at once.
+    """
+
+    def __init__(
+        self,
+        service_name: str = Config.AI_SERVICE,
+        render_backend: str = Config.RENDER_BACKEND,
+        job_runner: Optional[JobRunner] = None,
+    ):
+        self.service_name = service_name
+        self.render_backend = render_backend
+        self.job_runner = job_runner
+        self.logger = logging.getLogger(__name__)
+        self._services: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def _get(self, name: str, build: Callable[[], Any]) -> Any:
+        try:
+            return self._services[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._services:
+                self._services[name] = build()
+            return self._services[name]
+
+    def built(self, name: str) -> bool:
+        """Whether the named service has been created."""
+        return name in self._services
+
+    @property
+    def text_generator(self) -> "TextGenerator":
+        def build():
+            from generators.text_generator import TextGenerator
+
+            return TextGenerator(service_name=self.service_name)
+
+        return self._get("text_generator", build)
+
+    @property
+    def image_generator(self) -> "ImageGenerator":
+        def build():
+            from generators.image_generator import ImageGenerator
+
+            return ImageGenerator(service_name=self.service_name)
+
+        return self._get("image_generator", build)
+
+    @property
+    def image_store(self) -> "ImageStore":
+        def build():
+            from factories.image_store_factory import ImageStoreFactory
+
+            return ImageStoreFactory.get_image_store(Config.IMAGE_STORE)
+
+        return self._get("image_store", build)
+
+    @property
+    def image_index(self) -> "ImageIndex":
+        def build():
+            from services.retention import ImageIndex
+
+            return ImageIndex()
+
+        return self._get("image_index", build)
+
+    @property
+    def retention(self) -> "ImageRetention":
+        def build():
+            from services.retention import ImageRetention
+
+            return ImageRetention(
+                self.image_store, self.image_index, cache=self.image_cache
+            )
+
+        return self._get("retention", build)
+
+    @property
+    def image_cache(self) -> "EncodedImageCache":
+        def build():
+            from services.image_cache import EncodedImageCache
+
+            return EncodedImageCache()
+
+        return self._get("image_cache", build)
+
+    @property
+    def derivative_store(self) -> "DerivativeStore":
+        def build():
+            from services.derivatives import DerivativeStore
+
+            return DerivativeStore(images=self.image_store)
+
+        return self._get("derivative_store", build)
+
+    @property
+    def render_pool(self) -> Optional["RenderPool"]:
+        def build():
+            if self.render_backend != "process":
+                return None
+            from services.render_pool import RenderPool
+
+            return RenderPool()
+
+        return self._get("render_pool", build)
+
+    @property
+    def image_processor(self) -> "ImageProcessor":
+        def build():
+            from services.image_processor import ImageProcessor
+            from services.image_writer import ImageWriter
+
+            return ImageProcessor(
+                writer=ImageWriter(
+                    cache=self.image_cache,
+                    store=self.image_store,
+                    index=self.image_index,
+                ),
+                render_pool=self.render_pool,
+            )
+
+        return self._get("image_processor", build)
+
+    @property
+    def limiter(self) -> "ConcurrencyLimiter":
+        def build():
+            from services.concurrency import ConcurrencyLimiter
+
+            return ConcurrencyLimiter()
+
+        return self._get("limiter", build)
+
+    @property
+    def memory_budget(self) -> "MemoryBudget":
+        def build():
+            from services.memory_budget import MemoryBudget
+
+            return MemoryBudget()
+
+        return self._get("memory_budget", build)
+
+    @property
+    def offer_service(self) -> "OfferGeneratorService":
+        def build():
+            from services.offer_generator_service import OfferGeneratorService
+
+            return OfferGeneratorService(
+                self.text_generator,
+                self.image_generator,
+                self.image_processor,
+                limiter=self.limiter,
+            )
+
+        return self._get("offer_service", build)
+
+    @property
+    def job_manager(self) -> "JobManager":
+        def build():
+            from factories.job_store_factory import JobStoreFactory
+            from services.jobs import JobManager
+
+            if self.job_runner is None:
+                raise RuntimeError("The container has no job runner")
+            return JobManager(
+                JobStoreFactory.get_job_store(Config.JOB_STORE), self.job_runner
+            )
+
+        return self._get("job_manager", build)
+
+    def warm_up(self) -> None:
+        """Build the services needed to generate offers."""
+        self.offer_service
+
+    def start(self) -> None:
+        """Start the background workers of the services already built."""
+        if Config.PRELOAD_FONTS:
+            from services.font_cache import font_cache
+
+            font_cache.preload(Config.PRELOAD_FONT_NAMES, Config.FONT_SIZES)
+        if self.built("render_pool") and self.render_pool is not None:
+            self.render_pool.start()
+
+    async def collect_images_periodically(self, interval: float) -> None:
+        """Run a retention pass over the stored images every interval seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.retention.collect)
+            except Exception as e:
+                self.logger.error(f"Error in image retention: {str(e)}")
+
+    def shutdown(self) -> None:
+        """Stop the services that were built, waiting for pending writes."""
+        if self.built("render_pool") and self.render_pool is not None:
+            self.render_pool.shutdown(wait=True)
+        if self.built("image_processor"):
+            self.image_processor.writer.shutdown(wait=True)
+        if self.built("image_index"):
+            self.image_index.close()
+
+    async def ashutdown(self) -> None:
+        """Async variant of shutdown, which also stops the jobs in flight."""
+        from services.http_client import close_image_fetcher
+
+        if self.built("job_manager"):
+            await self.job_manager.shutdown()
+        await close_image_fetcher()
+        self.shutdown()
@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from io import BytesIO
+from typing import TYPE_CHECKING, Dict, Optional
+
+from PIL import Image
+
+from configs.config import Config
+from services.image_writer import encode_image, write_atomic
+
+if TYPE_CHECKING:
+    from contaracts.image_store_contract import ImageStore
+
+DERIVATIVE_FORMATS = {"jpeg": "JPEG", "webp": "WEBP", "png": "PNG"}
+FORMAT_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}
+
+
+def resize_to_width(image: Image.Image, width: int) -> Image.Image:
+    """
+    Downscale an image to the given width, keeping the aspect ratio.
+
+    JPEG sources are decoded at a reduced scale with draft, and large ratios
+    are first shrunk with the cheap integer reduce before the final
+    high-quality resample. Images are never upscaled.
+    """
+    if width >= image.width:
+        image.load()
+        return image
+    height = max(1, round(image.height * width / image.width))
+    if image.format == "JPEG":
+        # The decoder picks the smallest DCT scale that is still >= size.
+        image.draft("RGB", (width, height))
+    factor = image.width // (width * 2)
+    if factor > 1:
+        image = image.reduce(factor)
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+class DerivativeStore:
+    """
+    On-disk cache of resized and re-encoded variants of generated images.
+
+    Variants are produced on first request from the images in the image
+    store. Concurrent requests for the same
+    variant share a single production. The cache is bounded by total bytes
+    with LRU eviction.
+    """
+
+    def __init__(
+        self,
+        folder: str = Config.DERIVATIVES_FOLDER,
+        max_bytes: int = Config.DERIVATIVES_MAX_BYTES,
+        images: Optional["ImageStore"] = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        if images is None:
+            from factories.image_store_factory import ImageStoreFactory
+
+            images = ImageStoreFactory.get_image_store(Config.IMAGE_STORE)
+        self.images = images
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        if self._index is None:
+            os.makedirs(self.folder, exist_ok=True)
+            entries = sorted(
+                (
+                    entry
+                    for entry in os.scandir(self.folder)
+                    if entry.is_file() and not entry.name.startswith(".")
+                ),
+                key=lambda entry: entry.stat().st_atime,
+            )
+            self._index = OrderedDict(
+                (entry.name, entry.stat().st_size) for entry in entries
+            )
+            self._bytes = sum(self._index.values())
+        return self._index
+
+    def _name(self, source: str, width: Optional[int], image_format: str) -> str:
+        # Image names are content addressed, the name identifies the source.
+        identity = ":".join(str(part) for part in (source, width, image_format))
+        digest = hashlib.sha256(identity.encode("utf-8")).hexdigest()
+        return f"{digest}.{FORMAT_EXTENSIONS[image_format]}"
+
+    def get(self, source: str, width: Optional[int], image_format: str) -> bytes:
+        """
+        Get a variant of a source image, producing it if necessary.
+
+        Args:
+            source (str): Name of the original image in the image store.
+            width (Optional[int]): Target width, or None to keep the width.
+            image_format (str): PIL format name of the variant.
+
+        Returns:
+            bytes: The encoded variant.
+        """
+        name = self._name(source, width, image_format)
+        path = os.path.join(self.folder, name)
+
+        with self._lock:
+            index = self._load_index()
+            if name in index:
+                index.move_to_end(name)
+                self.hits += 1
+                leader, future = False, None
+            elif name in self._in_flight:
+                self.coalesced += 1
+                leader, future = False, self._in_flight[name]
+            else:
+                self.misses += 1
+                leader, future = True, Future()
+                self._in_flight[name] = future
+
+        if future is None:
+            try:
+                with open(path, "rb") as file:
+                    return file.read()
+            except FileNotFoundError:
+                with self._lock:
+                    self._forget(name)
+                return self.get(source, width, image_format)
+
+        if not leader:
+            return future.result()
+
+        try:
+            data = self._produce(source, width, image_format, path)
+            future.set_result(data)
+            return data
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[name]
+                if future.exception() is None:
+                    self._add(name, len(future.result()))
+
+    def _produce(
+        self, source: str, width: Optional[int], image_format: str, path: str
+    ) -> bytes:
+        source_data = self.images.get(source)
+        if source_data is None:
+            raise FileNotFoundError(f"Image not found: {source}")
+        with Image.open(BytesIO(source_data)) as image:
+            if width is not None:
+                image = resize_to_width(image, width)
+            data = encode_image(image, image_format)
+        write_atomic(path, data)
+        return data
+
+    def _add(self, name: str, size: int) -> None:
+        index = self._load_index()
+        index[name] = size
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(index) > 1:
+            evicted = next(iter(index))
+            self._forget(evicted)
+            try:
+                os.remove(os.path.join(self.folder, evicted))
+            except OSError:
+                pass
+
+    def _forget(self, name: str) -> None:
+        size = self._index.pop(name, None)
+        if size is not None:
+            self._bytes -= size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._index or ()),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
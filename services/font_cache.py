@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from PIL import ImageFont
+
+from configs.config import Config
+from services.metrics import time_stage
+
+FontKey = Tuple[str, int]
+
+
+class FontCache:
+    """
+    Process-wide LRU cache of loaded fonts keyed by (font file, size).
+
+    Fallback fonts are cached as well, so a missing font is only reported once
+    per key instead of on every overlay.
+    """
+
+    def __init__(self, max_size: int = Config.FONT_CACHE_SIZE):
+        self.logger = logging.getLogger(__name__)
+        self.max_size = max_size
+        self._fonts: "OrderedDict[FontKey, ImageFont.FreeTypeFont]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, font_name: str, size: int) -> ImageFont.FreeTypeFont:
+        """
+        Get a font from the cache, loading it on a miss.
+
+        Args:
+            font_name (str): Name of the font file.
+            size (int): Font size.
+
+        Returns:
+            ImageFont.FreeTypeFont: The font object.
+        """
+        key = (font_name, size)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                self.hits += 1
+                return font
+            self.misses += 1
+
+        # Load outside the lock so a slow parse does not block other lookups.
+        font = self._load(font_name, size)
+
+        with self._lock:
+            self._fonts[key] = font
+            self._fonts.move_to_end(key)
+            while len(self._fonts) > self.max_size:
+                self._fonts.popitem(last=False)
+                self.evictions += 1
+        return font
+
+    def _load(self, font_name: str, size: int) -> ImageFont.FreeTypeFont:
+        font_path = os.path.join(Config.FONTS_FOLDER, font_name)
+        try:
+            with time_stage("font_load"):
+                return ImageFont.truetype(font_path, size)
+        except IOError:
+            self.logger.warning(f"Font {font_name} not found. Using default font.")
+            return ImageFont.load_default().font_variant(size=size)
+
+    def preload(self, font_names: Iterable[str], sizes: Iterable[int]) -> None:
+        """
+        Load every combination of the given fonts and sizes into the cache.
+
+        Args:
+            font_names (Iterable[str]): Names of the font files.
+            sizes (Iterable[int]): Font sizes.
+        """
+        sizes = list(sizes)
+        for font_name in font_names:
+            for size in sizes:
+                self.get(font_name, size)
+
+    def invalidate(self, font_name: Optional[str] = None) -> None:
+        """
+        Drop cached entries for one font file, or all entries if no name is given.
+
+        Args:
+            font_name (Optional[str]): Name of the font file to invalidate.
+        """
+        with self._lock:
+            if font_name is None:
+                self._fonts.clear()
+                return
+            for key in [key for key in self._fonts if key[0] == font_name]:
+                del self._fonts[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._fonts),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+font_cache = FontCache()
@@ -0,0 +1,419 @@
+import bisect
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+from dataclasses import asdict, dataclass
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from PIL import ImageFont
+
+from configs.config import Config
+from services.image_writer import write_atomic
+
+SFNT_VERSIONS = (b"\x00\x01\x00\x00", b"OTTO", b"true")
+
+# cmap subtables by preference: (platform, encoding). Unicode full
+# repertoire first, then the Basic Multilingual Plane, then Windows symbol.
+CMAP_PREFERENCE = [(3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0)]
+CMAP_SYMBOL = (3, 0)
+
+# Inclusive code point ranges
+Coverage = List[Tuple[int, int]]
+
+
+class FontError(ValueError):
+    """Raised for files that are not usable TrueType or OpenType fonts."""
+
+
+class FontTooLargeError(FontError):
+    """Raised when an uploaded font exceeds the size limit."""
+
+
+def _ranges(codes: List[int]) -> Coverage:
+    ranges: Coverage = []
+    for code in sorted(set(codes)):
+        if ranges and code == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], code)
+        else:
+            ranges.append((code, code))
+    return ranges
+
+
+def _cmap_format_4(data: bytes, offset: int) -> List[int]:
+    (segments_x2,) = struct.unpack_from(">H", data, offset + 6)
+    segments = segments_x2 // 2
+    ends_at = offset + 14
+    starts_at = ends_at + segments_x2 + 2
+    deltas_at = starts_at + segments_x2
+    range_offsets_at = deltas_at + segments_x2
+    ends = struct.unpack_from(f">{segments}H", data, ends_at)
+    starts = struct.unpack_from(f">{segments}H", data, starts_at)
+    deltas = struct.unpack_from(f">{segments}h", data, deltas_at)
+    range_offsets = struct.unpack_from(f">{segments}H", data, range_offsets_at)
+
+    codes = []
+    for segment in range(segments):
+        start, end = starts[segment], ends[segment]
+        if start == 0xFFFF:
+            continue
+        delta, range_offset = deltas[segment], range_offsets[segment]
+        for code in range(start, end + 1):
+            if range_offset == 0:
+                glyph = (code + delta) & 0xFFFF
+            else:
+                # The offset is relative to its own position in the array.
+                at = range_offsets_at + segment * 2 + range_offset
+                at += (code - start) * 2
+                if at + 2 > len(data):
+                    continue
+                (glyph,) = struct.unpack_from(">H", data, at)
+                if glyph:
+                    glyph = (glyph + delta) & 0xFFFF
+            if glyph:
+                codes.append(code)
+    return codes
+
+
+def _cmap_format_12(data: bytes, offset: int) -> Coverage:
+    (groups,) = struct.unpack_from(">I", data, offset + 12)
+    coverage = []
+    for group in range(groups):
+        start, end, _ = struct.unpack_from(">3I", data, offset + 16 + group * 12)
+        coverage.append((start, end))
+    return coverage
+
+
+def _cmap_subtable(data: bytes, offset: int) -> Coverage:
+    (table_format,) = struct.unpack_from(">H", data, offset)
+    if table_format == 0:
+        glyphs = data[offset + 6 : offset + 6 + 256]
+        return _ranges([code for code, glyph in enumerate(glyphs) if glyph])
+    if table_format == 4:
+        return _ranges(_cmap_format_4(data, offset))
+    if table_format == 6:
+        first, count = struct.unpack_from(">2H", data, offset + 6)
+        glyphs = struct.unpack_from(f">{count}H", data, offset + 10)
+        return _ranges([first + index for index, glyph in enumerate(glyphs) if glyph])
+    if table_format == 12:
+        return _cmap_format_12(data, offset)
+    raise FontError(f"Unsupported cmap format {table_format}")
+
+
+def read_coverage(data: bytes) -> Coverage:
+    """
+    Code points a font has glyphs for, from its cmap table.
+
+    Args:
+        data (bytes): The font file.
+
+    Returns:
+        Coverage: Sorted, inclusive code point ranges.
+
+    Raises:
+        FontError: If the data is not a TrueType or OpenType font with a
+            supported Unicode cmap.
+    """
+    try:
+        if data[:4] not in SFNT_VERSIONS:
+            raise FontError("Not a TrueType or OpenType font")
+        (tables,) = struct.unpack_from(">H", data, 4)
+        cmap = None
+        for table in range(tables):
+            tag, _, offset, _ = struct.unpack_from(">4s3I", data, 12 + table * 16)
+            if tag == b"cmap":
+                cmap = offset
+        if cmap is None:
+            raise FontError("Font has no cmap table")
+
+        (subtables,) = struct.unpack_from(">H", data, cmap + 2)
+        offsets = {}
+        for subtable in range(subtables):
+            platform, encoding, offset = struct.unpack_from(
+                ">2HI", data, cmap + 4 + subtable * 8
+            )
+            offsets.setdefault((platform, encoding), cmap + offset)
+        for encoding in CMAP_PREFERENCE:
+            if encoding in offsets:
+                return _cmap_subtable(data, offsets[encoding])
+        if CMAP_SYMBOL in offsets:
+            # Symbol fonts map their characters to U+F000-U+F0FF; text uses
+            # the code points shifted down to the ASCII range.
+            coverage = _cmap_subtable(data, offsets[CMAP_SYMBOL])
+            shifted = [
+                (start - 0xF000, end - 0xF000)
+                for start, end in coverage
+                if 0xF000 <= start and end <= 0xF0FF
+            ]
+            return sorted(coverage + shifted)
+        raise FontError("Font has no Unicode cmap")
+    except struct.error:
+        raise FontError("Font file is truncated or corrupt")
+
+
+@dataclass
+class FontInfo:
+    name: str
+    family: str
+    style: str
+    # Variation axes of variable fonts: name, minimum, default, maximum
+    axes: List[dict]
+    coverage: Coverage
+    size: int
+    mtime: float
+
+    @property
+    def glyphs(self) -> int:
+        """Number of code points covered."""
+        return sum(end - start + 1 for start, end in self.coverage)
+
+    def covers(self, code: int) -> bool:
+        index = bisect.bisect_right(self.coverage, (code, float("inf"))) - 1
+        return index >= 0 and self.coverage[index][1] >= code
+
+    def missing(self, text: str) -> List[str]:
+        """Characters of the text the font has no glyph for, in order."""
+        missing = []
+        for char in dict.fromkeys(text):
+            if not char.isprintable() or char.isspace():
+                continue
+            if not self.covers(ord(char)):
+                missing.append(char)
+        return missing
+
+
+def read_font_info(path: str) -> FontInfo:
+    """
+    Parse the metadata of a font file.
+
+    Raises:
+        FontError: If the file is not a usable TrueType or OpenType font.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    coverage = read_coverage(data)
+    try:
+        font = ImageFont.truetype(path, Config.DEFAULT_FONT_SIZE)
+    except OSError as e:
+        raise FontError(f"Font cannot be loaded: {e}")
+    family, style = font.getname()
+    try:
+        axes = [
+            {
+                "name": axis["name"].decode("utf-8", "replace")
+                if isinstance(axis["name"], bytes)
+                else axis["name"],
+                "minimum": axis["minimum"],
+                "default": axis["default"],
+                "maximum": axis["maximum"],
+            }
+            for axis in font.get_variation_axes()
+        ]
+    except OSError:
+        # Not a variable font.
+        axes = []
+    stat = os.stat(path)
+    return FontInfo(
+        name=os.path.basename(path),
+        family=(family or "").strip(),
+        style=(style or "").strip(),
+        axes=axes,
+        coverage=coverage,
+        size=stat.st_size,
+        mtime=stat.st_mtime,
+    )
+
+
+class FontRegistry:
+    """
+    Metadata of the fonts in the fonts folder: family, style, variation axes
+    and glyph coverage.
+
+    Every font is parsed once; the metadata is kept in memory and persisted
+    in an index, so a restart only parses fonts added or changed since. The
+    registry is updated as fonts are installed or deleted through it; fonts
+    copied into the folder directly are picked up by refresh.
+    """
+
+    def __init__(
+        self,
+        folder: Optional[str] = None,
+        index_path: str = Config.FONT_INDEX_PATH,
+        max_upload_bytes: int = Config.FONT_UPLOAD_MAX_BYTES,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.folder = folder
+        self.index_path = index_path
+        self.max_upload_bytes = max_upload_bytes
+        self._lock = threading.RLock()
+        self._fonts: Optional[Dict[str, FontInfo]] = None
+        self.parsed = 0
+
+    def _folder(self) -> str:
+        return self.folder or Config.FONTS_FOLDER
+
+    def _load(self) -> Dict[str, FontInfo]:
+        if self._fonts is None:
+            self.refresh()
+        return self._fonts
+
+    def refresh(self) -> None:
+        """Sync with the fonts folder, parsing only new and changed fonts."""
+        with self._lock:
+            known = self._fonts if self._fonts is not None else self._read_index()
+            fonts = {}
+            os.makedirs(self._folder(), exist_ok=True)
+            for entry in os.scandir(self._folder()):
+                if not entry.is_file() or not is_font_name(entry.name):
+                    continue
+                stat = entry.stat()
+                info = known.get(entry.name)
+                if info is None or (info.size, info.mtime) != (
+                    stat.st_size,
+                    stat.st_mtime,
+                ):
+                    try:
+                        info = read_font_info(entry.path)
+                        self.parsed += 1
+                    except FontError as e:
+                        self.logger.warning(f"Skipping font {entry.name}: {str(e)}")
+                        continue
+                fonts[entry.name] = info
+            changed = fonts.keys() != known.keys() or any(
+                fonts[name] is not known.get(name) for name in fonts
+            )
+            self._fonts = fonts
+            if changed:
+                self._write_index()
+
+    def _read_index(self) -> Dict[str, FontInfo]:
+        try:
+            with open(self.index_path, "r") as file:
+                entries = json.load(file)
+            return {
+                entry["name"]: FontInfo(
+                    **{
+                        **entry,
+                        "coverage": [tuple(item) for item in entry["coverage"]],
+                    }
+                )
+                for entry in entries
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    def _write_index(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            data = json.dumps([asdict(info) for info in self._fonts.values()])
+            write_atomic(self.index_path, data.encode("utf-8"))
+        except OSError as e:
+            self.logger.error(f"Error writing font index: {str(e)}")
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(self._load())
+
+    def get(self, name: str) -> Optional[FontInfo]:
+        with self._lock:
+            return self._load().get(name)
+
+    def missing_glyphs(self, name: str, text: str) -> Optional[List[str]]:
+        """
+        Characters of the text the font cannot render.
+
+        Returns:
+            Optional[List[str]]: The missing characters, or None if the font
+            is not registered.
+        """
+        info = self.get(name)
+        return info.missing(text) if info is not None else None
+
+    def install(self, name: str, source: BinaryIO) -> FontInfo:
+        """
+        Validate a font and add it to the folder, replacing a font of the
+        same name.
+
+        The font is copied in chunks to a temporary file in the folder,
+        stopping once it exceeds the size limit, and only moved into place
+        after it parsed and loaded.
+
+        Args:
+            name (str): File name of the font.
+            source (BinaryIO): The font file.
+
+        Returns:
+            FontInfo: Metadata of the installed font.
+
+        Raises:
+            FontTooLargeError: If the font exceeds the size limit.
+            FontError: If the name or the font is not valid.
+        """
+        if not is_font_name(name):
+            raise FontError(
+                f"Font name must be a file name ending in {Config.FONT_EXTENSIONS}"
+            )
+        folder = self._folder()
+        fd, temp_path = tempfile.mkstemp(dir=folder, prefix=".", suffix=".tmp")
+        try:
+            size = 0
+            with os.fdopen(fd, "wb") as file:
+                while chunk := source.read(Config.FONT_UPLOAD_CHUNK_BYTES):
+                    size += len(chunk)
+                    if size > self.max_upload_bytes:
+                        raise FontTooLargeError(
+                            f"Font exceeds {self.max_upload_bytes} bytes"
+                        )
+                    file.write(chunk)
+            info = read_font_info(temp_path)
+            info.name = name
+            with self._lock:
+                os.replace(temp_path, os.path.join(folder, name))
+                self.parsed += 1
+                self._load()[name] = info
+                self._write_index()
+            return info
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def delete(self, name: str) -> bool:
+        """
+        Remove a font from the folder.
+
+        Returns:
+            bool: False if there is no such font.
+
+        Raises:
+            FontError: For the default font, which is never deleted.
+        """
+        if name == Config.DEFAULT_FONT:
+            raise FontError("The default font cannot be deleted")
+        with self._lock:
+            fonts = self._load()
+            if name not in fonts:
+                return False
+            try:
+                os.remove(os.path.join(self._folder(), name))
+            except FileNotFoundError:
+                pass
+            del fonts[name]
+            self._write_index()
+            return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"fonts": len(self._fonts or ()), "parsed": self.parsed}
+
+
+def is_font_name(name: str) -> bool:
+    return (
+        os.path.basename(name) == name
+        and not name.startswith(".")
+        and os.path.splitext(name)[1].lower() in Config.FONT_EXTENSIONS
+    )
+
+
+font_registry = FontRegistry()
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from configs.config import Config
+
+CACHE_USE = "use"  # Read from and write to the cache.
+CACHE_REFRESH = "refresh"  # Skip the lookup but store the new result.
+CACHE_BYPASS = "bypass"  # Neither read from nor write to the cache.
+CACHE_MODES = (CACHE_USE, CACHE_REFRESH, CACHE_BYPASS)
+
+
+def make_cache_key(identity: dict) -> str:
+    """
+    Content address of a generation request.
+
+    Args:
+        identity (dict): Provider, model, rendered prompt and parameters of the
+            request, as returned by the service's cache_identity.
+
+    Returns:
+        str: Hex digest identifying the request.
+    """
+    payload = json.dumps(identity, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """
+    Two-tier cache of generated results stored as bytes.
+
+    The in-memory tier is an LRU bounded by total bytes. The disk tier keeps
+    one file per key, sharded by key prefix, and is bounded by total bytes
+    and entry age.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        memory_max_bytes: int = Config.GENERATION_CACHE_MEMORY_BYTES,
+        disk_max_bytes: int = Config.GENERATION_CACHE_DISK_BYTES,
+        ttl: float = Config.GENERATION_CACHE_TTL,
+        folder: str = Config.GENERATION_CACHE_FOLDER,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.namespace = namespace
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl = ttl
+        self.folder = os.path.join(folder, namespace)
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_index: Optional["OrderedDict[str, Tuple[int, float]]"] = None
+        self._disk_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, key[:2], key)
+
+    def _load_disk_index(self) -> "OrderedDict[str, Tuple[int, float]]":
+        """Scan the disk tier once and keep its entries ordered by last use."""
+        if self._disk_index is None:
+            entries = []
+            if os.path.isdir(self.folder):
+                for shard in os.scandir(self.folder):
+                    if not shard.is_dir():
+                        continue
+                    for entry in os.scandir(shard.path):
+                        if entry.is_file() and not entry.name.startswith("."):
+                            stat = entry.stat()
+                            entries.append((entry.name, stat.st_size, stat.st_mtime))
+            entries.sort(key=lambda entry: entry[2])
+            self._disk_index = OrderedDict(
+                (name, (size, mtime)) for name, size, mtime in entries
+            )
+            self._disk_bytes = sum(size for size, _ in self._disk_index.values())
+        return self._disk_index
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+
+            index = self._load_disk_index()
+            entry = index.get(key)
+            if entry is not None and time.time() - entry[1] > self.ttl:
+                self._remove_disk_entry(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+
+        try:
+            with open(self._path(key), "rb") as file:
+                data = file.read()
+        except OSError:
+            with self._lock:
+                self._remove_disk_entry(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if key in index:
+                index.move_to_end(key)
+            self.disk_hits += 1
+            self._put_memory(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._put_memory(key, data)
+            self._load_disk_index()
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".")
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            self.logger.error(f"Error writing cache entry {key}: {str(e)}")
+            return
+
+        with self._lock:
+            index = self._load_disk_index()
+            if key in index:
+                self._disk_bytes -= index[key][0]
+            index[key] = (len(data), time.time())
+            index.move_to_end(key)
+            self._disk_bytes += len(data)
+            self._evict_disk()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            data = self._memory.pop(key, None)
+            if data is not None:
+                self._memory_bytes -= len(data)
+            self._load_disk_index()
+            self._remove_disk_entry(key)
+
+    def _put_memory(self, key: str, data: bytes) -> None:
+        if len(data) > self.memory_max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _evict_disk(self) -> None:
+        index = self._disk_index
+        now = time.time()
+        for key in [key for key, (_, mtime) in index.items() if now - mtime > self.ttl]:
+            self._remove_disk_entry(key)
+        while self._disk_bytes > self.disk_max_bytes and index:
+            self._remove_disk_entry(next(iter(index)))
+
+    def _remove_disk_entry(self, key: str) -> None:
+        entry = self._disk_index.pop(key, None)
+        if entry is None:
+            return
+        self._disk_bytes -= entry[0]
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (
+                    (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+                ),
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self._disk_index or ()),
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+_caches: Dict[str, GenerationCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_generation_cache(namespace: str) -> Optional[GenerationCache]:
+    """Process-wide cache for a namespace, or None when caching is disabled."""
+    if not Config.GENERATION_CACHE_ENABLED:
+        return None
+    with _caches_lock:
+        if namespace not in _caches:
+            _caches[namespace] = GenerationCache(namespace)
+        return _caches[namespace]
+
+
+def generation_cache_stats() -> Dict[str, Dict[str, float]]:
+    with _caches_lock:
+        caches = dict(_caches)
+    return {namespace: cache.stats() for namespace, cache in caches.items()}
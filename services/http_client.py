@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Optional
+
+import httpx
+import requests
+from PIL import Image, ImageFile
+from requests.adapters import HTTPAdapter
+
+from configs.config import Config
+from services.progress import stage_progress
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class ImageFetchError(Exception):
+    """Raised when an image cannot be retrieved."""
+
+
+class ImageTooLargeError(ImageFetchError):
+    """Raised when an image exceeds the configured maximum size."""
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, status_code: int, retry_after: Optional[float]):
+        self.status_code = status_code
+        self.retry_after = retry_after
+        super().__init__(f"HTTP {status_code}")
+
+
+def _retry_after(headers) -> Optional[float]:
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class ImageFetcher:
+    """
+    Keep-alive HTTP client pool for downloading provider images.
+
+    Responses are streamed and fed to an incremental decoder, so the raw body
+    is never buffered as a whole. Transient failures (connection errors,
+    timeouts, 429 and 5xx responses) are retried with jittered exponential
+    backoff, honoring Retry-After up to max_backoff.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = Config.IMAGE_FETCH_CONNECT_TIMEOUT,
+        read_timeout: float = Config.IMAGE_FETCH_READ_TIMEOUT,
+        max_bytes: int = Config.IMAGE_FETCH_MAX_BYTES,
+        retries: int = Config.IMAGE_FETCH_RETRIES,
+        backoff: float = Config.IMAGE_FETCH_BACKOFF,
+        max_backoff: float = Config.IMAGE_FETCH_MAX_BACKOFF,
+        pool_size: int = Config.IMAGE_FETCH_POOL_SIZE,
+        chunk_size: int = 64 * 1024,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_bytes = max_bytes
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self.chunk_size = chunk_size
+        self._session: Optional[requests.Session] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                # Retries are handled by fetch, so the streamed body is covered too.
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_size,
+                    pool_maxsize=self.pool_size,
+                    max_retries=0,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = httpx.AsyncClient(
+                    timeout=httpx.Timeout(
+                        self.read_timeout, connect=self.connect_timeout
+                    ),
+                    limits=httpx.Limits(
+                        max_connections=self.pool_size,
+                        max_keepalive_connections=self.pool_size,
+                    ),
+                    follow_redirects=True,
+                )
+            return self._async_client
+
+    def _delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is None:
+            retry_after = self.backoff * (2**attempt) * (0.5 + random.random() / 2)
+        return min(retry_after, self.max_backoff)
+
+    def _check_length(self, headers) -> None:
+        length = headers.get("content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            raise ImageTooLargeError(
+                f"Image of {length} bytes exceeds the limit of {self.max_bytes}"
+            )
+
+    def _feed(self, parser: ImageFile.Parser, chunk: bytes, received: int) -> int:
+        received += len(chunk)
+        if received > self.max_bytes:
+            raise ImageTooLargeError(f"Image exceeds the limit of {self.max_bytes}")
+        parser.feed(chunk)
+        return received
+
+    def fetch(self, url: str) -> Image.Image:
+        """
+        Download and decode an image.
+
+        Args:
+            url (str): URL of the image.
+
+        Returns:
+            Image.Image: The decoded image.
+        """
+        with stage_progress("download"):
+            for attempt in range(self.retries + 1):
+                try:
+                    return self._fetch_once(url)
+                except (
+                    _RetryableStatus,
+                    requests.ConnectionError,
+                    requests.Timeout,
+                ) as e:
+                    if attempt == self.retries:
+                        raise ImageFetchError(f"Failed to fetch image: {e}") from e
+                    delay = self._delay(attempt, getattr(e, "retry_after", None))
+                    self.logger.warning(
+                        f"Image fetch failed ({e}), retrying in {delay:.2f}s"
+                    )
+                    time.sleep(delay)
+                except (requests.HTTPError, OSError) as e:
+                    # Client errors and bodies that don't decode are final.
+                    raise ImageFetchError(f"Failed to fetch image: {e}") from e
+
+    def _fetch_once(self, url: str) -> Image.Image:
+        with self.session.get(
+            url, stream=True, timeout=(self.connect_timeout, self.read_timeout)
+        ) as response:
+            if response.status_code in RETRY_STATUSES:
+                raise _RetryableStatus(
+                    response.status_code, _retry_after(response.headers)
+                )
+            response.raise_for_status()
+            self._check_length(response.headers)
+            parser = ImageFile.Parser()
+            received = 0
+            for chunk in response.iter_content(self.chunk_size):
+                received = self._feed(parser, chunk, received)
+            return parser.close()
+
+    async def afetch(self, url: str) -> Image.Image:
+        """Async variant of fetch."""
+        with stage_progress("download"):
+            for attempt in range(self.retries + 1):
+                try:
+                    return await self._afetch_once(url)
+                except (_RetryableStatus, httpx.TransportError) as e:
+                    if attempt == self.retries:
+                        raise ImageFetchError(f"Failed to fetch image: {e}") from e
+                    delay = self._delay(attempt, getattr(e, "retry_after", None))
+                    self.logger.warning(
+                        f"Image fetch failed ({e}), retrying in {delay:.2f}s"
+                    )
+                    await asyncio.sleep(delay)
+                except (httpx.HTTPStatusError, OSError) as e:
+                    raise ImageFetchError(f"Failed to fetch image: {e}") from e
+
+    async def _afetch_once(self, url: str) -> Image.Image:
+        async with self.async_client.stream("GET", url) as response:
+            if response.status_code in RETRY_STATUSES:
+                raise _RetryableStatus(
+                    response.status_code, _retry_after(response.headers)
+                )
+            response.raise_for_status()
+            self._check_length(response.headers)
+            # Each chunk is decoded as it arrives, in a worker thread so the
+            # decoding does not block the event loop.
+            parser = ImageFile.Parser()
+            received = 0
+            async for chunk in response.aiter_bytes(self.chunk_size):
+                received = await asyncio.to_thread(self._feed, parser, chunk, received)
+            return await asyncio.to_thread(parser.close)
+
+    def close(self) -> None:
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+    async def aclose(self) -> None:
+        self.close()
+        with self._lock:
+            async_client, self._async_client = self._async_client, None
+        if async_client is not None:
+            await async_client.aclose()
+
+
+_image_fetcher: Optional[ImageFetcher] = None
+
+
+def get_image_fetcher() -> ImageFetcher:
+    """Process-wide image fetcher sharing one connection pool."""
+    global _image_fetcher
+    if _image_fetcher is None:
+        _image_fetcher = ImageFetcher()
+    return _image_fetcher
+
+
+async def close_image_fetcher() -> None:
+    """Close the process-wide image fetcher, if it was created."""
+    if _image_fetcher is not None:
+        await _image_fetcher.aclose()
@@ -0,0 +1,89 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from configs.config import Config
+
+CONTENT_ADDRESSED_NAME = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+
+
+@dataclass(frozen=True)
+class CachedImage:
+    data: bytes
+    etag: str
+
+
+def make_etag(data: bytes) -> str:
+    """Strong ETag derived from the encoded bytes."""
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+def is_content_addressed(name: str) -> bool:
+    """Content-addressed names never change content and can be cached forever."""
+    return bool(CONTENT_ADDRESSED_NAME.match(name))
+
+
+class EncodedImageCache:
+    """
+    Hot in-memory cache of recently encoded or served images, keyed by path.
+
+    Bounded by total bytes with LRU eviction; images larger than the entry
+    limit are not cached.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = Config.IMAGE_CACHE_MAX_BYTES,
+        max_entry_bytes: int = Config.IMAGE_CACHE_MAX_ENTRY_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[str, CachedImage]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str) -> Optional[CachedImage]:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry
+
+    def put(self, path: str, data: bytes) -> CachedImage:
+        entry = CachedImage(data=data, etag=make_etag(data))
+        if len(data) > self.max_entry_bytes:
+            return entry
+        with self._lock:
+            self._discard(path)
+            self._entries[path] = entry
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.data)
+        return entry
+
+    def invalidate(self, path: str) -> None:
+        with self._lock:
+            self._discard(path)
+
+    def _discard(self, path: str) -> None:
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._bytes -= len(entry.data)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -1,18 +1,46 @@
 import os
 import logging
-import time
-from typing import Tuple, Callable
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple, Union
 from PIL import Image, ImageDraw, ImageFont
 
 from configs.config import Config
 from models import TextStyle
+from services.font_cache import font_cache
+from services.image_writer import EncodedImage, ImageWriter, format_for_extension
+from services.metrics import time_stage
+from services.retention import KIND_BASE, KIND_FINAL
+from services.text_layout import layout_text
+from services.text_mask_cache import text_mask_cache
+
+if TYPE_CHECKING:
+    from services.render_pool import RenderPool
 
 
 class ImageProcessor:
-    def __init__(self):
+    def __init__(
+        self,
+        writer: Optional[ImageWriter] = None,
+        render_pool: Optional["RenderPool"] = None,
+    ):
         self.logger = logging.getLogger(__name__)
         self._ensure_folders_exist()
-        self.current_time = time.time()
+        self.writer = writer or ImageWriter()
+        self.render_pool = render_pool
+        self._render_executor = None
+        # Encodings made ahead of saving, by id of the image, until the image
+        # is saved or garbage collected.
+        self._encoded: Dict[int, Tuple[str, bytes]] = {}
+
+    @property
+    def render_executor(self) -> ThreadPoolExecutor:
+        if self._render_executor is None:
+            self._render_executor = ThreadPoolExecutor(
+                max_workers=Config.RENDER_WORKERS, thread_name_prefix="render"
+            )
+        return self._render_executor
 
     def _ensure_folders_exist(self) -> None:
         """Ensure that the IMAGES_FOLDER and FONTS_FOLDER exist."""
@@ -23,6 +51,8 @@ class ImageProcessor:
         """
         Get the specified font or return a default font if not found.
 
+        Fonts are served from the process-wide font cache.
+
         Args:
             font_name (str): Name of the font file.
             size (int): Font size.
@@ -30,12 +60,7 @@ class ImageProcessor:
         Returns:
             ImageFont.FreeTypeFont: The font object.
         """
-        font_path = os.path.join(Config.FONTS_FOLDER, font_name)
-        try:
-            return ImageFont.truetype(font_path, size)
-        except IOError:
-            self.logger.warning(f"Font {font_name} not found. Using default font.")
-            return ImageFont.load_default().font_variant(size=size)
+        return font_cache.get(font_name, size)
 
     def calculate_text_position(
         self, text_size: Tuple[int, int], image_size: Tuple[int, int], style: TextStyle
@@ -64,6 +89,9 @@ class ImageProcessor:
         """
         Overlay text on the given image.
 
+        The text is wrapped and sized by the layout engine according to the
+        layout fields of the style, and composited from the text mask cache.
+
         Args:
             image (Image.Image): The base image.
             text (str): The text to overlay.
@@ -74,13 +102,11 @@ class ImageProcessor:
         """
         try:
             draw = ImageDraw.Draw(image, "RGBA")
-            font = self.get_font(style.font_name, style.font_size)
+            with time_stage("layout"):
+                layout = layout_text(text, style, image.size)
+            text_width, text_height = layout.size
 
-            text_bbox = draw.textbbox((0, 0), text, font=font)
-            text_width = text_bbox[2] - text_bbox[0]
-            text_height = text_bbox[3] - text_bbox[1]
-
-            padding = max(5, int(style.font_size * 0.2))
+            padding = max(5, int(layout.font_size * 0.2))
             text_position = self.calculate_text_position(
                 (text_width, text_height), image.size, style
             )
@@ -97,8 +123,18 @@ class ImageProcessor:
                 (bg_left, bg_top, bg_right, bg_bottom), fill=bg_color_with_opacity
             )
 
-            # Draw text
-            draw.text(text_position, text, font=font, fill=style.text_color)
+            # Composite the cached rasterized text through its mask
+            mask = text_mask_cache.get(layout, style.font_name, style.align)
+            image.paste(
+                style.text_color,
+                (
+                    text_position[0],
+                    text_position[1],
+                    text_position[0] + mask.width,
+                    text_position[1] + mask.height,
+                ),
+                mask,
+            )
 
             if progress_callback:
                 progress_callback(
@@ -110,26 +146,203 @@ class ImageProcessor:
             self.logger.error(f"Error in overlaying text: {str(e)}")
             return image
 
-    def save_image(self, image: Image.Image, filename: str) -> None:
+    def render_text(
+        self,
+        image: Image.Image,
+        text: str,
+        style: TextStyle,
+        progress_callback: Callable[[float], None] = None,
+    ) -> Image.Image:
+        """
+        Overlay text on a copy of the image, on the render pool if configured.
+
+        The pool also encodes the result in the output format; the encoding
+        is reused when the image is saved.
+
+        Args:
+            image (Image.Image): The base image, not modified.
+            text (str): The text to overlay.
+            style (TextStyle): Style information for the text.
+
+        Returns:
+            Image.Image: The image with overlaid text.
+        """
+        if self.render_pool is None:
+            return self.overlay_text_on_image(
+                image.copy(), text, style, progress_callback=progress_callback
+            )
+
+        image_format = format_for_extension(Config.IMAGE_OUTPUT_EXTENSION)
+        rendered = self.render_pool.render(image, text, style, image_format)
+        if rendered.data is not None:
+            key = id(rendered.image)
+            self._encoded[key] = (image_format, rendered.data)
+            weakref.finalize(rendered.image, self._encoded.pop, key, None)
+        if progress_callback:
+            progress_callback(100)
+        return rendered.image
+
+    def render_offer(
+        self,
+        image: Image.Image,
+        text: str,
+        style: TextStyle,
+        progress_callback: Callable[[float], None] = None,
+        in_place: bool = False,
+    ) -> Tuple[Union[Image.Image, EncodedImage], Image.Image]:
+        """
+        Overlay the offer text on its generated image.
+
+        Args:
+            image (Image.Image): The generated image.
+            text (str): The text to overlay.
+            style (TextStyle): Style information for the text.
+            in_place (bool): Overlay on the image itself, which the caller
+                must own. Ignored with a render pool.
+
+        Returns:
+            Tuple[Union[Image.Image, EncodedImage], Image.Image]: The
+            generated image and the image with the text overlaid. In place,
+            the generated image is returned as its encoding, made before the
+            overlay, and the overlaid image is the given one.
+        """
+        if not in_place or self.render_pool is not None:
+            return image, self.render_text(image, text, style, progress_callback)
+        # The overlay only draws on the text region, so the offer holds a
+        # single decoded buffer and the encoding of the generated image.
+        extension = Config.IMAGE_OUTPUT_EXTENSION
+        _, data = self.writer.encode(image, extension)
+        encoded = EncodedImage(data, extension, image.size, dict(image.info))
+        final_image = self.overlay_text_on_image(
+            image, text, style, progress_callback=progress_callback
+        )
+        return encoded, final_image
+
+    def _take_encoded(self, image: Image.Image, extension: str) -> Optional[bytes]:
+        encoded = self._encoded.pop(id(image), None)
+        if encoded is None or encoded[0] != format_for_extension(extension):
+            return None
+        return encoded[1]
+
+    def _to_write(
+        self, image: Union[Image.Image, EncodedImage], extension: str
+    ) -> Tuple[Optional[Image.Image], Optional[bytes]]:
+        """The image to encode, or its encoding if it is in that format already."""
+        if not isinstance(image, EncodedImage):
+            return image, self._take_encoded(image, extension)
+        if format_for_extension(image.extension) == format_for_extension(extension):
+            return None, image.data
+        return image.decode(), None
+
+    def _write(
+        self, image: Union[Image.Image, EncodedImage], extension: str, kind: str
+    ) -> str:
+        image, data = self._to_write(image, extension)
+        return self.writer.write(image, extension, data, kind)
+
+    def save_image(
+        self,
+        image: Union[Image.Image, EncodedImage],
+        extension: str = Config.IMAGE_OUTPUT_EXTENSION,
+        kind: str = KIND_FINAL,
+    ) -> Optional[str]:
         """
-        Save the image to the IMAGES_FOLDER.
+        Save the image to the image store.
+
+        The image is encoded with the options configured for the format of the
+        extension and stored under the content hash of the encoding.
 
         Args:
-            image (Image.Image): The image to save.
-            filename (str): The filename for the image.
+            image (Union[Image.Image, EncodedImage]): The image to save.
+            extension (str): File extension of the output format.
+            kind (str): "base" or "final", selects the retention policy.
+
+        Returns:
+            Optional[str]: The name of the image, or None if saving failed.
         """
         try:
-            filepath = os.path.join(Config.IMAGES_FOLDER, filename)
-            image.save(filepath)
-            self.logger.info(f"Image saved as: {filepath}")
+            name = self._write(image, extension, kind)
+            self.logger.info(f"Image saved as: {name}")
+            return name
         except Exception as e:
             self.logger.error(f"Error saving image: {str(e)}")
+            return None
+
+    def save_offer_images(
+        self,
+        initial_image: Union[Image.Image, EncodedImage],
+        final_image: Image.Image,
+        wait: bool = Config.IMAGE_WRITER_WAIT,
+    ) -> Tuple[str, str]:
+        """
+        Save the generated and the final image of an offer.
+
+        Args:
+            initial_image (Union[Image.Image, EncodedImage]): The generated
+                image, or its encoding after an overlay in place.
+            final_image (Image.Image): The image with the text overlaid.
+            wait (bool): Encode and store on the calling thread. Otherwise both
+                images are encoded in parallel by the background writer, this
+                only waits for their names and storing continues in the
+                background.
 
-    def get_timestamp_filename(self, filename: str) -> str:
+        Returns:
+            Tuple[str, str]: Names of the initial and the final image.
+        """
+        extension = Config.IMAGE_OUTPUT_EXTENSION
+        images = ((initial_image, KIND_BASE), (final_image, KIND_FINAL))
+        if wait:
+            names = [self._write(image, extension, kind) for image, kind in images]
+        else:
+            futures = []
+            for image, kind in images:
+                image, data = self._to_write(image, extension)
+                futures.append(self.writer.submit(image, extension, data, kind))
+            names = [future.result() for future in futures]
+        return names[0], names[1]
+
+    def load_image(self, name: str) -> Image.Image:
+        """
+        Load and fully decode an image from the image store.
+
+        Args:
+            name (str): The name of the image.
+
+        Returns:
+            Image.Image: The decoded image.
+
+        Raises:
+            FileNotFoundError: If there is no image of that name.
         """
-        Get concatenated filename with timestamp
+        data = self.writer.store.get(name)
+        if data is None:
+            raise FileNotFoundError(f"Image not found: {name}")
+        with time_stage("decode"), Image.open(BytesIO(data)) as image:
+            image.load()
+            return image.convert("RGB") if image.mode != "RGB" else image.copy()
 
-        :param filename:
-        :return:
+    def render_variants(
+        self, image: Image.Image, text: str, styles: List[TextStyle]
+    ) -> List[str]:
         """
-        return f"{int(self.current_time)}_{filename[:50]}"
+        Overlay the text on the image once per style and save every variant.
+
+        The base image is decoded by the caller once; each variant works on its
+        own copy and is overlaid and encoded on the render thread pool, or on
+        the render process pool if one is configured.
+
+        Args:
+            image (Image.Image): The decoded base image.
+            text (str): The text to overlay.
+            styles (List[TextStyle]): One style per variant.
+
+        Returns:
+            List[str]: Names of the saved variants, in the order of styles.
+        """
+
+        def render(style: TextStyle) -> str:
+            variant = self.render_text(image, text, style)
+            return self._write(variant, Config.IMAGE_OUTPUT_EXTENSION, KIND_FINAL)
+
+        futures = [self.render_executor.submit(render, style) for style in styles]
+        return [future.result() for future in futures]
@@ -0,0 +1,83 @@
+import os
+from typing import Iterator, Optional
+
+from configs.config import Config
+from contaracts.image_store_contract import ImageStore
+from services.image_cache import is_content_addressed
+from services.image_writer import write_atomic
+
+
+class LocalImageStore(ImageStore):
+    """
+    Images in a local folder, sharded by the leading hex digits of their
+    content-addressed names, e.g. 3f/a2/3fa2...e1.jpg.
+
+    Sharding keeps every directory small, so creating and looking up files
+    stays fast with hundreds of thousands of images. Names that are not
+    content addressed, written by earlier versions, are kept in the top
+    folder.
+    """
+
+    def __init__(
+        self,
+        folder: Optional[str] = None,
+        shard_levels: int = Config.IMAGE_STORE_SHARD_LEVELS,
+    ):
+        self.folder = folder or Config.IMAGES_FOLDER
+        self.shard_levels = shard_levels
+
+    def path(self, name: str) -> str:
+        """
+        Path of an image in the folder.
+
+        Raises:
+            ValueError: If name is not a plain file name.
+        """
+        if os.path.basename(name) != name or name.startswith("."):
+            raise ValueError(f"Invalid image name: {name}")
+        if not is_content_addressed(name):
+            return os.path.join(self.folder, name)
+        shards = [name[level * 2 : level * 2 + 2] for level in range(self.shard_levels)]
+        return os.path.join(self.folder, *shards, name)
+
+    def put(self, name: str, data: bytes) -> bool:
+        path = self.path(name)
+        if is_content_addressed(name) and os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, data)
+        return True
+
+    def get(self, name: str) -> Optional[bytes]:
+        try:
+            with open(self.path(name), "rb") as file:
+                return file.read()
+        except (ValueError, FileNotFoundError):
+            return None
+
+    def exists(self, name: str) -> bool:
+        try:
+            return os.path.isfile(self.path(name))
+        except ValueError:
+            return False
+
+    def delete(self, name: str) -> bool:
+        try:
+            os.remove(self.path(name))
+            return True
+        except (ValueError, FileNotFoundError):
+            return False
+
+    def size(self, name: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self.path(name))
+        except (ValueError, OSError):
+            return None
+
+    def location(self, name: str) -> str:
+        return self.path(name)
+
+    def names(self) -> Iterator[str]:
+        for _, _, files in os.walk(self.folder):
+            # Temporary files of writes in progress start with a dot.
+            yield from (name for name in files if not name.startswith("."))
@@ -0,0 +1,306 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import TYPE_CHECKING, Dict, NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+from configs.config import Config
+from contaracts.image_store_contract import content_name
+from services.image_cache import EncodedImageCache
+from services.metrics import time_stage
+from services.progress import stage_progress
+from services.retention import KIND_FINAL, ImageIndex
+
+if TYPE_CHECKING:
+    from contaracts.image_store_contract import ImageStore
+
+EXTENSION_FORMATS = {
+    ".jpg": "JPEG",
+    ".jpeg": "JPEG",
+    ".png": "PNG",
+    ".webp": "WEBP",
+}
+
+
+def format_for_extension(extension: str) -> str:
+    """PIL format name of a file extension, with or without the dot."""
+    extension = "." + extension.lower().lstrip(".")
+    try:
+        return EXTENSION_FORMATS[extension]
+    except KeyError:
+        raise ValueError(f"Unsupported image extension: {extension}")
+
+
+def format_for_path(path: str) -> str:
+    return format_for_extension(os.path.splitext(path)[1])
+
+
+def encode_image(image: Image.Image, image_format: str) -> bytes:
+    """
+    Encode an image with the configured options for its format.
+
+    Args:
+        image (Image.Image): The image to encode.
+        image_format (str): PIL format name, e.g. "JPEG".
+
+    Returns:
+        bytes: The encoded image.
+    """
+    if image_format == "JPEG" and image.mode not in ("RGB", "L", "CMYK"):
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    options = Config.IMAGE_SAVE_OPTIONS.get(image_format, {})
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+class EncodedImage(NamedTuple):
+    """An image kept only as its encoding, e.g. a base image overlaid in place."""
+
+    data: bytes
+    extension: str
+    size: Tuple[int, int]
+    # Image.info of the decoded image, e.g. its fallback flag
+    info: dict
+
+    def decode(self) -> Image.Image:
+        with Image.open(BytesIO(self.data)) as image:
+            image.load()
+            decoded = image.convert("RGB") if image.mode != "RGB" else image.copy()
+        decoded.info.update(self.info)
+        return decoded
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Write via a temporary file and rename, so readers never see partial files."""
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class ImageWriter:
+    """
+    Background encode-and-store stage.
+
+    Images are encoded by a worker pool and stored under the content hash of
+    their encoding, so identical images are stored once. The number of
+    queued and running jobs is bounded: once the queue is full, submit
+    blocks until a slot frees up, which pushes back on the producers. Stored
+    images are also put in the hot image cache and recorded in the image
+    index used by retention, if given.
+    """
+
+    def __init__(
+        self,
+        workers: int = Config.IMAGE_WRITER_WORKERS,
+        queue_size: int = Config.IMAGE_WRITER_QUEUE_SIZE,
+        cache: Optional[EncodedImageCache] = None,
+        store: Optional["ImageStore"] = None,
+        index: Optional[ImageIndex] = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        if store is None:
+            # Imported here: the local store writes with write_atomic.
+            from factories.image_store_factory import ImageStoreFactory
+
+            store = ImageStoreFactory.get_image_store(Config.IMAGE_STORE)
+        self.store = store
+        self.index = index
+        self.cache = cache
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="image-writer"
+        )
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.deduplicated = 0
+        self.blocked = 0
+        self.blocked_seconds = 0.0
+        self.encode_seconds = 0.0
+
+    def encode(
+        self, image: Optional[Image.Image], extension: str, data: Optional[bytes] = None
+    ) -> Tuple[str, bytes]:
+        """
+        Encode an image, unless it is already encoded, and name it by content.
+
+        Args:
+            image (Optional[Image.Image]): The image to encode, None if data is
+                given.
+            extension (str): File extension of the output format, e.g. "jpg".
+            data (Optional[bytes]): The image already encoded in that format.
+
+        Returns:
+            Tuple[str, bytes]: The content-addressed name and the encoding.
+        """
+        start = time.perf_counter()
+        with stage_progress("encode"):
+            if data is None:
+                data = encode_image(image, format_for_extension(extension))
+            name = content_name(data, extension)
+        with self._lock:
+            self.encode_seconds += time.perf_counter() - start
+        return name, data
+
+    def _store(self, name: str, data: bytes, kind: str) -> None:
+        if self.index is None:
+            with time_stage("write"):
+                stored = self.store.put(name, data)
+        else:
+            # Recorded first: retention keeps images recorded again after it
+            # picked them. The name lock keeps a pass from deleting the image
+            # between recording it and finding it stored already.
+            with self.index.name_lock(name):
+                self.index.add(name, kind, len(data))
+                with time_stage("write"):
+                    stored = self.store.put(name, data)
+        if not stored:
+            with self._lock:
+                self.deduplicated += 1
+        if self.cache is not None:
+            self.cache.put(name, data)
+
+    def write(
+        self,
+        image: Optional[Image.Image],
+        extension: str,
+        data: Optional[bytes] = None,
+        kind: str = KIND_FINAL,
+    ) -> str:
+        """
+        Encode and store an image on the calling thread.
+
+        Args:
+            image (Optional[Image.Image]): The image to write, None if data is
+                given.
+            extension (str): File extension of the output format, e.g. "jpg".
+            data (Optional[bytes]): The image already encoded in that format.
+            kind (str): "base" or "final", selects the retention policy.
+
+        Returns:
+            str: The name of the stored image.
+        """
+        name, data = self.encode(image, extension, data)
+        self._store(name, data, kind)
+        return name
+
+    def submit(
+        self,
+        image: Optional[Image.Image],
+        extension: str,
+        data: Optional[bytes] = None,
+        kind: str = KIND_FINAL,
+    ) -> "Future[str]":
+        """
+        Queue an image for encoding and storing.
+
+        The image must not be modified after it has been submitted.
+
+        Args:
+            image (Optional[Image.Image]): The image to write, None if data is
+                given.
+            extension (str): File extension of the output format, e.g. "jpg".
+            data (Optional[bytes]): The image already encoded in that format.
+            kind (str): "base" or "final", selects the retention policy.
+
+        Returns:
+            Future[str]: Resolves to the name of the image as soon as it is
+            encoded; storing continues in the background, see pending.
+        """
+        if not self._slots.acquire(blocking=False):
+            start = time.perf_counter()
+            self._slots.acquire()
+            with self._lock:
+                self.blocked += 1
+                self.blocked_seconds += time.perf_counter() - start
+
+        named: "Future[str]" = Future()
+        try:
+            future = self._executor.submit(
+                self._encode_and_store, image, extension, data, kind, named
+            )
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.submitted += 1
+        future.add_done_callback(self._on_done)
+        return named
+
+    def _encode_and_store(
+        self,
+        image: Optional[Image.Image],
+        extension: str,
+        data: Optional[bytes],
+        kind: str,
+        named: Future,
+    ) -> None:
+        try:
+            name, data = self.encode(image, extension, data)
+        except BaseException as e:
+            named.set_exception(e)
+            raise
+        written = Future()
+        with self._lock:
+            self._pending[name] = written
+        # Readers of the name wait for the write from here on.
+        named.set_result(name)
+        try:
+            self._store(name, data, kind)
+            written.set_result(data)
+        except BaseException as e:
+            written.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                if self._pending.get(name) is written:
+                    del self._pending[name]
+
+    def _on_done(self, future: Future) -> None:
+        self._slots.release()
+        with self._lock:
+            if future.exception() is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+                self.logger.error(f"Error saving image: {str(future.exception())}")
+
+    def pending(self, name: str) -> Optional[Future]:
+        """The in-progress write of an image, if any."""
+        with self._lock:
+            return self._pending.get(name)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "pending": len(self._pending),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "deduplicated": self.deduplicated,
+                "blocked": self.blocked,
+                "blocked_seconds": self.blocked_seconds,
+                "encode_seconds": self.encode_seconds,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
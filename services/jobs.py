@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from configs.config import Config
+from contaracts.job_store_contract import JobStore
+from models import Job
+from services.progress import (
+    STAGE_COMPLETED,
+    STAGE_STARTED,
+    listen_to_stages,
+)
+
+
+class JobLimitError(Exception):
+    """Raised when the maximum number of in-flight jobs is reached."""
+
+
+class InMemoryJobStore(JobStore):
+    """
+    Job store in process memory.
+
+    Finished jobs are dropped after the retention period, and the oldest
+    finished jobs once more than max_jobs are stored.
+    """
+
+    def __init__(
+        self,
+        retention: float = Config.JOB_RETENTION_SECONDS,
+        max_jobs: int = Config.JOB_STORE_MAX_JOBS,
+    ):
+        self.retention = retention
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, job: Job) -> None:
+        with self._lock:
+            self._prune(time.time())
+            self._jobs[job.id] = job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def add_event(self, job_id: str, event: dict) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.events.append(event)
+                job.updated_at = event["timestamp"]
+
+    def set_status(
+        self,
+        job_id: str,
+        status: str,
+        result: Optional[dict] = None,
+        error: Optional[dict] = None,
+    ) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.status = status
+                job.result = result
+                job.error = error
+                job.updated_at = time.time()
+
+    def _prune(self, now: float) -> None:
+        # By the time they finished, which needn't be the order they were
+        # created in.
+        finished = sorted(
+            (job for job in self._jobs.values() if job.finished),
+            key=lambda job: job.updated_at,
+        )
+        excess = len(self._jobs) + 1 - self.max_jobs
+        for job in finished:
+            if excess <= 0 and now - job.updated_at < self.retention:
+                break
+            del self._jobs[job.id]
+            excess -= 1
+
+
+class JobManager:
+    """
+    Runs offer generation jobs in the background and reports their stages.
+
+    Every job runs as an asyncio task; the stage transitions reported inside
+    the job are stored as events and pushed to the watchers of the job. The
+    number of queued and running jobs is capped.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        runner: Callable[[dict], Awaitable[dict]],
+        max_in_flight: int = Config.JOBS_MAX_IN_FLIGHT,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.store = store
+        self.runner = runner
+        self.max_in_flight = max_in_flight
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._signals: Dict[str, asyncio.Event] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, request: dict) -> Job:
+        """
+        Start a job; must be called on the event loop.
+
+        Args:
+            request (dict): The request passed to the runner.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            JobLimitError: If the maximum number of in-flight jobs is reached.
+        """
+        if len(self._tasks) >= self.max_in_flight:
+            self.rejected += 1
+            raise JobLimitError(f"{self.max_in_flight} jobs are already in flight")
+
+        self._loop = asyncio.get_running_loop()
+        now = time.time()
+        job = Job(id=uuid.uuid4().hex, request=request, created_at=now, updated_at=now)
+        self.store.create(job)
+        self.submitted += 1
+        self._event(job.id, "queued", STAGE_STARTED)
+        task = asyncio.create_task(self._run(job.id, request))
+        task.add_done_callback(lambda done: self._on_done(job.id, done))
+        self._tasks[job.id] = task
+        return job
+
+    async def _run(self, job_id: str, request: dict) -> None:
+        start = time.perf_counter()
+
+        def listener(stage: str, status: str, elapsed: Optional[float]) -> None:
+            self._event(job_id, stage, status, elapsed)
+
+        try:
+            with listen_to_stages(listener):
+                self._event(job_id, "queued", STAGE_COMPLETED, 0.0)
+                self.store.set_status(job_id, "running")
+                result = await self.runner(request)
+            self._event(job_id, "saved", STAGE_COMPLETED, time.perf_counter() - start)
+            self.store.set_status(job_id, "succeeded", result=result)
+            self.succeeded += 1
+        except Exception as e:
+            self.logger.error(f"Job {job_id} failed: {str(e)}")
+            self.store.set_status(
+                job_id,
+                "failed",
+                error={"stage": getattr(e, "stage", None), "message": str(e)},
+            )
+            self.failed += 1
+
+    def _on_done(self, job_id: str, task: asyncio.Task) -> None:
+        del self._tasks[job_id]
+        if task.cancelled():
+            # Possibly before the job even started.
+            self.store.set_status(
+                job_id, "failed", error={"stage": None, "message": "Job cancelled"}
+            )
+            self.failed += 1
+        # Wakes the watchers and drops the signal of the job.
+        self._wake(job_id)
+
+    def _event(
+        self, job_id: str, stage: str, status: str, elapsed: Optional[float] = None
+    ) -> None:
+        # Called on the event loop and, for stages run in threads, off it.
+        event = {
+            "stage": stage,
+            "status": status,
+            "elapsed": elapsed,
+            "timestamp": time.time(),
+        }
+        self.store.add_event(job_id, event)
+        self._notify(job_id)
+
+    def _notify(self, job_id: str) -> None:
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake, job_id)
+
+    def _wake(self, job_id: str) -> None:
+        signal = self._signals.pop(job_id, None)
+        if signal is not None:
+            signal.set()
+
+    async def watch(
+        self,
+        job_id: str,
+        start: int = 0,
+        keepalive: float = Config.JOB_EVENTS_KEEPALIVE,
+    ) -> AsyncIterator[Optional[dict]]:
+        """
+        Yield the events of a job as they happen, until the job finishes.
+
+        Events that happened before watching started are yielded first,
+        beginning with the event at position start. None is yielded when
+        nothing happened for keepalive seconds.
+        """
+        index = start
+        try:
+            while True:
+                # Take the signal before reading, so no event is missed between.
+                signal = self._signals.get(job_id)
+                if signal is None:
+                    signal = self._signals[job_id] = asyncio.Event()
+                job = self.store.get(job_id)
+                if job is None:
+                    return
+                # Events are stored before the final status.
+                finished = job.finished
+                events = self.store.events_since(job_id, index)
+                for event in events:
+                    yield event
+                index += len(events)
+                if finished:
+                    return
+                try:
+                    await asyncio.wait_for(signal.wait(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            # Don't keep a signal for a job that is finished, unknown or no
+            # longer watched; other watchers wake up and take a new one.
+            self._wake(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._tasks),
+            "max_in_flight": self.max_in_flight,
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    async def shutdown(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
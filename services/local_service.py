@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import random
+import time
+from typing import List, Tuple
+
+from PIL import Image
+
+from configs.config import Config
+from contaracts.ai_contract import TextGenerationService, ImageGenerationService
+from services.metrics import PROVIDER_ERRORS
+
+WORDS = [
+    "luxury",
+    "escape",
+    "oceanfront",
+    "suite",
+    "spa",
+    "sunset",
+    "exclusive",
+    "weekend",
+    "retreat",
+    "breakfast",
+    "included",
+    "upgrade",
+    "stay",
+    "relax",
+    "discover",
+    "save",
+    "tonight",
+    "skyline",
+    "views",
+    "getaway",
+]
+
+
+class LocalServiceError(RuntimeError):
+    """Failure injected by the local stand-in services."""
+
+
+def _seed(prompt: str) -> int:
+    return int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "big")
+
+
+class _LocalService:
+    """
+    Offline stand-in for an AI provider.
+
+    Results are derived deterministically from the prompt. Latency and
+    failures are injected to model a real provider without network access.
+    """
+
+    def __init__(self, latency: float, jitter: float, failure_rate: float):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(Config.LOCAL_SERVICE_SEED)
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def _maybe_fail(self) -> None:
+        if self._random.random() < self.failure_rate:
+            PROVIDER_ERRORS.inc(provider="local", kind="LocalServiceError")
+            raise LocalServiceError("Injected provider failure")
+
+
+class LocalTextService(_LocalService, TextGenerationService):
+    def __init__(
+        self,
+        latency: float = Config.LOCAL_TEXT_LATENCY,
+        jitter: float = Config.LOCAL_LATENCY_JITTER,
+        failure_rate: float = Config.LOCAL_FAILURE_RATE,
+    ):
+        super().__init__(latency, jitter, failure_rate)
+
+    def cache_identity(self, prompt: str, word_limit: int) -> dict:
+        return {"provider": "local", "prompt": prompt, "word_limit": word_limit}
+
+    def _text(self, prompt: str, word_limit: int, candidate: int = 0) -> str:
+        seed = f"{prompt}:{word_limit}" + (f":{candidate}" if candidate else "")
+        words = random.Random(_seed(seed)).choices(WORDS, k=max(1, word_limit))
+        return " ".join(words).capitalize() + "!"
+
+    def generate_text(self, prompt: str, word_limit: int) -> str:
+        time.sleep(self._delay())
+        self._maybe_fail()
+        return self._text(prompt, word_limit)
+
+    async def agenerate_text(self, prompt: str, word_limit: int) -> str:
+        await asyncio.sleep(self._delay())
+        self._maybe_fail()
+        return self._text(prompt, word_limit)
+
+    # A batched call takes one round trip, like one to a real provider.
+    def generate_candidates(
+        self, prompt: str, word_limit: int, count: int
+    ) -> List[str]:
+        time.sleep(self._delay())
+        self._maybe_fail()
+        return [self._text(prompt, word_limit, index) for index in range(count)]
+
+    async def agenerate_candidates(
+        self, prompt: str, word_limit: int, count: int
+    ) -> List[str]:
+        await asyncio.sleep(self._delay())
+        self._maybe_fail()
+        return [self._text(prompt, word_limit, index) for index in range(count)]
+
+    def generate_texts(self, requests: List[Tuple[str, int]]) -> List[str]:
+        time.sleep(self._delay())
+        self._maybe_fail()
+        return [self._text(prompt, word_limit) for prompt, word_limit in requests]
+
+    async def agenerate_texts(self, requests: List[Tuple[str, int]]) -> List[str]:
+        await asyncio.sleep(self._delay())
+        self._maybe_fail()
+        return [self._text(prompt, word_limit) for prompt, word_limit in requests]
+
+
+class LocalImageService(_LocalService, ImageGenerationService):
+    def __init__(
+        self,
+        latency: float = Config.LOCAL_IMAGE_LATENCY,
+        jitter: float = Config.LOCAL_LATENCY_JITTER,
+        failure_rate: float = Config.LOCAL_FAILURE_RATE,
+        size: Tuple[int, int] = Config.LOCAL_IMAGE_SIZE,
+    ):
+        super().__init__(latency, jitter, failure_rate)
+        self.size = size
+
+    def cache_identity(self, prompt: str) -> dict:
+        return {"provider": "local", "prompt": prompt, "size": list(self.size)}
+
+    def _image(self, prompt: str) -> Image.Image:
+        # A 2x2 image with colors taken from the prompt hash, stretched into a
+        # smooth gradient of the full size.
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        corners = Image.frombytes("RGB", (2, 2), digest[:12])
+        return corners.resize(self.size, Image.Resampling.BILINEAR)
+
+    def generate_image(self, prompt: str) -> Image.Image:
+        time.sleep(self._delay())
+        self._maybe_fail()
+        return self._image(prompt)
+
+    async def agenerate_image(self, prompt: str) -> Image.Image:
+        await asyncio.sleep(self._delay())
+        self._maybe_fail()
+        # Rendering the gradient is CPU work, like decoding a download.
+        return await asyncio.to_thread(self._image, prompt)
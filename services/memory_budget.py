@@ -0,0 +1,121 @@
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Deque, Dict, Iterator, Optional, Tuple
+
+from configs.config import Config
+
+
+class MemoryBudget:
+    """
+    Bytes of memory that the work in progress may reserve together.
+
+    Every offer or re-render reserves its share once it works on decoded
+    images, for an offer when its generated image is back from the provider,
+    and releases it when its images are encoded; work that does not fit
+    waits, first come first served, so a burst of requests queues instead of
+    growing the process beyond its memory limit. Threads and coroutines share
+    the budget. A reservation larger than the whole budget waits until it is
+    the only one.
+    """
+
+    def __init__(self, total_bytes: int = Config.MEMORY_BUDGET_TOTAL):
+        self.total_bytes = total_bytes
+        self._lock = threading.Lock()
+        self._waiters: Deque[Tuple[int, Future]] = deque()
+        self.reserved = 0
+        self.peak = 0
+        self.waits = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.total_bytes > 0
+
+    def _fits(self, nbytes: int) -> bool:
+        return self.reserved == 0 or self.reserved + nbytes <= self.total_bytes
+
+    def _grant(self, nbytes: int) -> None:
+        self.reserved += nbytes
+        self.peak = max(self.peak, self.reserved)
+
+    def _request(self, nbytes: int) -> Optional[Future]:
+        """Reserve nbytes now, or queue and return a future set once granted."""
+        with self._lock:
+            if not self._waiters and self._fits(nbytes):
+                self._grant(nbytes)
+                return None
+            future = Future()
+            self._waiters.append((nbytes, future))
+            self.waits += 1
+            return future
+
+    def _wake(self) -> None:
+        while self._waiters and self._fits(self._waiters[0][0]):
+            nbytes, future = self._waiters.popleft()
+            self._grant(nbytes)
+            future.set_result(None)
+
+    def _abandon(self, nbytes: int, future: Future) -> None:
+        """A waiter was cancelled; give back what it may have been granted."""
+        with self._lock:
+            try:
+                self._waiters.remove((nbytes, future))
+            except ValueError:
+                self.reserved -= nbytes
+            self._wake()
+
+    def release(self, nbytes: int) -> None:
+        with self._lock:
+            self.reserved -= nbytes
+            self._wake()
+
+    @contextmanager
+    def reserve(self, nbytes: int = Config.MEMORY_BUDGET_PER_REQUEST) -> Iterator[None]:
+        """
+        Hold nbytes of the budget, waiting until they are available.
+
+        Args:
+            nbytes (int): Bytes the work needs at most.
+        """
+        if not self.enabled:
+            yield
+            return
+        future = self._request(nbytes)
+        if future is not None:
+            future.result()
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+    @asynccontextmanager
+    async def areserve(
+        self, nbytes: int = Config.MEMORY_BUDGET_PER_REQUEST
+    ) -> AsyncIterator[None]:
+        """Async variant of reserve; waiting does not block the event loop."""
+        if not self.enabled:
+            yield
+            return
+        future = self._request(nbytes)
+        if future is not None:
+            try:
+                await asyncio.shield(asyncio.wrap_future(future))
+            except asyncio.CancelledError:
+                self._abandon(nbytes, future)
+                raise
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "total_bytes": self.total_bytes,
+                "reserved_bytes": self.reserved,
+                "peak_bytes": self.peak,
+                "waiting": len(self._waiters),
+                "waits": self.waits,
+            }
@@ -0,0 +1,309 @@
+"""
+Low-overhead metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms keep their values in plain Python numbers
+behind a lock per metric, so timing a stage costs a few microseconds.
+Values owned by other components, such as cache statistics, are read by
+collectors when the metrics are rendered.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from configs.config import Config
+
+LabelValues = Tuple[str, ...]
+# (metric name, type, help, [(labels, value)])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = Config.METRICS_LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = sorted(buckets)
+        # Per label set: counts per bucket (non-cumulative, last is +Inf),
+        # sum and count.
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 3)
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return int(state[-1]) if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in values:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + [float("inf")], state):
+                cumulative += count
+                bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(
+                f"{self.name}_sum{_format_labels(labels)} {_format_value(state[-2])}"
+            )
+            lines.append(f"{self.name}_count{_format_labels(labels)} {state[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        """Register a callable that reports metric families at render time."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        # Collectors may report the same family, e.g. one per cache.
+        families: Dict[str, Family] = {}
+        for collector in collectors:
+            for name, type, help, samples in collector():
+                families.setdefault(name, (name, type, help, []))[3].extend(samples)
+        for name, type, help, samples in families.values():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {type}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(
+    Histogram(
+        "offer_stage_duration_seconds",
+        "Duration of offer pipeline stages.",
+        ["stage"],
+    )
+)
+STAGE_IN_FLIGHT = registry.register(
+    Gauge("offer_stage_in_flight", "Pipeline stages currently running.", ["stage"])
+)
+STAGE_FAILURES = registry.register(
+    Counter("offer_stage_failures_total", "Failed pipeline stages.", ["stage"])
+)
+PROVIDER_ERRORS = registry.register(
+    Counter(
+        "offer_provider_errors_total",
+        "Errors returned by AI providers.",
+        ["provider", "kind"],
+    )
+)
+PROVIDER_FALLBACKS = registry.register(
+    Counter(
+        "offer_provider_fallbacks_total",
+        "Placeholder results returned instead of provider results.",
+        ["provider", "kind"],
+    )
+)
+PROVIDER_RETRIES = registry.register(
+    Counter(
+        "offer_provider_retries_total",
+        "Provider requests retried after a transient error.",
+        ["provider", "model"],
+    )
+)
+PROVIDER_HEDGES = registry.register(
+    Counter(
+        "offer_provider_hedges_total",
+        "Second attempts started for slow provider requests.",
+        ["provider", "model"],
+    )
+)
+PROVIDER_THROTTLED_SECONDS = registry.register(
+    Counter(
+        "offer_provider_throttled_seconds_total",
+        "Time provider requests waited for the rate limits.",
+        ["provider", "model"],
+    )
+)
+TEXT_BATCH_ITEMS = registry.register(
+    Counter(
+        "offer_text_batch_items_total",
+        "Texts asked for in batched provider calls, by how they were generated.",
+        ["provider", "outcome"],
+    )
+)
+COALESCED_CALLS = registry.register(
+    Counter(
+        "offer_single_flight_saved_calls_total",
+        "Provider calls saved by waiting for an identical call in flight.",
+        ["name"],
+    )
+)
+
+
+@contextmanager
+def time_stage(stage: str) -> Iterator[None]:
+    """Record the duration, in-flight count and failure of a stage."""
+    if not Config.METRICS_ENABLED:
+        yield
+        return
+    STAGE_IN_FLIGHT.inc(stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_FAILURES.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        STAGE_IN_FLIGHT.dec(stage=stage)
+
+
+def cache_families(caches: Dict[str, Dict[str, float]]) -> List[Family]:
+    """
+    Metric families for the statistics of several caches.
+
+    Args:
+        caches (Dict[str, Dict[str, float]]): The stats() of every cache by
+            cache name.
+    """
+    hits, misses, ratios, evictions, entries, sizes = [], [], [], [], [], []
+    for name, stats in caches.items():
+        labels = {"cache": name}
+        hit_count = stats.get("hits", 0) + stats.get("memory_hits", 0)
+        hit_count += stats.get("disk_hits", 0)
+        miss_count = stats.get("misses", 0)
+        hits.append((labels, hit_count))
+        misses.append((labels, miss_count))
+        lookups = hit_count + miss_count
+        ratios.append((labels, hit_count / lookups if lookups else 0.0))
+        if "evictions" in stats:
+            evictions.append((labels, stats["evictions"]))
+        for key in ("entries", "size", "memory_entries"):
+            if key in stats:
+                entries.append((labels, stats[key]))
+                break
+        for key in ("bytes", "memory_bytes"):
+            if key in stats:
+                sizes.append((labels, stats[key]))
+                break
+    return [
+        ("offer_cache_hits_total", "counter", "Cache hits.", hits),
+        ("offer_cache_misses_total", "counter", "Cache misses.", misses),
+        ("offer_cache_hit_ratio", "gauge", "Hits per lookup since start.", ratios),
+        ("offer_cache_evictions_total", "counter", "Cache evictions.", evictions),
+        ("offer_cache_entries", "gauge", "Entries held by the cache.", entries),
+        ("offer_cache_bytes", "gauge", "Bytes held in memory by the cache.", sizes),
+    ]
@@ -1,10 +1,28 @@
+import asyncio
+import contextvars
 import logging
-from typing import Tuple, Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional, Tuple, Union
 from PIL import Image
-from generators.image_generator import ImageGenerator
+
+from configs.config import Config
+from generators.image_generator import ImageGenerator, is_shared
 from generators.text_generator import TextGenerator
 from models import TextStyle
+from services.concurrency import ConcurrencyLimiter
+from services.generation_cache import CACHE_USE
 from services.image_processor import ImageProcessor
+from services.image_writer import EncodedImage
+from services.progress import stage_progress
+
+
+class OfferGenerationError(Exception):
+    """Raised when a stage of offer generation fails."""
+
+    def __init__(self, stage: str, error: BaseException):
+        self.stage = stage
+        self.error = error
+        super().__init__(f"{stage} stage failed: {error}")
 
 
 class OfferGeneratorService:
@@ -13,12 +31,25 @@ class OfferGeneratorService:
         text_generator: TextGenerator,
         image_generator: ImageGenerator,
         image_processor: ImageProcessor,
+        max_workers: int = Config.OFFER_GENERATION_WORKERS,
+        limiter: Optional[ConcurrencyLimiter] = None,
     ):
         self.text_generator = text_generator
         self.image_generator = image_generator
         self.image_processor = image_processor
+        self.max_workers = max_workers
+        self.limiter = limiter or ConcurrencyLimiter()
+        self._executor = None
         self.logger = logging.getLogger(__name__)
 
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="offer-generation"
+            )
+        return self._executor
+
     def generate_offer(
         self,
         prompt: str,
@@ -27,21 +58,216 @@ class OfferGeneratorService:
         text_progress: Callable[[float], None] = None,
         image_progress: Callable[[float], None] = None,
         overlay_progress: Callable[[float], None] = None,
-    ) -> Tuple[str, Image.Image, Image.Image]:
-        try:
-            offer_text = self.text_generator.generate_offer_text(
-                prompt, word_limit, progress_callback=text_progress
+        concurrent: bool = False,
+        cache_mode: str = CACHE_USE,
+    ) -> Tuple[str, Union[Image.Image, EncodedImage], Image.Image]:
+        """
+        Generate the offer text and image, then overlay the text on the image.
+
+        Args:
+            prompt (str): The hotel offer prompt.
+            word_limit (int): Word limit for the offer text.
+            style (TextStyle): Style information for the text overlay.
+            concurrent (bool): Run text and image generation at the same time
+                on the service thread pool instead of one after the other.
+            cache_mode (str): Generation cache mode, "use", "refresh" or
+                "bypass".
+
+        Returns:
+            Tuple[str, Union[Image.Image, EncodedImage], Image.Image]: The
+            offer text, the generated image and the image with the text
+            overlaid. With PIPELINE_SINGLE_COPY the text is usually overlaid
+            on the generated image itself, which is then returned as its
+            encoding; save it with save_image or save_offer_images.
+        """
+        if concurrent:
+            # Run in a copy of the context so the stages reach the caller's
+            # stage listener.
+            text_future = self.executor.submit(
+                contextvars.copy_context().run,
+                self._in_stage,
+                "text",
+                self.text_generator.generate_offer_text,
+                prompt,
+                word_limit,
+                progress_callback=text_progress,
+                cache_mode=cache_mode,
+            )
+            image_future = self.executor.submit(
+                contextvars.copy_context().run,
+                self._in_stage,
+                "image",
+                self.image_generator.generate_image,
+                prompt,
+                progress_callback=image_progress,
+                cache_mode=cache_mode,
+            )
+            self._collect_results(
+                ("text", text_future.exception()),
+                ("image", image_future.exception()),
             )
-            initial_image = self.image_generator.generate_image(
-                prompt, progress_callback=image_progress
+            offer_text, initial_image = text_future.result(), image_future.result()
+        else:
+            offer_text = self._run_stage(
+                "text",
+                self.text_generator.generate_offer_text,
+                prompt,
+                word_limit,
+                progress_callback=text_progress,
+                cache_mode=cache_mode,
             )
-            final_image = self.image_processor.overlay_text_on_image(
-                initial_image.copy(),
-                offer_text,
-                style,
-                progress_callback=overlay_progress,
+            initial_image = self._run_stage(
+                "image",
+                self.image_generator.generate_image,
+                prompt,
+                progress_callback=image_progress,
+                cache_mode=cache_mode,
             )
-            return offer_text, initial_image, final_image
+
+        initial_image, final_image = self._run_stage(
+            "overlay",
+            self.image_processor.render_offer,
+            initial_image,
+            offer_text,
+            style,
+            progress_callback=overlay_progress,
+            in_place=self._in_place(initial_image),
+        )
+        return offer_text, initial_image, final_image
+
+    async def agenerate_offer(
+        self,
+        prompt: str,
+        word_limit: int,
+        style: TextStyle,
+        text_progress: Callable[[float], None] = None,
+        image_progress: Callable[[float], None] = None,
+        overlay_progress: Callable[[float], None] = None,
+        cache_mode: str = CACHE_USE,
+    ) -> Tuple[str, Union[Image.Image, EncodedImage], Image.Image]:
+        """
+        Asyncio-native variant of generate_offer that always runs text and
+        image generation concurrently.
+
+        Provider calls use the async clients of the AI services, the overlay
+        runs on the service thread pool, and every stage is bounded by the
+        concurrency limiter.
+        """
+        offer_text, generated_image = await self.agenerate_text_and_image(
+            prompt,
+            word_limit,
+            text_progress=text_progress,
+            image_progress=image_progress,
+            cache_mode=cache_mode,
+        )
+        initial_image, final_image = await self.arender_offer(
+            generated_image, offer_text, style, progress_callback=overlay_progress
+        )
+        return offer_text, initial_image, final_image
+
+    async def agenerate_text_and_image(
+        self,
+        prompt: str,
+        word_limit: int,
+        text_progress: Callable[[float], None] = None,
+        image_progress: Callable[[float], None] = None,
+        cache_mode: str = CACHE_USE,
+    ) -> Tuple[str, Image.Image]:
+        """
+        Generate the offer text and image concurrently, the first part of
+        agenerate_offer.
+
+        Returns:
+            Tuple[str, Image.Image]: The offer text and the generated image.
+        """
+        text_result, image_result = await asyncio.gather(
+            self._limited(
+                "text",
+                self.text_generator.service_name,
+                self.text_generator.agenerate_offer_text(
+                    prompt,
+                    word_limit,
+                    progress_callback=text_progress,
+                    cache_mode=cache_mode,
+                ),
+            ),
+            self._limited(
+                "image",
+                self.image_generator.service_name,
+                self.image_generator.agenerate_image(
+                    prompt, progress_callback=image_progress, cache_mode=cache_mode
+                ),
+            ),
+            return_exceptions=True,
+        )
+        self._collect_results(("text", text_result), ("image", image_result))
+        return text_result, image_result
+
+    async def arender_offer(
+        self,
+        generated_image: Image.Image,
+        offer_text: str,
+        style: TextStyle,
+        progress_callback: Callable[[float], None] = None,
+    ) -> Tuple[Union[Image.Image, EncodedImage], Image.Image]:
+        """
+        Overlay the offer text on its generated image on the service thread
+        pool, the second part of agenerate_offer.
+
+        Returns:
+            Tuple[Union[Image.Image, EncodedImage], Image.Image]: The
+            generated image, or its encoding after an overlay in place, and
+            the image with the text overlaid.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            async with self.limiter.limit("overlay"):
+                with stage_progress("overlay"):
+                    return await loop.run_in_executor(
+                        self.executor,
+                        lambda: self.image_processor.render_offer(
+                            generated_image,
+                            offer_text,
+                            style,
+                            progress_callback=progress_callback,
+                            in_place=self._in_place(generated_image),
+                        ),
+                    )
+        except Exception as e:
+            self.logger.error(f"Error generating offer: {str(e)}")
+            raise OfferGenerationError("overlay", e) from e
+
+    @staticmethod
+    def _in_place(image: Image.Image) -> bool:
+        """Overlay on the generated image itself unless others read it too."""
+        return Config.PIPELINE_SINGLE_COPY and not is_shared(image)
+
+    async def _limited(self, stage: str, provider: str, coroutine: Awaitable):
+        async with self.limiter.limit(stage, provider=provider):
+            with stage_progress(stage):
+                return await coroutine
+
+    @staticmethod
+    def _in_stage(stage: str, func: Callable, *args, **kwargs):
+        with stage_progress(stage):
+            return func(*args, **kwargs)
+
+    def _run_stage(self, stage: str, func: Callable, *args, **kwargs):
+        try:
+            return self._in_stage(stage, func, *args, **kwargs)
         except Exception as e:
             self.logger.error(f"Error generating offer: {str(e)}")
-            raise
+            raise OfferGenerationError(stage, e) from e
+
+    def _collect_results(self, *results: Tuple[str, object]) -> None:
+        """Log every failed stage and raise for the first one."""
+        errors = [
+            (stage, result)
+            for stage, result in results
+            if isinstance(result, BaseException)
+        ]
+        for stage, error in errors:
+            self.logger.error(f"Error generating offer ({stage}): {str(error)}")
+        if errors:
+            stage, error = errors[0]
+            raise OfferGenerationError(stage, error) from error
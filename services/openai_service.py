@@ -1,55 +1,325 @@
+import asyncio
+import base64
+import binascii
+import json
+import logging
+from typing import List, Optional, Tuple
 from PIL import Image
 from io import BytesIO
-import requests
-from openai import OpenAI
+from openai import APIConnectionError, AsyncOpenAI, OpenAI
 
 from configs.config import Config
-from contaracts.ai_contract import TextGenerationService, ImageGenerationService
+from contaracts.ai_contract import (
+    FallbackText,
+    ImageGenerationService,
+    TextGenerationService,
+    fallback_image,
+    placeholder_image,
+    placeholder_text,
+)
+from services.http_client import ImageFetchError, get_image_fetcher
+from services.metrics import PROVIDER_FALLBACKS, TEXT_BATCH_ITEMS
+from services.provider_scheduler import ProviderUnavailableError, get_scheduler
+
+TEXT_MODEL = "gpt-4"
+IMAGE_MODEL = "dall-e-3"
+MAX_TOKENS = 100
+
+logger = logging.getLogger(__name__)
+
+
+def _clients():
+    # Retries are made by the provider scheduler, which also sees the
+    # rate limits of the other calls to the model.
+    return (
+        OpenAI(api_key=Config.OPENAI_API_KEY, max_retries=0),
+        AsyncOpenAI(api_key=Config.OPENAI_API_KEY, max_retries=0),
+    )
 
 
 class OpenAITextService(TextGenerationService):
     def __init__(self):
-        self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+        self.client, self.async_client = _clients()
+        self.scheduler = get_scheduler(
+            "openai", TEXT_MODEL, transient_errors=(APIConnectionError,)
+        )
         self.prompts = Config.load_prompts()["ai_prompts"]["text_generation"]
 
+    def _completion_kwargs(self, prompt: str, word_limit: int) -> dict:
+        return dict(
+            model=TEXT_MODEL,
+            messages=[
+                {"role": "system", "content": self.prompts["system_message"]},
+                {
+                    "role": "user",
+                    "content": self.prompts["user_message"].format(
+                        prompt=prompt, word_limit=word_limit
+                    ),
+                },
+            ],
+            max_tokens=MAX_TOKENS,
+        )
+
+    def _candidates_kwargs(self, prompt: str, word_limit: int, count: int) -> dict:
+        return dict(self._completion_kwargs(prompt, word_limit), n=count)
+
+    def _batch_kwargs(self, requests: List[Tuple[str, int]]) -> dict:
+        offers = [
+            {"id": index, "prompt": prompt, "word_limit": word_limit}
+            for index, (prompt, word_limit) in enumerate(requests)
+        ]
+        kwargs = dict(
+            model=TEXT_MODEL,
+            messages=[
+                {"role": "system", "content": self.prompts["system_message"]},
+                {
+                    "role": "user",
+                    "content": self.prompts["batch_user_message"].format(
+                        offers=json.dumps(offers)
+                    ),
+                },
+            ],
+            max_tokens=MAX_TOKENS * len(requests),
+        )
+        if Config.TEXT_BATCH_JSON_MODE:
+            kwargs["response_format"] = {"type": "json_object"}
+        return kwargs
+
+    def _estimated_tokens(self, kwargs: dict) -> int:
+        # About four characters per token, plus the completions.
+        characters = sum(len(message["content"]) for message in kwargs["messages"])
+        return characters // 4 + kwargs["max_tokens"] * kwargs.get("n", 1)
+
+    def cache_identity(self, prompt: str, word_limit: int) -> dict:
+        return {"provider": "openai", **self._completion_kwargs(prompt, word_limit)}
+
     def generate_text(self, prompt: str, word_limit: int) -> str:
+        kwargs = self._completion_kwargs(prompt, word_limit)
+        try:
+            completion = self.scheduler.call(
+                lambda: self.client.chat.completions.create(**kwargs),
+                tokens=self._estimated_tokens(kwargs),
+            )
+            return _clean_text(completion.choices[0].message.content)
+        except ProviderUnavailableError as e:
+            return _fallback_text(prompt, e)
+
+    async def agenerate_text(self, prompt: str, word_limit: int) -> str:
+        kwargs = self._completion_kwargs(prompt, word_limit)
+        try:
+            completion = await self.scheduler.acall(
+                lambda: self.async_client.chat.completions.create(**kwargs),
+                tokens=self._estimated_tokens(kwargs),
+            )
+            return _clean_text(completion.choices[0].message.content)
+        except ProviderUnavailableError as e:
+            return _fallback_text(prompt, e)
+
+    def generate_candidates(
+        self, prompt: str, word_limit: int, count: int
+    ) -> List[str]:
+        """Alternative offers for one prompt, as the choices of one completion."""
+        kwargs = self._candidates_kwargs(prompt, word_limit, count)
+        try:
+            completion = self.scheduler.call(
+                lambda: self.client.chat.completions.create(**kwargs),
+                tokens=self._estimated_tokens(kwargs),
+            )
+        except ProviderUnavailableError as e:
+            return [_fallback_text(prompt, e)] * count
+        texts = _parse_choices(completion, count)
+        return self._complete(texts, [(prompt, word_limit)] * count)
+
+    async def agenerate_candidates(
+        self, prompt: str, word_limit: int, count: int
+    ) -> List[str]:
+        kwargs = self._candidates_kwargs(prompt, word_limit, count)
+        try:
+            completion = await self.scheduler.acall(
+                lambda: self.async_client.chat.completions.create(**kwargs),
+                tokens=self._estimated_tokens(kwargs),
+            )
+        except ProviderUnavailableError as e:
+            return [_fallback_text(prompt, e)] * count
+        texts = _parse_choices(completion, count)
+        return await self._acomplete(texts, [(prompt, word_limit)] * count)
+
+    def generate_texts(self, requests: List[Tuple[str, int]]) -> List[str]:
+        """
+        Offers for many prompts from one completion, which replies with a JSON
+        object of offers by prompt id.
+
+        Offers missing from the reply or invalid, or all of them if it cannot
+        be parsed, are generated with a call each.
+        """
+        kwargs = self._batch_kwargs(requests)
+        try:
+            completion = self.scheduler.call(
+                lambda: self.client.chat.completions.create(**kwargs),
+                tokens=self._estimated_tokens(kwargs),
+            )
+        except ProviderUnavailableError as e:
+            return [_fallback_text(prompt, e) for prompt, _ in requests]
+        texts = _parse_batch(completion.choices[0].message.content, len(requests))
+        return self._complete(texts, requests)
+
+    async def agenerate_texts(self, requests: List[Tuple[str, int]]) -> List[str]:
+        kwargs = self._batch_kwargs(requests)
         try:
-            completion = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": self.prompts["system_message"]},
-                    {
-                        "role": "user",
-                        "content": self.prompts["user_message"].format(
-                            prompt=prompt, word_limit=word_limit
-                        ),
-                    },
-                ],
-                max_tokens=100,
-            )
-            return completion.choices[0].message.content.strip().replace('"', "")
-        except Exception as e:
-            print(f"Error in generating offer text: {str(e)}")
-            return f"Special offer for {prompt}!"
+            completion = await self.scheduler.acall(
+                lambda: self.async_client.chat.completions.create(**kwargs),
+                tokens=self._estimated_tokens(kwargs),
+            )
+        except ProviderUnavailableError as e:
+            return [_fallback_text(prompt, e) for prompt, _ in requests]
+        texts = _parse_batch(completion.choices[0].message.content, len(requests))
+        return await self._acomplete(texts, requests)
+
+    def _complete(
+        self, texts: List[Optional[str]], requests: List[Tuple[str, int]]
+    ) -> List[str]:
+        """Generate the texts missing from a batch with a call each."""
+        _count_batch(texts)
+        return [
+            text if text is not None else self.generate_text(*request)
+            for text, request in zip(texts, requests)
+        ]
+
+    async def _acomplete(
+        self, texts: List[Optional[str]], requests: List[Tuple[str, int]]
+    ) -> List[str]:
+        _count_batch(texts)
+        missing = [index for index, text in enumerate(texts) if text is None]
+        generated = await asyncio.gather(
+            *(self.agenerate_text(*requests[index]) for index in missing)
+        )
+        for index, text in zip(missing, generated):
+            texts[index] = text
+        return texts
 
 
 class OpenAIImageService(ImageGenerationService):
     def __init__(self):
-        self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+        self.client, self.async_client = _clients()
+        self.scheduler = get_scheduler(
+            "openai", IMAGE_MODEL, transient_errors=(APIConnectionError,)
+        )
+        self.fetcher = get_image_fetcher()
+        self.response_format = Config.OPENAI_IMAGE_RESPONSE_FORMAT
         self.prompts = Config.load_prompts()["ai_prompts"]["image_generation"]
 
+    def _generation_kwargs(self, prompt: str) -> dict:
+        return dict(
+            model=IMAGE_MODEL,
+            prompt=self.prompts["prompt"].format(prompt=prompt),
+            size="1792x1024",
+            quality="standard",
+            n=1,
+        )
+
+    def cache_identity(self, prompt: str) -> dict:
+        return {"provider": "openai", **self._generation_kwargs(prompt)}
+
     def generate_image(self, prompt: str) -> Image.Image:
+        kwargs = self._generation_kwargs(prompt)
         try:
-            response = self.client.images.generate(
-                model="dall-e-3",
-                prompt=self.prompts["prompt"].format(prompt=prompt),
-                size="1792x1024",
-                quality="standard",
-                n=1,
-            )
-            image_url = response.data[0].url
-            image_response = requests.get(image_url)
-            return Image.open(BytesIO(image_response.content))
-        except Exception as e:
-            print(f"Error in generating image: {str(e)}")
-            return Image.new("RGB", (1024, 1024), color="white")
+            response = self.scheduler.call(
+                lambda: self.client.images.generate(
+                    **kwargs, response_format=self.response_format
+                )
+            )
+            if self.response_format == "b64_json":
+                return _decode_image(response.data[0].b64_json)
+            return self.fetcher.fetch(response.data[0].url)
+        except (ProviderUnavailableError, ImageFetchError) as e:
+            # Includes failed downloads, which are retried by the fetcher.
+            return _fallback_image(prompt, e)
+
+    async def agenerate_image(self, prompt: str) -> Image.Image:
+        kwargs = self._generation_kwargs(prompt)
+        try:
+            response = await self.scheduler.acall(
+                lambda: self.async_client.images.generate(
+                    **kwargs, response_format=self.response_format
+                )
+            )
+            if self.response_format == "b64_json":
+                # Decoding is CPU-bound, keep it off the event loop.
+                return await asyncio.to_thread(_decode_image, response.data[0].b64_json)
+            return await self.fetcher.afetch(response.data[0].url)
+        except (ProviderUnavailableError, ImageFetchError) as e:
+            return _fallback_image(prompt, e)
+
+
+def _clean_text(content: str) -> str:
+    return content.strip().replace('"', "")
+
+
+def _parse_choices(completion, count: int) -> List[Optional[str]]:
+    """Texts of the choices of a completion by index; None where missing."""
+    texts: List[Optional[str]] = [None] * count
+    for choice in completion.choices:
+        if 0 <= choice.index < count and choice.message.content:
+            texts[choice.index] = _clean_text(choice.message.content) or None
+    return texts
+
+
+def _parse_batch(content: Optional[str], count: int) -> List[Optional[str]]:
+    """
+    Offers of a batched reply by prompt id; None for offers that are missing
+    or invalid, and for all of them if the reply is not the requested JSON.
+    """
+    texts: List[Optional[str]] = [None] * count
+    content = (content or "").strip()
+    if content.startswith("```"):
+        # Replies without JSON mode tend to come as a fenced code block.
+        content = content.strip("`").removeprefix("json")
+    try:
+        reply = json.loads(content)
+    except ValueError:
+        logger.warning("Batched text reply is not valid JSON")
+        return texts
+    offers = reply.get("offers") if isinstance(reply, dict) else None
+    if not isinstance(offers, list):
+        logger.warning("Batched text reply has no list of offers")
+        return texts
+    for offer in offers:
+        if not isinstance(offer, dict):
+            continue
+        index, text = offer.get("id"), offer.get("offer")
+        if type(index) is int and 0 <= index < count and isinstance(text, str):
+            texts[index] = texts[index] or _clean_text(text) or None
+    return texts
+
+
+def _count_batch(texts: List[Optional[str]]) -> None:
+    missing = texts.count(None)
+    TEXT_BATCH_ITEMS.inc(len(texts) - missing, provider="openai", outcome="batched")
+    if missing:
+        logger.warning(f"Generating {missing} texts missing from a batch one by one")
+        TEXT_BATCH_ITEMS.inc(missing, provider="openai", outcome="single")
+
+
+def _fallback_text(prompt: str, error: Exception) -> str:
+    if not Config.PROVIDER_FALLBACK:
+        raise error
+    logger.error(f"Error in generating offer text, using a placeholder: {str(error)}")
+    PROVIDER_FALLBACKS.inc(provider="openai", kind="text")
+    return FallbackText(placeholder_text(prompt), str(error))
+
+
+def _fallback_image(prompt: str, error: Exception) -> Image.Image:
+    if not Config.PROVIDER_FALLBACK:
+        raise error
+    logger.error(f"Error in generating image, using a placeholder: {str(error)}")
+    PROVIDER_FALLBACKS.inc(provider="openai", kind="image")
+    return fallback_image(placeholder_image(), str(error))
+
+
+def _decode_image(b64_json: str) -> Image.Image:
+    try:
+        image = Image.open(BytesIO(base64.b64decode(b64_json)))
+        image.load()
+    except (binascii.Error, OSError) as e:
+        raise ImageFetchError(f"Invalid image data: {e}") from e
+    return image
@@ -0,0 +1,62 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional
+
+from services.metrics import time_stage
+
+# Pipeline stages reported to the current stage listener
+STAGES = ("queued", "text", "image", "download", "overlay", "encode", "saved")
+
+STAGE_STARTED = "started"
+STAGE_COMPLETED = "completed"
+STAGE_FAILED = "failed"
+
+# Called with (stage, status, elapsed seconds or None)
+StageListener = Callable[[str, str, Optional[float]], None]
+
+_listener: ContextVar[Optional[StageListener]] = ContextVar(
+    "stage_listener", default=None
+)
+
+
+@contextmanager
+def listen_to_stages(listener: StageListener) -> Iterator[None]:
+    """
+    Send the stage transitions of the current context to a listener.
+
+    The listener is inherited by tasks created and threads started with
+    asyncio.to_thread inside the block, so one offer's stages reach one
+    listener even when offers run concurrently.
+    """
+    token = _listener.set(listener)
+    try:
+        yield
+    finally:
+        _listener.reset(token)
+
+
+def report_stage(stage: str, status: str, elapsed: Optional[float] = None) -> None:
+    listener = _listener.get()
+    if listener is not None:
+        listener(stage, status, elapsed)
+
+
+@contextmanager
+def stage_progress(stage: str) -> Iterator[None]:
+    """
+    Report the start and the completion or failure of a stage, and record it
+    in the stage metrics.
+    """
+    with time_stage(stage):
+        if _listener.get() is None:
+            yield
+            return
+        report_stage(stage, STAGE_STARTED)
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            report_stage(stage, STAGE_FAILED, time.perf_counter() - start)
+            raise
+        report_stage(stage, STAGE_COMPLETED, time.perf_counter() - start)
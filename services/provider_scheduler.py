@@ -0,0 +1,318 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple, Type, TypeVar
+
+from configs.config import Config
+from services.metrics import (
+    PROVIDER_ERRORS,
+    PROVIDER_HEDGES,
+    PROVIDER_RETRIES,
+    PROVIDER_THROTTLED_SECONDS,
+)
+
+T = TypeVar("T")
+
+RETRY_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+class ProviderUnavailableError(Exception):
+    """Raised when a provider call failed and was not or no longer retried."""
+
+    def __init__(self, provider: str, model: str, error: BaseException):
+        self.provider = provider
+        self.model = model
+        self.error = error
+        super().__init__(f"{provider} {model} unavailable: {error}")
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Seconds to wait from the Retry-After headers of an HTTP error, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after") is not None:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at a rate per minute.
+
+    Callers reserve tokens up front and wait for the returned delay, so
+    waiting callers are served in order and sync and async callers can share
+    a bucket.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60
+        self.capacity = capacity if capacity is not None else per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take tokens from the bucket.
+
+        Returns:
+            float: Seconds to wait before the tokens are available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+
+class ProviderScheduler:
+    """
+    Schedules the calls to one model of an AI provider.
+
+    Calls wait for the request and token buckets of the model. Rate limit
+    (429), server (5xx) and transient connection errors are retried with
+    jittered exponential backoff; a Retry-After from the provider is honored
+    and pauses every call to the model, not only the failed one. With
+    hedge_after set, an async call that has not finished after that many
+    seconds is raced against a second attempt.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        model: str,
+        rpm: int = 0,
+        tpm: int = 0,
+        retries: int = Config.PROVIDER_RETRIES,
+        backoff: float = Config.PROVIDER_BACKOFF,
+        max_backoff: float = Config.PROVIDER_MAX_BACKOFF,
+        hedge_after: Optional[float] = None,
+        transient_errors: Tuple[Type[BaseException], ...] = (),
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.provider = provider
+        self.model = model
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+        self.transient_errors = (ConnectionError, TimeoutError) + tuple(
+            transient_errors
+        )
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self.calls = 0
+        self.attempts = 0
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failed = 0
+        self.throttled_seconds = 0.0
+
+    def _reserve(self, tokens: int) -> float:
+        delay = 0.0
+        if self.requests is not None:
+            delay = self.requests.reserve(1)
+        if self.tokens is not None and tokens:
+            delay = max(delay, self.tokens.reserve(tokens))
+        with self._lock:
+            self.attempts += 1
+            delay = max(delay, self._paused_until - time.monotonic())
+            if delay > 0:
+                self.throttled_seconds += delay
+        if delay > 0:
+            PROVIDER_THROTTLED_SECONDS.inc(
+                delay, provider=self.provider, model=self.model
+            )
+        return max(0.0, delay)
+
+    def _retry_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying after error, or None to give up."""
+        status = _status_code(error)
+        kind = str(status) if status is not None else type(error).__name__
+        PROVIDER_ERRORS.inc(provider=self.provider, kind=kind)
+        retryable = status in RETRY_STATUSES or isinstance(
+            error, self.transient_errors
+        )
+        if not retryable or attempt >= self.retries:
+            return None
+
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            # Capped, so one bad header can't stall every call to the model.
+            delay = min(retry_after, self.max_backoff)
+            # The limit applies to the model, hold back the other calls too.
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        else:
+            delay = min(self.max_backoff, self.backoff * 2**attempt)
+            delay *= 0.5 + random.random() / 2
+        with self._lock:
+            self.retried += 1
+        PROVIDER_RETRIES.inc(provider=self.provider, model=self.model)
+        self.logger.warning(
+            f"{self.provider} {self.model} call failed ({kind}), "
+            f"retrying in {delay:.2f}s"
+        )
+        return delay
+
+    def _give_up(self, error: BaseException) -> ProviderUnavailableError:
+        with self._lock:
+            self.failed += 1
+        return ProviderUnavailableError(self.provider, self.model, error)
+
+    def call(self, func: Callable[[], T], tokens: int = 0) -> T:
+        """
+        Call the provider, waiting for capacity and retrying transient errors.
+
+        Args:
+            func (Callable[[], T]): Makes one provider request.
+            tokens (int): Estimated tokens the request uses.
+
+        Returns:
+            T: The result of func.
+
+        Raises:
+            ProviderUnavailableError: The last error once retrying stopped.
+        """
+        with self._lock:
+            self.calls += 1
+        for attempt in range(self.retries + 1):
+            time.sleep(self._reserve(tokens))
+            try:
+                return func()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise self._give_up(e) from e
+            time.sleep(delay)
+
+    async def acall(self, func: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+        """
+        Async variant of call, hedging slow attempts if configured.
+
+        Args:
+            func (Callable[[], Awaitable[T]]): Makes one provider request.
+            tokens (int): Estimated tokens the request uses.
+
+        Returns:
+            T: The result of func.
+
+        Raises:
+            ProviderUnavailableError: The last error once retrying stopped.
+        """
+        with self._lock:
+            self.calls += 1
+        for attempt in range(self.retries + 1):
+            try:
+                if self.hedge_after is None:
+                    return await self._attempt(func, tokens)
+                return await self._hedged(func, tokens)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise self._give_up(e) from e
+            await asyncio.sleep(delay)
+
+    async def _attempt(self, func: Callable[[], Awaitable[T]], tokens: int) -> T:
+        await asyncio.sleep(self._reserve(tokens))
+        return await func()
+
+    async def _hedged(self, func: Callable[[], Awaitable[T]], tokens: int) -> T:
+        first = asyncio.ensure_future(self._attempt(func, tokens))
+        attempts = [first]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=self.hedge_after)
+            if done:
+                return first.result()
+
+            with self._lock:
+                self.hedged += 1
+            PROVIDER_HEDGES.inc(provider=self.provider, model=self.model)
+            attempts.append(asyncio.ensure_future(self._attempt(func, tokens)))
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return task.result()
+            # Both attempts failed, retry based on the original one.
+            return first.result()
+        finally:
+            # The slower attempt, or both when the call was cancelled.
+            for task in attempts:
+                task.cancel()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "attempts": self.attempts,
+                "retried": self.retried,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "failed": self.failed,
+                "throttled_seconds": self.throttled_seconds,
+            }
+
+
+_schedulers: Dict[Tuple[str, str], ProviderScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(
+    provider: str,
+    model: str,
+    transient_errors: Tuple[Type[BaseException], ...] = (),
+) -> ProviderScheduler:
+    """
+    Process-wide scheduler of a model, configured from Config.
+
+    Every service instance calling the model shares its rate limits.
+    """
+    with _schedulers_lock:
+        scheduler = _schedulers.get((provider, model))
+        if scheduler is None:
+            limits = Config.PROVIDER_RATE_LIMITS.get(model, {})
+            scheduler = ProviderScheduler(
+                provider,
+                model,
+                rpm=limits.get("rpm", 0),
+                tpm=limits.get("tpm", 0),
+                hedge_after=Config.PROVIDER_HEDGE_AFTER.get(model),
+                transient_errors=transient_errors,
+            )
+            _schedulers[(provider, model)] = scheduler
+        return scheduler
+
+
+def scheduler_stats() -> Dict[str, Dict[str, float]]:
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    return {
+        f"{scheduler.provider}:{scheduler.model}": scheduler.stats()
+        for scheduler in schedulers
+    }
@@ -0,0 +1,231 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+from configs.config import Config
+from models import TextStyle
+from services.font_cache import font_cache
+from services.image_writer import encode_image
+
+_processor = None
+# Returned by _submit when the pool broke or was shut down and the job has to
+# be rendered in process.
+_BROKEN = object()
+
+
+class RenderedImage(NamedTuple):
+    image: Image.Image
+    # Encoded image, if an image format was requested.
+    data: Optional[bytes]
+
+
+def _init_worker(font_names: Iterable[str], sizes: Iterable[int]) -> None:
+    font_cache.preload(font_names, sizes)
+
+
+def _warm_up() -> None:
+    pass
+
+
+def _render(
+    image: Image.Image, text: str, style: TextStyle, image_format: Optional[str]
+) -> RenderedImage:
+    global _processor
+    if _processor is None:
+        from services.image_processor import ImageProcessor
+
+        _processor = ImageProcessor()
+    image = _processor.overlay_text_on_image(image, text, style)
+    data = encode_image(image, image_format) if image_format else None
+    return RenderedImage(image, data)
+
+
+def _render_shared(
+    name: str,
+    size: Tuple[int, int],
+    text: str,
+    style: TextStyle,
+    image_format: Optional[str],
+) -> Optional[bytes]:
+    """Worker side: overlay the image in the shared block in place."""
+    shm = SharedMemory(name=name)
+    try:
+        with shm.buf[: size[0] * size[1] * 3] as pixels:
+            image, data = _render(
+                Image.frombytes("RGB", size, pixels), text, style, image_format
+            )
+            pixels[:] = image.tobytes()
+        return data
+    finally:
+        shm.close()
+
+
+class RenderPool:
+    """
+    Process-pool backend for the CPU-bound overlay and encoding.
+
+    Pixels travel between processes through a shared memory block per job
+    instead of pickled images: the worker overlays the text on the block in
+    place and returns only the encoded bytes. Workers preload the configured
+    fonts when they start. The number of queued and running jobs is bounded,
+    callers block once the queue is full. Images smaller than min_pixels are
+    rendered in process.
+    """
+
+    def __init__(
+        self,
+        workers: int = Config.RENDER_POOL_WORKERS,
+        queue_size: int = Config.RENDER_POOL_QUEUE_SIZE,
+        min_pixels: int = Config.RENDER_POOL_MIN_PIXELS,
+        font_names: Iterable[str] = Config.PRELOAD_FONT_NAMES,
+        start_method: str = Config.RENDER_POOL_START_METHOD,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.workers = workers
+        self.queue_size = queue_size
+        self.min_pixels = min_pixels
+        self.font_names = list(font_names)
+        self._context = multiprocessing.get_context(start_method)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.in_process = 0
+        self.failed = 0
+        self.restarts = 0
+        self.blocked = 0
+        self.blocked_seconds = 0.0
+
+    def _current_executor(self) -> ProcessPoolExecutor:
+        # Callers hold self._lock.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=self._context,
+                initializer=_init_worker,
+                initargs=(self.font_names, Config.FONT_SIZES),
+            )
+        return self._executor
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            return self._current_executor()
+
+    def _submit_job(self, *args) -> Future:
+        # Submitting under the lock means a restart never shuts down the
+        # executor between it being picked and the job being queued.
+        with self._lock:
+            self.submitted += 1
+            return self._current_executor().submit(_render_shared, *args)
+
+    def start(self) -> None:
+        """Start the workers now, so the first requests don't pay for it."""
+        for future in [self.executor.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+
+    def render(
+        self,
+        image: Image.Image,
+        text: str,
+        style: TextStyle,
+        image_format: Optional[str] = None,
+    ) -> RenderedImage:
+        """
+        Overlay text on an image and optionally encode the result.
+
+        The given image is not modified.
+
+        Args:
+            image (Image.Image): The base image.
+            text (str): The text to overlay.
+            style (TextStyle): Style information for the text.
+            image_format (Optional[str]): PIL format to encode the result in.
+
+        Returns:
+            RenderedImage: The rendered image and its encoding.
+        """
+        if image.width * image.height < self.min_pixels:
+            with self._lock:
+                self.in_process += 1
+            return _render(image.copy(), text, style, image_format)
+
+        image = image if image.mode == "RGB" else image.convert("RGB")
+        length = image.width * image.height * 3
+        shm = SharedMemory(create=True, size=length)
+        try:
+            with shm.buf[:length] as pixels:
+                pixels[:] = image.tobytes()
+                data = self._submit(shm.name, image.size, text, style, image_format)
+                if data is _BROKEN:
+                    return _render(image.copy(), text, style, image_format)
+                return RenderedImage(Image.frombytes("RGB", image.size, pixels), data)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def _submit(self, *args) -> Optional[bytes]:
+        if not self._slots.acquire(blocking=False):
+            start = time.perf_counter()
+            self._slots.acquire()
+            with self._lock:
+                self.blocked += 1
+                self.blocked_seconds += time.perf_counter() - start
+        try:
+            return self._submit_job(*args).result()
+        except BrokenProcessPool as e:
+            # A worker died, e.g. killed for memory. Render this job in
+            # process and start a fresh pool for the next ones.
+            self.logger.error(f"Render pool broken, restarting: {str(e)}")
+            with self._lock:
+                self.failed += 1
+            self.restart()
+            return _BROKEN
+        except CancelledError:
+            # The pool was shut down with the job still queued.
+            self.logger.warning("Render job cancelled, rendering in process")
+            with self._lock:
+                self.failed += 1
+            return _BROKEN
+        finally:
+            self._slots.release()
+
+    def restart(self) -> None:
+        """
+        Replace the workers, e.g. after fonts changed on disk.
+
+        New jobs go to fresh workers; the old workers finish the jobs already
+        queued for them and exit.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+            if executor is not None:
+                self.restarts += 1
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "submitted": self.submitted,
+                "in_process": self.in_process,
+                "failed": self.failed,
+                "restarts": self.restarts,
+                "blocked": self.blocked,
+                "blocked_seconds": self.blocked_seconds,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
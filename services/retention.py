@@ -0,0 +1,364 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from configs.config import Config
+from contaracts.image_store_contract import ImageStore
+from services.image_cache import EncodedImageCache
+
+KIND_BASE = "base"  # Generated by the image service
+KIND_FINAL = "final"  # With the offer text overlaid, also re-rendered variants
+IMAGE_KINDS = (KIND_BASE, KIND_FINAL)
+
+# Buffered access times are written once this many are pending.
+ACCESS_FLUSH_SIZE = 1024
+# Number of locks the image names are spread over
+NAME_LOCK_STRIPES = 64
+
+# (name, kind, size, accessed)
+IndexRow = Tuple[str, str, int, float]
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """How long images of a kind are kept; None means no limit."""
+
+    # Seconds since the image was stored
+    max_age: Optional[float] = None
+    # Seconds since the image was last served
+    max_idle: Optional[float] = None
+
+
+def policies_from_config() -> Dict[str, RetentionPolicy]:
+    return {
+        kind: RetentionPolicy(**policy)
+        for kind, policy in Config.IMAGE_RETENTION_POLICIES.items()
+    }
+
+
+@dataclass
+class RetentionReport:
+    deleted: Dict[str, int] = field(default_factory=dict)
+    bytes_reclaimed: int = 0
+    bytes_remaining: int = 0
+    seconds: float = 0.0
+    dry_run: bool = False
+
+    def add(self, kind: str, size: int) -> None:
+        self.deleted[kind] = self.deleted.get(kind, 0) + 1
+        self.bytes_reclaimed += size
+
+
+class ImageIndex:
+    """
+    Persistent index of the stored images: kind, size, and when each image
+    was stored and last served, kept in SQLite next to the images.
+
+    The index is maintained as images are stored, served and deleted, so
+    retention passes query it instead of listing and stat-ing the images
+    folder. Access times are buffered in memory and written in batches. The
+    database can be shared by the API and the CLI.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(Config.IMAGES_FOLDER, ".index.sqlite3")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # A new index has yet to learn about images stored before it existed.
+        self.created = not os.path.exists(self.path)
+        self._lock = threading.Lock()
+        self._name_locks = [threading.Lock() for _ in range(NAME_LOCK_STRIPES)]
+        self._accessed: Dict[str, float] = {}
+        self._connection = sqlite3.connect(
+            self.path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS images (name TEXT PRIMARY KEY, "
+            "kind TEXT NOT NULL, size INTEGER NOT NULL, stored REAL NOT NULL, "
+            "accessed REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS images_accessed ON images (accessed, name)"
+        )
+
+    def name_lock(self, name: str) -> threading.Lock:
+        """
+        Lock held while an image is recorded and stored, or removed and
+        deleted, so a retention pass can't delete an image that a write just
+        recorded but found stored already. It serializes the threads of this
+        process only.
+        """
+        return self._name_locks[hash(name) % NAME_LOCK_STRIPES]
+
+    def add(self, name: str, kind: str, size: int) -> None:
+        """Record a stored image; storing it again only refreshes its access."""
+        now = time.time()
+        with self._lock:
+            self._accessed.pop(name, None)
+            self._connection.execute(
+                "INSERT INTO images VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET accessed = excluded.accessed",
+                (name, kind, size, now, now),
+            )
+
+    def add_missing(self, rows: List[Tuple[str, str, int]]) -> int:
+        """Record images not in the index yet, as stored now."""
+        now = time.time()
+        with self._lock:
+            before = self._count()
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO images VALUES (?, ?, ?, ?, ?)",
+                [(name, kind, size, now, now) for name, kind, size in rows],
+            )
+            return self._count() - before
+
+    def touch(self, name: str) -> None:
+        """Note that an image was served."""
+        with self._lock:
+            self._accessed[name] = time.time()
+            if len(self._accessed) >= ACCESS_FLUSH_SIZE:
+                self._flush()
+
+    def flush(self) -> None:
+        """Write the buffered access times."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._accessed:
+            return
+        self._connection.executemany(
+            "UPDATE images SET accessed = ? WHERE name = ? AND accessed < ?",
+            [(accessed, name, accessed) for name, accessed in self._accessed.items()],
+        )
+        self._accessed.clear()
+
+    def _count(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            row = self._connection.execute("SELECT SUM(size) FROM images").fetchone()
+        return row[0] or 0
+
+    def expired(
+        self,
+        kind: str,
+        policy: RetentionPolicy,
+        after: Tuple[float, str] = (float("-inf"), ""),
+        limit: int = Config.IMAGE_GC_BATCH_SIZE,
+    ) -> List[IndexRow]:
+        """
+        Images of a kind beyond the limits of the policy, by last access.
+
+        Args:
+            kind (str): The kind of images.
+            policy (RetentionPolicy): The limits.
+            after (Tuple[float, str]): Access time and name of the last row of
+                the previous batch.
+            limit (int): Maximum number of rows.
+        """
+        now = time.time()
+        conditions = []
+        parameters: list = [kind, *after]
+        if policy.max_age is not None:
+            conditions.append("stored < ?")
+            parameters.append(now - policy.max_age)
+        if policy.max_idle is not None:
+            conditions.append("accessed < ?")
+            parameters.append(now - policy.max_idle)
+        if not conditions:
+            return []
+        with self._lock:
+            return self._connection.execute(
+                "SELECT name, kind, size, accessed FROM images "
+                "WHERE kind = ? AND (accessed, name) > (?, ?) "
+                f"AND ({' OR '.join(conditions)}) "
+                "ORDER BY accessed, name LIMIT ?",
+                (*parameters, limit),
+            ).fetchall()
+
+    def least_recently_used(
+        self,
+        after: Tuple[float, str] = (float("-inf"), ""),
+        limit: int = Config.IMAGE_GC_BATCH_SIZE,
+    ) -> List[IndexRow]:
+        """Images by last access, continuing after the given row."""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT name, kind, size, accessed FROM images "
+                "WHERE (accessed, name) > (?, ?) ORDER BY accessed, name LIMIT ?",
+                (*after, limit),
+            ).fetchall()
+
+    def remove_unused(self, name: str, accessed: float) -> bool:
+        """
+        Remove an image unless it was stored or served again after accessed.
+
+        Returns:
+            bool: Whether the image was removed and may be deleted.
+        """
+        with self._lock:
+            if self._accessed.get(name, 0) > accessed:
+                return False
+            cursor = self._connection.execute(
+                "DELETE FROM images WHERE name = ? AND accessed <= ?",
+                (name, accessed),
+            )
+            return cursor.rowcount > 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+            self._connection.close()
+
+
+class ImageRetention:
+    """
+    Deletes generated images by the retention policy of their kind, then the
+    least recently served ones while the store is above its size cap.
+
+    Candidates are read from the image index in batches, so a pass costs in
+    proportion to what it deletes rather than to the size of the store. An
+    image stored or served again after a pass picked it is kept.
+    """
+
+    def __init__(
+        self,
+        store: ImageStore,
+        index: ImageIndex,
+        policies: Optional[Dict[str, RetentionPolicy]] = None,
+        max_bytes: int = Config.IMAGE_RETENTION_MAX_BYTES,
+        cache: Optional[EncodedImageCache] = None,
+        batch_size: int = Config.IMAGE_GC_BATCH_SIZE,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.store = store
+        self.index = index
+        self.policies = policies if policies is not None else policies_from_config()
+        self.max_bytes = max_bytes
+        self.cache = cache
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self.passes = 0
+        self.deleted = {kind: 0 for kind in IMAGE_KINDS}
+        self.bytes_reclaimed = 0
+        self.bytes_remaining = 0
+
+    def reindex(self) -> int:
+        """
+        Add the stored images missing from the index, e.g. those stored before
+        it existed, as if they were stored now.
+
+        Content-addressed names don't tell base images from final ones, so
+        those are indexed as final images, under the longer-lived policy.
+        Only legacy names ending in "_initial" are indexed as base images.
+
+        Returns:
+            int: The number of images added.
+        """
+        rows = []
+        for name in self.store.names():
+            size = self.store.size(name)
+            if size is not None:
+                kind = KIND_BASE if "_initial." in name else KIND_FINAL
+                rows.append((name, kind, size))
+        added = self.index.add_missing(rows)
+        self.index.created = False
+        if added:
+            self.logger.info(f"Added {added} stored images to the image index")
+        return added
+
+    def collect(self, dry_run: bool = False) -> RetentionReport:
+        """
+        Run a retention pass.
+
+        Args:
+            dry_run (bool): Only report what would be deleted.
+
+        Returns:
+            RetentionReport: Deleted images by kind and bytes reclaimed.
+        """
+        start = time.perf_counter()
+        if self.index.created:
+            self.reindex()
+        self.index.flush()
+        report = RetentionReport(dry_run=dry_run)
+        # Picked in a dry run, where they stay in the index.
+        picked: Set[str] = set()
+
+        for kind, policy in self.policies.items():
+            after = (float("-inf"), "")
+            while True:
+                rows = self.index.expired(kind, policy, after, self.batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    self._delete(row, report, dry_run, picked)
+                after = (rows[-1][3], rows[-1][0])
+
+        total = self.index.total_bytes()
+        if dry_run:
+            total -= report.bytes_reclaimed
+        after = (float("-inf"), "")
+        while total > self.max_bytes:
+            rows = self.index.least_recently_used(after, self.batch_size)
+            if not rows:
+                break
+            for row in rows:
+                if total <= self.max_bytes:
+                    break
+                if row[0] not in picked:
+                    total -= self._delete(row, report, dry_run, picked)
+            after = (rows[-1][3], rows[-1][0])
+
+        report.bytes_remaining = total
+        report.seconds = time.perf_counter() - start
+        if not dry_run:
+            with self._lock:
+                self.passes += 1
+                for kind, count in report.deleted.items():
+                    self.deleted[kind] = self.deleted.get(kind, 0) + count
+                self.bytes_reclaimed += report.bytes_reclaimed
+                self.bytes_remaining = report.bytes_remaining
+        self.logger.info(
+            f"Image retention {'dry run ' if dry_run else ''}"
+            f"deleted {sum(report.deleted.values())} images, reclaimed "
+            f"{report.bytes_reclaimed} bytes, {report.bytes_remaining} bytes "
+            f"remain ({report.seconds:.2f}s)"
+        )
+        return report
+
+    def _delete(
+        self, row: IndexRow, report: RetentionReport, dry_run: bool, picked: Set[str]
+    ) -> int:
+        """Delete the image of an index row; returns the bytes reclaimed."""
+        name, kind, size, accessed = row
+        if dry_run:
+            picked.add(name)
+        else:
+            with self.index.name_lock(name):
+                if not self.index.remove_unused(name, accessed):
+                    return 0
+                if self.cache is not None:
+                    self.cache.invalidate(name)
+                deleted = self.store.delete(name)
+            if not deleted:
+                # Already gone, only the index entry was stale.
+                return size
+        report.add(kind, size)
+        return size
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "passes": self.passes,
+                "deleted": dict(self.deleted),
+                "bytes_reclaimed": self.bytes_reclaimed,
+                "bytes_remaining": self.bytes_remaining,
+            }
@@ -0,0 +1,158 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from services.metrics import COALESCED_CALLS
+
+T = TypeVar("T")
+
+
+class _Call:
+    """A call in flight and the callers waiting for it."""
+
+    def __init__(self):
+        self.future: Future = Future()
+        self.waiters = 1
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into a single call.
+
+    The first caller of a key (the leader) runs the call; callers arriving
+    while it is in flight wait for it and get the same result or exception.
+    Threads and coroutines can wait for the same call. Results are shared,
+    not copied, and must be treated as read-only.
+
+    Asynchronous calls run in a task of their own, so a leader that is
+    cancelled, e.g. because its client disconnected, does not fail the
+    other waiters. The call is cancelled once every waiter has been
+    cancelled.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _join(self, key: str) -> Tuple[_Call, bool]:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                COALESCED_CALLS.inc(name=self.name)
+                return call, False
+            call = self._calls[key] = _Call()
+            self.leaders += 1
+            return call, True
+
+    def _finish(self, key: str, call: _Call) -> None:
+        # Callers arriving from now on start a new call instead of getting
+        # this result.
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    def do(self, key: Optional[str], func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Call func, or wait for the call in flight with the same key.
+
+        Args:
+            key (Optional[str]): Normalized identity of the call; None runs
+                the call without coalescing.
+            func (Callable[..., T]): The call to make.
+
+        Returns:
+            T: The result of the call.
+        """
+        return self.do_shared(key, func, *args, **kwargs)[0]
+
+    def do_shared(
+        self, key: Optional[str], func: Callable[..., T], *args, **kwargs
+    ) -> Tuple[T, bool]:
+        """Like do, also returns whether other callers got the same result."""
+        if key is None:
+            return func(*args, **kwargs), False
+        call, leader = self._join(key)
+        if not leader:
+            return call.future.result(), True
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, call)
+            call.future.set_exception(e)
+            raise
+        self._finish(key, call)
+        call.future.set_result(result)
+        # Nobody joins a finished call, the waiters are final.
+        return result, call.waiters > 1
+
+    async def ado(
+        self, key: Optional[str], func: Callable[..., Awaitable[T]], *args, **kwargs
+    ) -> T:
+        """
+        Await func, or the call in flight with the same key.
+
+        Args:
+            key (Optional[str]): Normalized identity of the call; None runs
+                the call without coalescing.
+            func (Callable[..., Awaitable[T]]): Coroutine function to call.
+
+        Returns:
+            T: The result of the call.
+        """
+        return (await self.ado_shared(key, func, *args, **kwargs))[0]
+
+    async def ado_shared(
+        self, key: Optional[str], func: Callable[..., Awaitable[T]], *args, **kwargs
+    ) -> Tuple[T, bool]:
+        """Like ado, also returns whether other callers got the same result."""
+        if key is None:
+            return await func(*args, **kwargs), False
+        call, leader = self._join(key)
+        if leader:
+            call.task = asyncio.ensure_future(self._run(key, call, func, args, kwargs))
+        try:
+            result = await asyncio.shield(asyncio.wrap_future(call.future))
+        except asyncio.CancelledError:
+            self._leave(key, call)
+            raise
+        return result, not leader or call.waiters > 1
+
+    async def _run(self, key: str, call: _Call, func, args, kwargs) -> None:
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            self._finish(key, call)
+            call.future.cancel()
+            raise
+        except BaseException as e:
+            self._finish(key, call)
+            call.future.set_exception(e)
+            return
+        self._finish(key, call)
+        call.future.set_result(result)
+
+    def _leave(self, key: str, call: _Call) -> None:
+        """A waiter was cancelled; cancel the call if nobody else waits."""
+        with self._lock:
+            call.waiters -= 1
+            if call.waiters > 0 or call.future.done():
+                return
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        if call.task is not None:
+            call.task.get_loop().call_soon_threadsafe(call.task.cancel)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+            }
@@ -0,0 +1,237 @@
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from configs.config import Config
+from models import TextStyle
+from services.font_cache import font_cache
+
+# Iterations of the line width search when balancing lines
+BALANCE_ITERATIONS = 16
+
+
+class GlyphMetrics:
+    """
+    Advance widths and line metrics of a font, in em units.
+
+    Advances are measured once per character at the reference size and scaled
+    linearly to other sizes, so layout trials at many sizes need no text
+    measurement. Kerning and hinting are ignored; the final layout is checked
+    against the real text box.
+    """
+
+    def __init__(self, font: ImageFont.FreeTypeFont):
+        self.font = font
+        # Inked height of a line with ascenders and descenders
+        left, top, right, bottom = font.getbbox("Ag")
+        self.line_height = (bottom - top) / font.size
+        # Distance between the tops of two lines without extra spacing, as
+        # used by ImageDraw.multiline_text.
+        self.line_advance = font.getbbox("A")[3] / font.size
+        self._advances: Dict[str, float] = {}
+
+    def width(self, text: str) -> float:
+        advances = self._advances
+        total = 0.0
+        for character in text:
+            advance = advances.get(character)
+            if advance is None:
+                advance = self.font.getlength(character) / self.font.size
+                advances[character] = advance
+            total += advance
+        return total
+
+
+class GlyphMetricsCache:
+    """LRU cache of glyph metrics per font file."""
+
+    def __init__(
+        self,
+        max_size: int = Config.GLYPH_METRICS_CACHE_SIZE,
+        reference_size: int = Config.LAYOUT_REFERENCE_SIZE,
+    ):
+        self.max_size = max_size
+        self.reference_size = reference_size
+        self._metrics: "OrderedDict[str, GlyphMetrics]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, font_name: str) -> GlyphMetrics:
+        with self._lock:
+            metrics = self._metrics.get(font_name)
+            if metrics is not None:
+                self._metrics.move_to_end(font_name)
+                self.hits += 1
+                return metrics
+            self.misses += 1
+
+        metrics = GlyphMetrics(font_cache.get(font_name, self.reference_size))
+        with self._lock:
+            self._metrics[font_name] = metrics
+            while len(self._metrics) > self.max_size:
+                self._metrics.popitem(last=False)
+        return metrics
+
+    def invalidate(self, font_name: Optional[str] = None) -> None:
+        with self._lock:
+            if font_name is None:
+                self._metrics.clear()
+            else:
+                self._metrics.pop(font_name, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._metrics),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+glyph_metrics_cache = GlyphMetricsCache()
+
+# Only used for measuring, never drawn on.
+_measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+
+
+@dataclass
+class TextLayout:
+    text: str
+    font: ImageFont.FreeTypeFont
+    font_size: int
+    spacing: int
+    # Box of the rendered text relative to the drawing origin
+    bbox: Tuple[int, int, int, int]
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.bbox[2] - self.bbox[0], self.bbox[3] - self.bbox[1]
+
+
+def wrap_words(words: List[str], metrics: GlyphMetrics, max_width: float) -> List[str]:
+    """
+    Greedily wrap words into lines no wider than max_width em.
+
+    A word wider than max_width gets a line of its own.
+    """
+    space = metrics.width(" ")
+    lines: List[str] = []
+    current: List[str] = []
+    current_width = 0.0
+    for word in words:
+        word_width = metrics.width(word)
+        if current and current_width + space + word_width > max_width:
+            lines.append(" ".join(current))
+            current, current_width = [word], word_width
+        else:
+            current_width += (space if current else 0.0) + word_width
+            current.append(word)
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+
+def balance_lines(
+    words: List[str], metrics: GlyphMetrics, max_width: float
+) -> List[str]:
+    """
+    Wrap words into as few lines as greedy wrapping needs, with the lines as
+    even in width as possible.
+
+    Searches the narrowest width that still wraps into the same number of
+    lines.
+    """
+    lines = wrap_words(words, metrics, max_width)
+    low = max(metrics.width(word) for word in words) if words else 0.0
+    high = max_width
+    if len(lines) < 2 or low >= high:
+        return lines
+    for _ in range(BALANCE_ITERATIONS):
+        middle = (low + high) / 2
+        if len(wrap_words(words, metrics, middle)) <= len(lines):
+            high = middle
+        else:
+            low = middle
+    return wrap_words(words, metrics, high)
+
+
+def _spacing(style: TextStyle, size: int) -> int:
+    return int(round(size * style.line_spacing))
+
+
+def layout_text(text: str, style: TextStyle, image_size: Tuple[int, int]) -> TextLayout:
+    """
+    Lay out text for an image according to the layout fields of the style.
+
+    With wrap, the text is broken into balanced lines that fit the box of
+    max_width x max_height of the image. With auto_fit, the largest font size
+    between min_font_size and font_size at which the text fits is found by a
+    binary search over the estimated size of the text; only the result is
+    measured with the real font.
+
+    Args:
+        text (str): The text; newlines start new paragraphs.
+        style (TextStyle): Style information for the text.
+        image_size (Tuple[int, int]): Width and height of the image.
+
+    Returns:
+        TextLayout: The laid out text and its measured box.
+    """
+    max_size = style.font_size
+    min_size = min(style.min_font_size, max_size)
+    padding = max(5, int(max_size * 0.2))
+    box_width = max(1.0, style.max_width * image_size[0] - 2 * padding)
+    box_height = max(1.0, style.max_height * image_size[1] - 2 * padding)
+    metrics = glyph_metrics_cache.get(style.font_name)
+    paragraphs = [paragraph.split() for paragraph in text.split("\n")]
+
+    def lines_at(size: int) -> List[str]:
+        if not style.wrap:
+            return text.split("\n")
+        lines = []
+        for words in paragraphs:
+            lines.extend(balance_lines(words, metrics, box_width / size) or [""])
+        return lines
+
+    def estimate_fits(size: int) -> bool:
+        lines = lines_at(size)
+        width = max(metrics.width(line) for line in lines) * size
+        height = (len(lines) - 1) * (
+            metrics.line_advance * size + _spacing(style, size)
+        ) + metrics.line_height * size
+        return width <= box_width and height <= box_height
+
+    size = max_size
+    if style.auto_fit and not estimate_fits(max_size):
+        size, low, high = min_size, min_size, max_size - 1
+        while low <= high:
+            middle = (low + high) // 2
+            if estimate_fits(middle):
+                size, low = middle, middle + 1
+            else:
+                high = middle - 1
+
+    while True:
+        layout = _measure_layout("\n".join(lines_at(size)), style, size)
+        width, height = layout.size
+        fits = width <= box_width and height <= box_height
+        if fits or not style.auto_fit or size <= min_size:
+            return layout
+        # The estimate ignores kerning and hinting, step down to what fits.
+        size -= 1
+
+
+def _measure_layout(text: str, style: TextStyle, size: int) -> TextLayout:
+    font = font_cache.get(style.font_name, size)
+    spacing = _spacing(style, size)
+    left, top, right, bottom = _measure.multiline_textbbox(
+        (0, 0), text, font=font, spacing=spacing, align=style.align
+    )
+    bbox = (math.floor(left), math.floor(top), math.ceil(right), math.ceil(bottom))
+    return TextLayout(text, font, size, spacing, bbox)
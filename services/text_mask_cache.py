@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+from configs.config import Config
+from services.text_layout import TextLayout
+
+MaskKey = Tuple[str, int, str, int, str]
+
+
+class TextMaskCache:
+    """
+    Memory-bounded LRU cache of rasterized text.
+
+    A mask is the L-mode coverage of a laid out text, cropped to its box and
+    keyed by (font, size, text, spacing, alignment), so repeated overlays of
+    the same text are a single paste of the text color through the mask
+    instead of rasterizing the glyphs again. The color is not part of the
+    key. Masks must not be modified.
+    """
+
+    def __init__(self, max_bytes: int = Config.TEXT_MASK_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._masks: "OrderedDict[MaskKey, Image.Image]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, layout: TextLayout, font_name: str, align: str) -> Image.Image:
+        """
+        Get the mask of a laid out text, rasterizing it on a miss.
+
+        Args:
+            layout (TextLayout): The laid out text.
+            font_name (str): Name of the font file of the layout.
+            align (str): Alignment of the lines.
+
+        Returns:
+            Image.Image: L-mode mask of the size of the layout box.
+        """
+        key = (font_name, layout.font_size, layout.text, layout.spacing, align)
+        with self._lock:
+            mask = self._masks.get(key)
+            if mask is not None:
+                self._masks.move_to_end(key)
+                self.hits += 1
+                return mask
+            self.misses += 1
+
+        mask = self._rasterize(layout, align)
+        size = mask.width * mask.height
+        if size > self.max_bytes:
+            return mask
+        with self._lock:
+            if key not in self._masks:
+                self._masks[key] = mask
+                self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._masks.popitem(last=False)
+                self._bytes -= evicted.width * evicted.height
+                self.evictions += 1
+        return mask
+
+    def _rasterize(self, layout: TextLayout, align: str) -> Image.Image:
+        left, top, _, _ = layout.bbox
+        mask = Image.new("L", layout.size, 0)
+        ImageDraw.Draw(mask).multiline_text(
+            (-left, -top),
+            layout.text,
+            font=layout.font,
+            fill=255,
+            spacing=layout.spacing,
+            align=align,
+        )
+        return mask
+
+    def invalidate(self, font_name: Optional[str] = None) -> None:
+        """Drop the masks of one font file, or all masks if no name is given."""
+        with self._lock:
+            for key in [
+                key for key in self._masks if font_name is None or key[0] == font_name
+            ]:
+                evicted = self._masks.pop(key)
+                self._bytes -= evicted.width * evicted.height
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._masks),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+text_mask_cache = TextMaskCache()
@@ -0,0 +1,26 @@
+from services.batch import BatchCheckpoint, item_key, iter_jsonl_items
+
+
+def test_iter_jsonl_items_skips_blank_lines():
+    lines = ['{"prompt": "spa"}\n', "\n", '{"prompt": "beach"}\n', "   "]
+
+    assert list(iter_jsonl_items(lines)) == [
+        (0, '{"prompt": "spa"}'),
+        (1, '{"prompt": "beach"}'),
+    ]
+
+
+def test_item_key_depends_on_position_and_content():
+    assert item_key(0, "a") == item_key(0, "a")
+    assert item_key(0, "a") != item_key(1, "a")
+    assert item_key(0, "a") != item_key(0, "b")
+
+
+def test_checkpoint_resumes(tmp_path):
+    path = str(tmp_path / "offers.checkpoint")
+    checkpoint = BatchCheckpoint(path)
+    checkpoint.mark_done(item_key(0, "a"))
+
+    resumed = BatchCheckpoint(path)
+    assert resumed.is_done(item_key(0, "a"))
+    assert not resumed.is_done(item_key(1, "b"))
@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from configs.config import Config
+from services.container import ServiceContainer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_the_api_builds_no_services(tmp_path):
+    environment = {
+        key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"
+    }
+    script = (
+        "import sys; from configs.config import Config; "
+        f"Config.IMAGES_FOLDER = {str(tmp_path / 'images')!r}; "
+        "import api.main, os; "
+        "assert 'openai' not in sys.modules; "
+        "assert not os.path.exists(Config.IMAGES_FOLDER)"
+    )
+    subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT, env=environment, check=True
+    )
+
+
+def test_services_are_built_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "IMAGES_FOLDER", str(tmp_path))
+    services = ServiceContainer(service_name="local")
+    assert not services.built("offer_service")
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        built = list(executor.map(lambda _: services.offer_service, range(4)))
+
+    assert all(service is built[0] for service in built)
+    assert built[0].text_generator is services.text_generator
+    assert services.render_pool is None
+
+
+def test_prompts_are_parsed_once():
+    assert Config.load_prompts() is Config.load_prompts()
@@ -0,0 +1,66 @@
+import os
+import threading
+
+from PIL import Image
+
+from services.derivatives import DerivativeStore, resize_to_width
+from services.image_store import LocalImageStore
+from services.image_writer import encode_image
+
+
+def make_source(path, size=(1792, 1024)):
+    Image.new("RGB", size, color="orange").save(path, format="JPEG")
+
+
+def test_resize_to_width_keeps_aspect_ratio(tmp_path):
+    source = str(tmp_path / "offer.jpg")
+    make_source(source)
+
+    with Image.open(source) as image:
+        assert resize_to_width(image, 480).size == (480, 274)
+    with Image.open(source) as image:
+        assert resize_to_width(image, 4000).size == (1792, 1024)
+
+
+def store_source(tmp_path):
+    images = LocalImageStore(str(tmp_path / "images"))
+    source = images.store(
+        encode_image(Image.new("RGB", (1792, 1024), color="orange"), "JPEG"), "jpg"
+    )
+    return images, source
+
+
+def test_derivative_store_produces_once(tmp_path):
+    images, source = store_source(tmp_path)
+    store = DerivativeStore(folder=str(tmp_path / "derivatives"), images=images)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(store.get(source, 320, "WEBP")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(results)) == 1
+    stats = store.stats()
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+    with Image.open(os.path.join(store.folder, os.listdir(store.folder)[0])) as image:
+        assert image.format == "WEBP"
+        assert image.width == 320
+
+
+def test_derivative_store_evicts_least_recently_used(tmp_path):
+    images, source = store_source(tmp_path)
+    store = DerivativeStore(
+        folder=str(tmp_path / "derivatives"), max_bytes=1, images=images
+    )
+
+    store.get(source, 160, "JPEG")
+    store.get(source, 320, "JPEG")
+
+    assert store.stats()["entries"] == 1
+    assert len(os.listdir(store.folder)) == 1
@@ -0,0 +1,39 @@
+from configs.config import Config
+from services.font_cache import FontCache
+
+
+def test_font_cache_hits_and_misses():
+    cache = FontCache(max_size=4)
+    first = cache.get(Config.DEFAULT_FONT, 32)
+    second = cache.get(Config.DEFAULT_FONT, 32)
+
+    assert first is second
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_font_cache_evicts_least_recently_used():
+    cache = FontCache(max_size=2)
+    cache.get(Config.DEFAULT_FONT, 12)
+    cache.get(Config.DEFAULT_FONT, 16)
+    cache.get(Config.DEFAULT_FONT, 12)
+    cache.get(Config.DEFAULT_FONT, 20)
+
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 1
+
+    cache.get(Config.DEFAULT_FONT, 12)
+    assert cache.stats()["hits"] == 2
+
+
+def test_font_cache_invalidate():
+    cache = FontCache()
+    cache.preload([Config.DEFAULT_FONT, "missing.ttf"], [12, 16])
+    assert cache.stats()["size"] == 4
+
+    cache.invalidate(Config.DEFAULT_FONT)
+    assert cache.stats()["size"] == 2
+
+    cache.invalidate()
+    assert cache.stats()["size"] == 0
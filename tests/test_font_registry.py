@@ -0,0 +1,97 @@
+import io
+import os
+import shutil
+
+import pytest
+from fastapi.testclient import TestClient
+
+from configs.config import Config
+from services.font_registry import (
+    FontError,
+    FontRegistry,
+    FontTooLargeError,
+    read_coverage,
+)
+
+VARIABLE_FONT = "SixtyfourConvergence-Regular-VariableFont_BLED,SCAN,XELA,YELA.ttf"
+
+
+@pytest.fixture
+def registry(tmp_path):
+    folder = tmp_path / "fonts"
+    folder.mkdir()
+    for name in (Config.DEFAULT_FONT, VARIABLE_FONT):
+        shutil.copy(os.path.join(Config.FONTS_FOLDER, name), folder / name)
+    return FontRegistry(folder=str(folder), index_path=str(tmp_path / "fonts.json"))
+
+
+def font_bytes(name=Config.DEFAULT_FONT):
+    with open(os.path.join(Config.FONTS_FOLDER, name), "rb") as file:
+        return file.read()
+
+
+def test_reads_metadata_and_coverage(registry):
+    info = registry.get(VARIABLE_FONT)
+
+    assert info.family == "Sixtyfour Convergence"
+    assert [axis["name"] for axis in info.axes][:2] == ["Scanlines", "Bleed"]
+    assert registry.get(Config.DEFAULT_FONT).axes == []
+    assert registry.missing_glyphs(Config.DEFAULT_FONT, "Stay 3, pay 2!") == []
+    assert registry.missing_glyphs(Config.DEFAULT_FONT, "Spa 日本 日") == ["日", "本"]
+    assert registry.missing_glyphs("unknown.ttf", "Spa") is None
+
+
+def test_index_is_persisted(registry):
+    registry.names()
+    reloaded = FontRegistry(folder=registry.folder, index_path=registry.index_path)
+
+    assert reloaded.names() == registry.names()
+    assert reloaded.get(VARIABLE_FONT) == registry.get(VARIABLE_FONT)
+    assert reloaded.parsed == 0
+
+
+def test_install_validates_fonts(registry):
+    with pytest.raises(FontError):
+        registry.install("broken.ttf", io.BytesIO(b"\x00\x01\x00\x00" + b"\x00" * 64))
+    with pytest.raises(FontError):
+        registry.install("../escape.ttf", io.BytesIO(font_bytes()))
+    registry.max_upload_bytes = 1024
+    with pytest.raises(FontTooLargeError):
+        registry.install("large.ttf", io.BytesIO(font_bytes()))
+
+    assert sorted(os.listdir(registry.folder)) == sorted(
+        [Config.DEFAULT_FONT, VARIABLE_FONT]
+    )
+    with pytest.raises(FontError):
+        read_coverage(b"GIF89a")
+
+
+def test_fonts_api(registry, monkeypatch):
+    import api.main as api
+
+    monkeypatch.setattr(api, "font_registry", registry)
+    client = TestClient(api.app)
+
+    uploaded = client.post(
+        "/upload-font",
+        files={"font": ("Custom.ttf", font_bytes(), "font/ttf")},
+    )
+    assert uploaded.status_code == 200
+    assert "Custom.ttf" in client.get("/fonts").json()
+    assert client.get("/fonts/Custom.ttf").json()["family"] == "Arial"
+
+    coverage = client.get("/fonts/Custom.ttf/coverage", params={"text": "Spa €"})
+    assert coverage.json() == {
+        "font_name": "Custom.ttf",
+        "covered": True,
+        "missing": [],
+    }
+
+    rejected = client.post(
+        "/upload-font", files={"font": ("notes.txt", b"hello", "text/plain")}
+    )
+    assert rejected.status_code == 400
+
+    assert client.delete("/fonts/Custom.ttf").status_code == 200
+    assert client.get("/fonts/Custom.ttf").status_code == 404
+    assert client.delete(f"/fonts/{Config.DEFAULT_FONT}").status_code == 409
@@ -0,0 +1,72 @@
+import os
+from io import BytesIO
+
+from contaracts.ai_contract import placeholder_image, placeholder_text
+from generators.image_generator import ImageGenerator
+from generators.text_generator import TextGenerator
+from services.generation_cache import GenerationCache, make_cache_key
+
+
+def test_make_cache_key_is_order_independent():
+    first = make_cache_key({"provider": "openai", "prompt": "spa", "n": 1})
+    second = make_cache_key({"n": 1, "prompt": "spa", "provider": "openai"})
+
+    assert first == second
+    assert first != make_cache_key({"provider": "openai", "prompt": "spa", "n": 2})
+
+
+def test_generation_cache_memory_and_disk_tiers(tmp_path):
+    cache = GenerationCache("text", folder=str(tmp_path))
+    key = make_cache_key({"prompt": "spa"})
+
+    assert cache.get(key) is None
+    cache.put(key, b"Relax at the spa")
+    assert cache.get(key) == b"Relax at the spa"
+
+    # A fresh instance only has the disk tier.
+    reopened = GenerationCache("text", folder=str(tmp_path))
+    assert reopened.get(key) == b"Relax at the spa"
+    assert reopened.get(key) == b"Relax at the spa"
+
+    stats = reopened.stats()
+    assert stats["disk_hits"] == 1
+    assert stats["memory_hits"] == 1
+    assert stats["hit_rate"] == 1.0
+
+
+def test_generation_cache_evicts_by_size_and_age(tmp_path):
+    cache = GenerationCache(
+        "image", memory_max_bytes=10, disk_max_bytes=10, folder=str(tmp_path)
+    )
+    cache.put("aa1", b"123456")
+    cache.put("bb2", b"123456")
+
+    assert cache.stats()["disk_entries"] == 1
+    assert not os.path.exists(os.path.join(str(tmp_path), "image", "aa", "aa1"))
+
+    expired = GenerationCache("image", ttl=-1, folder=str(tmp_path))
+    assert expired.get("bb2") is None
+    assert expired.stats()["disk_entries"] == 0
+
+
+def test_cached_placeholders_are_misses(tmp_path):
+    texts = TextGenerator("local", cache=GenerationCache("text", folder=str(tmp_path)))
+    images = ImageGenerator(
+        "local", cache=GenerationCache("image", folder=str(tmp_path))
+    )
+    text_key = texts._request_key("spa", 5)
+    image_key = images._request_key("spa")
+    # Entries left by builds that cached the provider's placeholders.
+    texts.cache.put(text_key, placeholder_text("spa").encode("utf-8"))
+    buffer = BytesIO()
+    placeholder_image().save(buffer, format="PNG")
+    images.cache.put(image_key, buffer.getvalue())
+
+    assert texts.generate_offer_text("spa", 5) == texts.service.generate_text("spa", 5)
+    assert texts.generate_offer_texts([("spa", 5)]) == [
+        texts.service.generate_text("spa", 5)
+    ]
+    assert images.generate_image("spa").tobytes() == (
+        images.service.generate_image("spa").tobytes()
+    )
+    assert texts.cache.get(text_key) != placeholder_text("spa").encode("utf-8")
@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import httpx
+import pytest
+from PIL import Image
+
+from services.http_client import ImageFetchError, ImageFetcher, ImageTooLargeError
+
+
+def png_bytes(size=(64, 32), noise=False):
+    if noise:
+        image = Image.effect_noise(size, 64)
+    else:
+        image = Image.new("RGB", size, color="teal")
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the provider's image CDN."""
+
+    flaky_failures = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _send_image(self, data, send_length=True):
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        if send_length:
+            self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/image.png":
+            self._send_image(png_bytes())
+        elif self.path == "/large.png":
+            self._send_image(png_bytes((256, 256), noise=True), send_length=False)
+        elif self.path.startswith("/flaky"):
+            remaining = self.flaky_failures.get(self.path, 1)
+            if remaining > 0:
+                self.flaky_failures[self.path] = remaining - 1
+                self.send_response(503)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            else:
+                self._send_image(png_bytes())
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def fetcher():
+    fetcher = ImageFetcher(retries=2, backoff=0, max_bytes=64 * 1024)
+    yield fetcher
+    fetcher.close()
+
+
+def test_fetch_decodes_streamed_image(server_url, fetcher):
+    image = fetcher.fetch(f"{server_url}/image.png")
+    assert image.size == (64, 32)
+
+
+def test_fetch_retries_transient_errors(server_url, fetcher):
+    image = fetcher.fetch(f"{server_url}/flaky-sync")
+    assert image.size == (64, 32)
+
+
+def test_fetch_enforces_max_bytes_without_content_length(server_url):
+    fetcher = ImageFetcher(retries=0, max_bytes=1024)
+    with pytest.raises(ImageTooLargeError):
+        fetcher.fetch(f"{server_url}/large.png")
+
+
+def test_fetch_gives_up_after_retries(server_url):
+    ImageHandler.flaky_failures["/flaky-exhausted"] = 10
+    fetcher = ImageFetcher(retries=1, backoff=0)
+    with pytest.raises(ImageFetchError):
+        fetcher.fetch(f"{server_url}/flaky-exhausted")
+
+
+def test_client_errors_are_fetch_errors(server_url, fetcher):
+    with pytest.raises(ImageFetchError):
+        fetcher.fetch(f"{server_url}/missing.png")
+
+    async def main():
+        try:
+            await fetcher.afetch(f"{server_url}/missing.png")
+        finally:
+            await fetcher.aclose()
+
+    with pytest.raises(ImageFetchError):
+        asyncio.run(main())
+
+
+def test_afetch(server_url, fetcher):
+    async def main():
+        try:
+            return [
+                await fetcher.afetch(f"{server_url}/image.png"),
+                await fetcher.afetch(f"{server_url}/flaky-async"),
+            ]
+        finally:
+            await fetcher.aclose()
+
+    images = asyncio.run(main())
+    assert [image.size for image in images] == [(64, 32), (64, 32)]
+
+
+def test_afetch_decodes_off_the_event_loop(server_url, fetcher, monkeypatch):
+    threads = set()
+    feed = fetcher._feed
+
+    def record(*args):
+        threads.add(threading.get_ident())
+        return feed(*args)
+
+    monkeypatch.setattr(fetcher, "_feed", record)
+
+    async def main():
+        try:
+            return await fetcher.afetch(f"{server_url}/image.png")
+        finally:
+            await fetcher.aclose()
+
+    assert asyncio.run(main()).size == (64, 32)
+    assert threads and threading.get_ident() not in threads
+
+
+def test_retry_after_is_capped():
+    fetcher = ImageFetcher(backoff=100, max_backoff=2)
+    assert fetcher._delay(0, retry_after=3600) == 2
+    assert fetcher._delay(5) == 2
+    assert fetcher._delay(0, retry_after=1) == 1
+
+
+def test_async_client_is_created_once(monkeypatch):
+    fetcher = ImageFetcher()
+    created = []
+    async_client = httpx.AsyncClient
+
+    def slow_client(**kwargs):
+        created.append(None)
+        time.sleep(0.05)
+        return async_client(**kwargs)
+
+    monkeypatch.setattr(httpx, "AsyncClient", slow_client)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        clients = list(executor.map(lambda _: fetcher.async_client, range(4)))
+    asyncio.run(fetcher.aclose())
+
+    assert len(created) == 1
+    assert all(client is clients[0] for client in clients)
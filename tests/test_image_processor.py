@@ -0,0 +1,57 @@
+import os
+
+import pytest
+from PIL import Image
+
+from configs.config import Config
+from models import TextStyle
+from services.image_cache import is_content_addressed
+from services.image_processor import ImageProcessor
+from services.image_store import LocalImageStore
+from services.image_writer import ImageWriter
+
+
+@pytest.fixture
+def images_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "IMAGES_FOLDER", str(tmp_path))
+    return str(tmp_path)
+
+
+def make_style(position="center"):
+    return TextStyle(
+        font_name=Config.DEFAULT_FONT,
+        font_size=24,
+        position=position,
+        text_color=(255, 255, 255),
+        bg_color=(0, 0, 0),
+        bg_opacity=0.5,
+    )
+
+
+def test_render_variants_leaves_base_image_untouched(images_folder):
+    processor = ImageProcessor(writer=ImageWriter(store=LocalImageStore()))
+    base_name = processor.save_image(Image.new("RGB", (320, 160), color="navy"))
+    base = processor.load_image(base_name)
+    before = base.tobytes()
+
+    names = processor.render_variants(
+        base, "Stay 3, pay 2", [make_style("top-left"), make_style("bottom-right")]
+    )
+
+    assert len(set(names)) == 2
+    assert base.tobytes() == before
+    for name in names:
+        assert os.path.exists(processor.writer.store.location(name))
+
+
+def test_offer_images_get_distinct_names(images_folder):
+    processor = ImageProcessor(writer=ImageWriter(store=LocalImageStore()))
+    names = set()
+    for color in ("navy", "teal"):
+        image = Image.new("RGB", (64, 64), color=color)
+        names.update(processor.save_offer_images(image, image.copy(), wait=False))
+
+    assert len(names) == 2
+    assert all(is_content_addressed(name) for name in names)
+    processor.writer.shutdown()
+    assert sorted(processor.writer.store.names()) == sorted(names)
@@ -0,0 +1,133 @@
+import pytest
+from fastapi import Request
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from api.responses import accepts, image_response, parse_range
+from configs.config import Config
+from services.container import ServiceContainer
+from services.image_cache import EncodedImageCache, is_content_addressed
+
+DATA = bytes(range(256)) * 4
+
+
+def make_request(**headers):
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/images/offer.jpg",
+            "headers": [
+                (name.replace("_", "-").encode(), value.encode())
+                for name, value in headers.items()
+            ],
+        }
+    )
+
+
+@pytest.fixture
+def cached_image():
+    return EncodedImageCache().put("/images/offer.jpg", DATA)
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    with pytest.raises(ValueError):
+        parse_range("bytes=100-", 100)
+
+
+def test_accepts():
+    assert accepts("image/avif,image/webp,*/*", "image/webp")
+    assert accepts("image/WebP; q=0.5", "image/webp")
+    assert not accepts("image/webp;q=0", "image/webp")
+    assert not accepts("image/webp;q=0.0, image/jpeg", "image/webp")
+    assert not accepts("image/*,*/*;q=0.8", "image/webp")
+    assert not accepts("", "image/webp")
+
+
+def test_refused_webp_is_not_negotiated(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "IMAGES_FOLDER", str(tmp_path))
+    import api.main as api
+
+    services = ServiceContainer(service_name="local")
+    monkeypatch.setattr(api, "services", services)
+    name = services.image_processor.save_image(Image.new("RGB", (640, 400)))
+    client = TestClient(api.app)
+    url = f"/images/{name}?w={Config.DERIVATIVE_WIDTHS[0]}"
+
+    refused = client.get(url, headers={"Accept": "image/webp;q=0, image/*"})
+    accepted = client.get(url, headers={"Accept": "image/webp, image/*;q=0.8"})
+
+    assert refused.headers["content-type"] == "image/jpeg"
+    assert accepted.headers["content-type"] == "image/webp"
+
+
+def test_full_response_has_validators(cached_image):
+    response = image_response(make_request(), "offer.jpg", cached_image)
+
+    assert response.status_code == 200
+    assert response.body == DATA
+    assert response.headers["etag"] == cached_image.etag
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.media_type == "image/jpeg"
+
+
+def test_if_none_match_returns_not_modified(cached_image):
+    request = make_request(if_none_match=f'"other", W/{cached_image.etag}')
+    response = image_response(request, "offer.jpg", cached_image)
+
+    assert response.status_code == 304
+    assert response.body == b""
+
+
+def test_range_request(cached_image):
+    request = make_request(range="bytes=10-19")
+    response = image_response(request, "offer.jpg", cached_image)
+
+    assert response.status_code == 206
+    assert response.body == DATA[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(DATA)}"
+
+    request = make_request(range="bytes=5000-")
+    response = image_response(request, "offer.jpg", cached_image)
+    assert response.status_code == 416
+
+
+def test_content_addressed_names_are_immutable(cached_image):
+    name = "ab" * 32 + ".jpg"
+    assert is_content_addressed(name)
+    response = image_response(make_request(), name, cached_image)
+    assert "immutable" in response.headers["cache-control"]
+
+
+def test_encoded_image_cache_evicts_by_bytes():
+    cache = EncodedImageCache(max_bytes=100, max_entry_bytes=80)
+    cache.put("a", b"x" * 60)
+    cache.put("b", b"x" * 60)
+    cache.put("c", b"x" * 90)
+
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    assert cache.get("c") is None
+
+
+@pytest.mark.parametrize("response_mode", ["inline", "multipart"])
+def test_missing_saved_image_is_reported(tmp_path, monkeypatch, response_mode):
+    monkeypatch.setattr(Config, "IMAGES_FOLDER", str(tmp_path))
+    import api.main as api
+
+    async def read_image(image_name):
+        return None
+
+    monkeypatch.setattr(api, "services", ServiceContainer(service_name="local"))
+    monkeypatch.setattr(api, "read_image", read_image)
+
+    request = {"prompt": "spa", "response_mode": response_mode, "cache_mode": "bypass"}
+    response = TestClient(api.app).post("/generate-offer", json=request)
+
+    assert response.status_code == 500
+    assert "is missing from the store" in response.json()["detail"]
@@ -0,0 +1,80 @@
+import os
+import threading
+
+import pytest
+from PIL import Image
+
+from contaracts.image_store_contract import content_name
+from services.image_store import LocalImageStore
+from services.image_writer import ImageWriter, encode_image, format_for_path
+
+
+def test_format_for_path():
+    assert format_for_path("offer_final.jpg") == "JPEG"
+    assert format_for_path("offer_final.WEBP") == "WEBP"
+    with pytest.raises(ValueError):
+        format_for_path("offer_final.gif")
+
+
+def test_encode_image_converts_rgba_for_jpeg():
+    data = encode_image(Image.new("RGBA", (32, 32), (255, 0, 0, 128)), "JPEG")
+    assert data[:2] == b"\xff\xd8"
+
+
+def test_writer_stores_by_content_hash(tmp_path):
+    store = LocalImageStore(str(tmp_path))
+    writer = ImageWriter(workers=2, queue_size=2, store=store)
+    image = Image.new("RGB", (32, 32), "red")
+
+    name = writer.submit(image, "png").result()
+    writer.shutdown()
+
+    data = store.get(name)
+    assert name == content_name(data, "png")
+    assert store.path(name) == str(tmp_path / name[:2] / name[2:4] / name)
+    assert writer.pending(name) is None
+    assert [name for name in store.names()] == [name]
+    assert writer.stats()["completed"] == 1
+
+
+def test_writer_deduplicates_identical_images(tmp_path):
+    store = LocalImageStore(str(tmp_path))
+    writer = ImageWriter(workers=1, queue_size=1, store=store)
+    image = Image.new("RGB", (32, 32), "red")
+
+    first = writer.write(image, "jpg")
+    second = writer.write(image.copy(), "jpg")
+
+    assert first == second
+    assert len(list(store.names())) == 1
+    assert writer.stats()["deduplicated"] == 1
+    writer.shutdown()
+
+
+def test_writer_applies_backpressure(tmp_path, monkeypatch):
+    writer = ImageWriter(
+        workers=1, queue_size=0, store=LocalImageStore(str(tmp_path))
+    )
+    release = threading.Event()
+    original_encode = writer.encode
+
+    def slow_encode(image, extension, data=None):
+        release.wait()
+        return original_encode(image, extension, data)
+
+    monkeypatch.setattr(writer, "encode", slow_encode)
+    writer.submit(Image.new("RGB", (8, 8), "red"), "png")
+
+    blocked_submit = threading.Thread(
+        target=writer.submit, args=(Image.new("RGB", (8, 8), "blue"), "png")
+    )
+    blocked_submit.start()
+    blocked_submit.join(timeout=0.1)
+    assert blocked_submit.is_alive()
+
+    release.set()
+    blocked_submit.join()
+    writer.shutdown()
+    assert writer.stats()["blocked"] == 1
+    assert writer.stats()["completed"] == 2
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
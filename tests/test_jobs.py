@@ -0,0 +1,160 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from configs.config import Config
+from models import Job
+from services.container import ServiceContainer
+from services.jobs import InMemoryJobStore, JobLimitError, JobManager
+from services.offer_generator_service import OfferGenerationError
+from services.progress import stage_progress
+
+
+def test_job_manager_records_stage_events():
+    async def runner(request):
+        with stage_progress("text"):
+            await asyncio.sleep(0.01)
+        with stage_progress("overlay"):
+            await asyncio.to_thread(lambda: None)
+        return {"offer_text": request["prompt"]}
+
+    async def scenario():
+        manager = JobManager(InMemoryJobStore(), runner)
+        job = manager.submit({"prompt": "spa"})
+        return [event async for event in manager.watch(job.id)], manager, job.id
+
+    events, manager, job_id = asyncio.run(scenario())
+
+    assert [(event["stage"], event["status"]) for event in events] == [
+        ("queued", "started"),
+        ("queued", "completed"),
+        ("text", "started"),
+        ("text", "completed"),
+        ("overlay", "started"),
+        ("overlay", "completed"),
+        ("saved", "completed"),
+    ]
+    assert events[3]["elapsed"] >= 0.01
+    job = manager.store.get(job_id)
+    assert job.status == "succeeded"
+    assert job.result == {"offer_text": "spa"}
+    assert manager.stats()["succeeded"] == 1
+
+
+def test_failed_job_reports_the_stage():
+    async def runner(request):
+        with stage_progress("image"):
+            raise OfferGenerationError("image", RuntimeError("provider down"))
+
+    async def scenario():
+        manager = JobManager(InMemoryJobStore(), runner)
+        job = manager.submit({})
+        events = [event async for event in manager.watch(job.id)]
+        return events, manager.store.get(job.id)
+
+    events, job = asyncio.run(scenario())
+
+    assert events[-1]["stage"] == "image" and events[-1]["status"] == "failed"
+    assert job.status == "failed"
+    assert job.error["stage"] == "image"
+
+
+def test_in_flight_jobs_are_capped():
+    async def runner(request):
+        await asyncio.sleep(0.05)
+        return {}
+
+    async def scenario():
+        manager = JobManager(InMemoryJobStore(), runner, max_in_flight=1)
+        manager.submit({})
+        with pytest.raises(JobLimitError):
+            manager.submit({})
+        await manager.shutdown()
+        return manager
+
+    manager = asyncio.run(scenario())
+    assert manager.stats()["rejected"] == 1
+    assert manager.stats()["in_flight"] == 0
+    job = next(iter(manager.store._jobs.values()))
+    assert job.status == "failed"
+
+
+def test_store_drops_expired_jobs():
+    store = InMemoryJobStore(retention=10, max_jobs=100)
+    store.create(Job(id="old", request={}, status="succeeded", updated_at=0))
+    store.create(Job(id="running", request={}, status="running", updated_at=0))
+    store.create(Job(id="new", request={}))
+
+    assert store.get("old") is None
+    assert store.get("running") is not None
+
+
+def test_jobs_finished_out_of_order_expire():
+    store = InMemoryJobStore(retention=10, max_jobs=100)
+    # Created first, finished just now.
+    store.create(Job(id="slow", request={}, status="succeeded", updated_at=time.time()))
+    store.create(Job(id="fast", request={}, status="succeeded", updated_at=0))
+    store.create(Job(id="new", request={}))
+
+    assert store.get("slow") is not None
+    assert store.get("fast") is None
+
+
+def test_watchers_leave_no_signals():
+    async def runner(request):
+        await asyncio.sleep(0.01)
+        return {}
+
+    async def scenario():
+        manager = JobManager(InMemoryJobStore(), runner)
+        job = manager.submit({})
+        [event async for event in manager.watch(job.id)]
+        # Watching a finished or an unknown job again.
+        [event async for event in manager.watch(job.id)]
+        [event async for event in manager.watch("unknown")]
+        return manager
+
+    manager = asyncio.run(scenario())
+    assert manager._signals == {}
+
+
+def test_jobs_api_streams_stage_events(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "IMAGES_FOLDER", str(tmp_path))
+    import api.main as api
+
+    # A container of its own, so the OpenAI services are never built.
+    services = ServiceContainer(service_name="local", job_runner=api.run_offer_job)
+    monkeypatch.setattr(api, "services", services)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            submitted = await client.post(
+                "/jobs", json={"prompt": "spa", "cache_mode": "bypass"}
+            )
+            assert submitted.status_code == 202
+            events_url = submitted.json()["events_url"]
+            async with client.stream("GET", events_url) as response:
+                body = (await response.aread()).decode()
+            status = await client.get(submitted.json()["status_url"])
+        return body, status.json()
+
+    body, job = asyncio.run(scenario())
+
+    messages = [block for block in body.split("\n\n") if block]
+    stages = [
+        json.loads(message.split("data: ", 1)[1])
+        for message in messages
+        if "event: stage" in message
+    ]
+    completed = [event["stage"] for event in stages if event["status"] == "completed"]
+    assert {"queued", "text", "image", "overlay", "encode", "saved"} <= set(completed)
+    assert completed[-1] == "saved"
+    assert messages[-1].startswith("event: succeeded")
+    assert job["status"] == "succeeded"
+    assert job["result"]["final_image_url"].startswith("/images/")
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from benchmarks.throughput import run_service_benchmark
+from factories.ai_service_factory import AIServiceFactory
+from services.local_service import (
+    LocalImageService,
+    LocalServiceError,
+    LocalTextService,
+)
+
+
+def test_factory_registers_local_services():
+    assert isinstance(AIServiceFactory.get_text_service("local"), LocalTextService)
+    assert isinstance(AIServiceFactory.get_image_service("local"), LocalImageService)
+
+
+def test_local_services_are_deterministic():
+    text_service = LocalTextService()
+    image_service = LocalImageService(size=(64, 32))
+
+    assert text_service.generate_text("spa", 5) == text_service.generate_text("spa", 5)
+    assert len(text_service.generate_text("spa", 5).split()) == 5
+    assert text_service.generate_text("spa", 5) != text_service.generate_text("ski", 5)
+
+    image = image_service.generate_image("spa")
+    assert image.size == (64, 32)
+    same_image = asyncio.run(image_service.agenerate_image("spa"))
+    assert image.tobytes() == same_image.tobytes()
+
+
+def test_local_services_inject_failures():
+    with pytest.raises(LocalServiceError):
+        LocalTextService(failure_rate=1).generate_text("spa", 5)
+    with pytest.raises(LocalServiceError):
+        asyncio.run(LocalImageService(failure_rate=1).agenerate_image("spa"))
+
+
+def test_service_benchmark_reports_stages():
+    options = {
+        "text_latency": 0.01,
+        "image_latency": 0.02,
+        "jitter": 0.0,
+        "failure_rate": 0.0,
+    }
+    result = asyncio.run(run_service_benchmark(4, 8, options))
+
+    assert result["errors"] == 0
+    assert result["total"]["count"] == 8
+    assert set(result["stages"]) == {"text", "image", "overlay"}
+    assert result["offers_per_sec"] > 0
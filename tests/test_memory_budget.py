@@ -0,0 +1,300 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import httpx
+import pytest
+from PIL import Image
+
+from configs.config import Config
+from generators.image_generator import SHARED_INFO_KEY
+from models import TextStyle
+from services.container import ServiceContainer
+from services.image_processor import ImageProcessor
+from services.image_store import LocalImageStore
+from services.image_writer import EncodedImage, ImageWriter, encode_image
+from services.memory_budget import MemoryBudget
+from services.offer_generator_service import OfferGeneratorService
+from services.retention import KIND_BASE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Decoded 1792x1024 RGB image, Pillow keeps 4 bytes per pixel.
+BUFFER_KB = 1792 * 1024 * 4 // 1024
+
+# Generates offers of 1792x1024 images in a fresh process and prints the
+# growth of its peak RSS in KiB. Arguments: images folder, "single" or "copy",
+# number of offers at once, memory budget in offers (0: unbounded).
+PEAK_RSS_SCRIPT = """
+import resource, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from configs.config import Config
+from models import TextStyle
+from services.image_processor import ImageProcessor
+from services.memory_budget import MemoryBudget
+from services.offer_generator_service import OfferGeneratorService
+
+folder, mode, offers, budget = sys.argv[1], sys.argv[2], *map(int, sys.argv[3:])
+Config.IMAGES_FOLDER = folder
+Config.PIPELINE_SINGLE_COPY = mode == "single"
+
+
+class Generator:
+    service_name = "local"
+    size = (1792, 1024)
+
+    def generate_offer_text(self, prompt, word_limit, **kwargs):
+        return "Spa weekend: stay 3 nights, pay 2"
+
+    def generate_image(self, prompt, **kwargs):
+        image = Image.new("RGB", self.size, "white")
+        time.sleep(0.2)
+        return image
+
+
+generator = Generator()
+processor = ImageProcessor()
+service = OfferGeneratorService(generator, generator, processor)
+budget = MemoryBudget(budget * Config.MEMORY_BUDGET_PER_REQUEST)
+style = TextStyle(
+    font_name=Config.DEFAULT_FONT, font_size=48, position="center",
+    text_color=(255, 255, 255), bg_color=(0, 0, 0), bg_opacity=0.5,
+)
+
+
+def offer(_):
+    with budget.reserve():
+        _, initial_image, final_image = service.generate_offer("spa", 10, style)
+        processor.save_offer_images(initial_image, final_image, wait=True)
+
+
+generator.size = (64, 64)
+offer(None)
+generator.size = (1792, 1024)
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+with ThreadPoolExecutor(max_workers=offers) as executor:
+    list(executor.map(offer, range(offers)))
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)
+"""
+
+
+# Linux carries the peak RSS of a process over to the program it executes, so
+# a process started from pytest starts at the peak of pytest. The script runs
+# from a small launcher process instead.
+LAUNCHER = "import subprocess, sys; sys.exit(subprocess.call(sys.argv[1:]))"
+
+
+def peak_rss_kb(tmp_path, mode: str, offers: int = 1, budget: int = 0) -> int:
+    # A fixed mmap threshold makes glibc hand freed image buffers back to the
+    # system instead of keeping them in per-thread arenas, so the peak
+    # reflects the buffers held at once.
+    environment = {**os.environ, "MALLOC_MMAP_THRESHOLD_": str(128 * 1024)}
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            LAUNCHER,
+            sys.executable,
+            "-c",
+            PEAK_RSS_SCRIPT,
+            str(tmp_path / "images"),
+            mode,
+            str(offers),
+            str(budget),
+        ],
+        cwd=ROOT,
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return int(result.stdout.split()[-1])
+
+
+@pytest.fixture
+def style():
+    return TextStyle(
+        font_name=Config.DEFAULT_FONT,
+        font_size=24,
+        position="center",
+        text_color=(255, 255, 255),
+        bg_color=(0, 0, 0),
+        bg_opacity=0.5,
+    )
+
+
+class Generator:
+    service_name = "local"
+
+    def __init__(self, image):
+        self.image = image
+
+    def generate_offer_text(self, prompt, word_limit, **kwargs):
+        return "Stay 3, pay 2"
+
+    def generate_image(self, prompt, **kwargs):
+        return self.image
+
+
+def test_work_waits_for_the_budget():
+    budget = MemoryBudget(total_bytes=100)
+    holding = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def work(_):
+        nonlocal holding, peak
+        with budget.reserve(60):
+            with lock:
+                holding += 1
+                peak = max(peak, holding)
+            time.sleep(0.01)
+            with lock:
+                holding -= 1
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(work, range(8)))
+
+    stats = budget.stats()
+    assert peak == 1
+    assert stats["reserved_bytes"] == 0
+    assert stats["peak_bytes"] == 60
+    assert stats["waits"] > 0
+
+
+def test_cancelled_waiters_give_up_their_place():
+    budget = MemoryBudget(total_bytes=100)
+
+    async def main():
+        async with budget.areserve(80):
+            waiter = asyncio.create_task(budget.areserve(80).__aenter__())
+            await asyncio.sleep(0)
+            assert budget.stats()["waiting"] == 1
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+        async with budget.areserve(100):
+            assert budget.stats()["reserved_bytes"] == 100
+
+    asyncio.run(main())
+    assert budget.stats() == {
+        "total_bytes": 100,
+        "reserved_bytes": 0,
+        "peak_bytes": 100,
+        "waiting": 0,
+        "waits": 1,
+    }
+
+
+def test_single_copy_overlays_in_place(tmp_path, style, monkeypatch):
+    monkeypatch.setattr(Config, "PIPELINE_SINGLE_COPY", True)
+    processor = ImageProcessor(
+        writer=ImageWriter(store=LocalImageStore(str(tmp_path / "images")))
+    )
+    image = Image.new("RGB", (320, 200), color="white")
+    base_encoding = encode_image(image, "JPEG")
+    service = OfferGeneratorService(Generator(image), Generator(image), processor)
+
+    _, initial_image, final_image = service.generate_offer("spa", 5, style)
+    initial_name, final_name = processor.save_offer_images(
+        initial_image, final_image, wait=True
+    )
+
+    assert final_image is image
+    assert isinstance(initial_image, EncodedImage)
+    assert processor.writer.store.get(initial_name) == base_encoding
+    assert processor.writer.store.get(final_name) == encode_image(image, "JPEG")
+    assert initial_name != final_name
+    # Saved again in another format, it is still the generated image.
+    png_name = processor.save_image(initial_image, "png")
+    png = Image.open(BytesIO(processor.writer.store.get(png_name)))
+    assert png.convert("RGB").getcolors() == [(320 * 200, (255, 255, 255))]
+
+
+def test_shared_images_are_not_modified(style, monkeypatch):
+    monkeypatch.setattr(Config, "PIPELINE_SINGLE_COPY", True)
+    image = Image.new("RGB", (320, 200), color="white")
+    image.info[SHARED_INFO_KEY] = True
+    service = OfferGeneratorService(
+        Generator(image), Generator(image), ImageProcessor()
+    )
+
+    _, initial_image, final_image = service.generate_offer("spa", 5, style)
+
+    assert initial_image is image
+    assert final_image is not image
+    assert image.getcolors() == [(320 * 200, (255, 255, 255))]
+
+
+def test_single_copy_lowers_peak_rss(tmp_path):
+    copy = peak_rss_kb(tmp_path, "copy")
+    single = peak_rss_kb(tmp_path, "single")
+
+    assert copy - single > BUFFER_KB // 2
+
+
+def test_budget_bounds_peak_rss(tmp_path):
+    unbounded = peak_rss_kb(tmp_path, "single", offers=8)
+    bounded = peak_rss_kb(tmp_path, "single", offers=8, budget=2)
+
+    assert bounded < unbounded / 2
+    assert bounded < 4 * BUFFER_KB
+
+
+def test_pending_provider_calls_do_not_block_render(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "IMAGES_FOLDER", str(tmp_path))
+    import api.main as api
+
+    services = ServiceContainer(service_name="local")
+    monkeypatch.setattr(api, "services", services)
+    # Room for the images of a single request at a time.
+    services.memory_budget.total_bytes = Config.MEMORY_BUDGET_PER_REQUEST
+    base_image = services.image_processor.save_image(
+        Image.new("RGB", (64, 64), "white"), kind=KIND_BASE
+    )
+    image_service = services.image_generator.service
+    agenerate_image = image_service.agenerate_image
+    calling, released = [], []
+
+    async def pending_image(prompt):
+        calling[0].set()
+        await released[0].wait()
+        return await agenerate_image(prompt)
+
+    monkeypatch.setattr(image_service, "agenerate_image", pending_image)
+
+    async def scenario():
+        calling.append(asyncio.Event())
+        released.append(asyncio.Event())
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            offer = asyncio.create_task(
+                client.post(
+                    "/generate-offer", json={"prompt": "spa", "cache_mode": "bypass"}
+                )
+            )
+            await calling[0].wait()
+            render_request = {
+                "base_image": base_image,
+                "offer_text": "Spa",
+                "styles": [{}],
+            }
+            rendered = await asyncio.wait_for(
+                client.post("/render", json=render_request), timeout=10
+            )
+            released[0].set()
+            return rendered, await offer
+
+    rendered, offer = asyncio.run(scenario())
+
+    assert rendered.status_code == 200
+    assert offer.status_code == 200
+    assert services.memory_budget.reserved == 0
@@ -0,0 +1,112 @@
+import pytest
+from PIL import Image
+
+from configs.config import Config
+from models import TextStyle
+from services.image_processor import ImageProcessor
+from services.local_service import LocalServiceError, LocalTextService
+from services.metrics import (
+    PROVIDER_ERRORS,
+    STAGE_FAILURES,
+    STAGE_IN_FLIGHT,
+    STAGE_SECONDS,
+    Counter,
+    Histogram,
+    Registry,
+    cache_families,
+    time_stage,
+)
+from services.offer_generator_service import OfferGeneratorService
+
+
+class TextGenerator:
+    def generate_offer_text(self, prompt, word_limit, **kwargs):
+        return f"Offer for {prompt}"
+
+
+class ImageGenerator:
+    def generate_image(self, prompt, **kwargs):
+        return Image.new("RGB", (256, 128), color="white")
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.register(
+        Histogram("latency_seconds", "Latency.", ["stage"], buckets=[0.1, 1])
+    )
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, stage="text")
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{stage="text",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{stage="text",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{stage="text",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{stage="text"} 5.55' in lines
+    assert 'latency_seconds_count{stage="text"} 3' in lines
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    counter = registry.register(Counter("errors_total", "Errors.", ["kind"]))
+    counter.inc(kind='say "hi"\n')
+
+    assert 'errors_total{kind="say \\"hi\\"\\n"} 1' in registry.render()
+
+
+def test_collectors_are_merged_per_family():
+    registry = Registry()
+    registry.register_collector(lambda: cache_families({"font": {"hits": 3}}))
+    text_stats = {"memory_hits": 1, "disk_hits": 1, "misses": 2}
+    registry.register_collector(lambda: cache_families({"text": text_stats}))
+
+    text = registry.render()
+
+    assert text.count("# TYPE offer_cache_hits_total counter") == 1
+    assert 'offer_cache_hits_total{cache="font"} 3' in text
+    assert 'offer_cache_hits_total{cache="text"} 2' in text
+    assert 'offer_cache_hit_ratio{cache="text"} 0.5' in text
+
+
+def test_time_stage_records_failures():
+    count = STAGE_SECONDS.count(stage="test-failure")
+
+    with pytest.raises(ValueError):
+        with time_stage("test-failure"):
+            raise ValueError("boom")
+
+    assert STAGE_SECONDS.count(stage="test-failure") == count + 1
+    assert STAGE_FAILURES.value(stage="test-failure") >= 1
+    assert STAGE_IN_FLIGHT.value(stage="test-failure") == 0
+
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_generate_offer_records_every_stage(concurrent):
+    stages = ("text", "image", "overlay", "layout")
+    counts = {stage: STAGE_SECONDS.count(stage=stage) for stage in stages}
+    service = OfferGeneratorService(TextGenerator(), ImageGenerator(), ImageProcessor())
+    style = TextStyle(
+        font_name=Config.DEFAULT_FONT,
+        font_size=24,
+        position="center",
+        text_color=(0, 0, 0),
+        bg_color=(255, 255, 255),
+        bg_opacity=0.5,
+    )
+
+    service.generate_offer("spa weekend", 10, style, concurrent=concurrent)
+
+    for stage in stages:
+        assert STAGE_SECONDS.count(stage=stage) == counts[stage] + 1
+
+
+def test_provider_failures_are_counted():
+    before = PROVIDER_ERRORS.value(provider="local", kind="LocalServiceError")
+    service = LocalTextService(latency=0, jitter=0, failure_rate=1)
+
+    with pytest.raises(LocalServiceError):
+        service.generate_text("spa weekend", 10)
+
+    after = PROVIDER_ERRORS.value(provider="local", kind="LocalServiceError")
+    assert after == before + 1
@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+import pytest
+from PIL import Image
+
+from configs.config import Config
+from models import TextStyle
+from services.concurrency import ConcurrencyLimiter
+from services.image_processor import ImageProcessor
+from services.offer_generator_service import (
+    OfferGenerationError,
+    OfferGeneratorService,
+)
+
+DELAY = 0.2
+
+
+class SlowTextGenerator:
+    service_name = "slow"
+
+    def generate_offer_text(
+        self, prompt, word_limit, progress_callback=None, **kwargs
+    ):
+        time.sleep(DELAY)
+        if progress_callback:
+            progress_callback(100)
+        return f"Offer for {prompt}"
+
+    async def agenerate_offer_text(
+        self, prompt, word_limit, progress_callback=None, **kwargs
+    ):
+        await asyncio.sleep(DELAY)
+        return f"Offer for {prompt}"
+
+
+class SlowImageGenerator:
+    service_name = "slow"
+
+    def generate_image(self, prompt, progress_callback=None, **kwargs):
+        time.sleep(DELAY)
+        if progress_callback:
+            progress_callback(100)
+        return Image.new("RGB", (256, 128), color="white")
+
+    async def agenerate_image(self, prompt, progress_callback=None, **kwargs):
+        await asyncio.sleep(DELAY)
+        return Image.new("RGB", (256, 128), color="white")
+
+
+class FailingImageGenerator:
+    service_name = "failing"
+
+    def generate_image(self, prompt, progress_callback=None, **kwargs):
+        raise RuntimeError("provider unavailable")
+
+    async def agenerate_image(self, prompt, progress_callback=None, **kwargs):
+        raise RuntimeError("provider unavailable")
+
+
+@pytest.fixture
+def style():
+    return TextStyle(
+        font_name=Config.DEFAULT_FONT,
+        font_size=16,
+        position="center",
+        text_color=(255, 255, 255),
+        bg_color=(0, 0, 0),
+        bg_opacity=0.5,
+    )
+
+
+def test_generate_offer_concurrent(style):
+    service = OfferGeneratorService(
+        SlowTextGenerator(), SlowImageGenerator(), ImageProcessor()
+    )
+    progress = []
+
+    start = time.perf_counter()
+    offer_text, initial_image, final_image = service.generate_offer(
+        "beach resort",
+        5,
+        style,
+        text_progress=progress.append,
+        image_progress=progress.append,
+        concurrent=True,
+    )
+    elapsed = time.perf_counter() - start
+
+    assert offer_text == "Offer for beach resort"
+    assert initial_image.size == final_image.size
+    assert progress == [100, 100]
+    assert elapsed < 2 * DELAY
+
+
+def test_agenerate_offer(style):
+    service = OfferGeneratorService(
+        SlowTextGenerator(), SlowImageGenerator(), ImageProcessor()
+    )
+
+    start = time.perf_counter()
+    offer_text, _, _ = asyncio.run(service.agenerate_offer("spa", 5, style))
+
+    assert offer_text == "Offer for spa"
+    assert time.perf_counter() - start < 2 * DELAY
+
+
+def test_generate_offer_reports_failed_stage(style):
+    service = OfferGeneratorService(
+        SlowTextGenerator(), FailingImageGenerator(), ImageProcessor()
+    )
+
+    with pytest.raises(OfferGenerationError) as exc_info:
+        service.generate_offer("spa", 5, style, concurrent=True)
+    assert exc_info.value.stage == "image"
+
+    with pytest.raises(OfferGenerationError) as exc_info:
+        asyncio.run(service.agenerate_offer("spa", 5, style))
+    assert exc_info.value.stage == "image"
+
+
+def test_concurrency_limiter_bounds_stage():
+    limiter = ConcurrencyLimiter(provider_limits={}, stage_limits={"image": 2})
+    peak = 0
+
+    async def work():
+        nonlocal peak
+        async with limiter.limit("image", provider="slow"):
+            peak = max(peak, limiter.stats()["stage:image"])
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(work() for _ in range(10)))
+
+    asyncio.run(main())
+    assert peak == 2
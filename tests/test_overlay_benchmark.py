@@ -0,0 +1,55 @@
+from benchmarks.common import compare_to_baseline
+from benchmarks.overlay import STAGES, OverlayBenchmark, flatten
+from configs.config import Config
+
+
+def test_overlay_benchmark_measures_every_stage():
+    benchmark = OverlayBenchmark(
+        fonts=[Config.DEFAULT_FONT, "missing.ttf"],
+        sizes=[24],
+        positions=["top-left", "center"],
+        text_lengths=[3],
+        image_sizes=[(256, 128)],
+    )
+    benchmark.run()
+    results = benchmark.results()
+
+    assert set(results["stages"]) == set(STAGES)
+    assert results["stages"]["overlay"]["summary"]["count"] == 2
+    assert set(results["stages"]["overlay"]["by"]["position"]) == {
+        "top-left",
+        "center",
+    }
+    assert results["stages"]["encode"]["peak_bytes"] > 0
+    assert results["failures"] == ["missing.ttf@24: cannot open resource"]
+
+
+def test_compare_to_baseline_flags_regressions():
+    metrics = {"text.p50": 0.013, "overlay.p50": 0.011, "offers_per_sec": 70}
+    baseline = {"text.p50": 0.010, "overlay.p50": 0.010, "offers_per_sec": 100}
+
+    regressions = compare_to_baseline(
+        metrics, baseline, margin=0.2, higher_is_better=("offers_per_sec",)
+    )
+
+    assert [message.split(":")[0] for message in regressions] == [
+        "text.p50",
+        "offers_per_sec",
+    ]
+
+
+def test_flatten_keeps_stage_metrics():
+    results = {
+        "stages": {
+            "text": {
+                "summary": {"p50": 1.0, "p95": 2.0},
+                "peak_bytes": 10,
+                "by": {"font": {"arial.ttf": {"p50": 1.0}}},
+            }
+        }
+    }
+    assert flatten(results) == {
+        "text.p50": 1.0,
+        "text.p95": 2.0,
+        "text.peak_bytes": 10,
+    }
@@ -0,0 +1,143 @@
+import asyncio
+import base64
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from configs.config import Config
+from contaracts.ai_contract import FallbackText, is_fallback
+from generators.text_generator import TextGenerator
+from services.generation_cache import GenerationCache
+from services.openai_service import OpenAIImageService
+from services.provider_scheduler import (
+    ProviderScheduler,
+    ProviderUnavailableError,
+    TokenBucket,
+)
+
+
+class Response:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = Response(headers or {})
+
+
+class Flaky:
+    """Fails with the given errors, then succeeds."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_token_bucket_delays_beyond_capacity():
+    bucket = TokenBucket(per_minute=60, capacity=2)
+
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == pytest.approx(1, abs=0.05)
+    assert bucket.reserve(1) == pytest.approx(2, abs=0.05)
+
+
+def test_retries_rate_limits_honoring_retry_after():
+    scheduler = ProviderScheduler("test", "model", retries=2, backoff=0.01)
+    call = Flaky(StatusError(429, {"retry-after-ms": "100"}), StatusError(503))
+
+    start = time.perf_counter()
+    assert scheduler.call(call) == "ok"
+
+    assert call.calls == 3
+    assert time.perf_counter() - start >= 0.1
+    assert scheduler.stats()["retried"] == 2
+
+
+def test_retry_after_is_capped_at_max_backoff():
+    scheduler = ProviderScheduler("test", "model", retries=1, max_backoff=0.1)
+    call = Flaky(StatusError(429, {"retry-after": "3600"}))
+
+    start = time.perf_counter()
+    assert scheduler.call(call) == "ok"
+    assert time.perf_counter() - start < 1
+
+
+def test_client_errors_are_not_retried():
+    scheduler = ProviderScheduler("test", "model", retries=3, backoff=0.01)
+    call = Flaky(StatusError(400))
+
+    with pytest.raises(ProviderUnavailableError) as error:
+        scheduler.call(call)
+
+    assert call.calls == 1
+    assert isinstance(error.value.error, StatusError)
+    assert scheduler.stats()["failed"] == 1
+
+
+def test_gives_up_after_retries():
+    scheduler = ProviderScheduler("test", "model", retries=1, backoff=0.01)
+    call = Flaky(ConnectionError("reset"), ConnectionError("reset"))
+
+    async def main():
+        return await scheduler.acall(lambda: asyncio.to_thread(call))
+
+    with pytest.raises(ProviderUnavailableError):
+        asyncio.run(main())
+    assert call.calls == 2
+
+
+def test_slow_attempts_are_hedged():
+    scheduler = ProviderScheduler("test", "model", hedge_after=0.05)
+    delays = [1.0, 0.01]
+
+    async def request():
+        delay = delays.pop(0)
+        await asyncio.sleep(delay)
+        return delay
+
+    start = time.perf_counter()
+    assert asyncio.run(scheduler.acall(request)) == 0.01
+    assert time.perf_counter() - start < 0.5
+    assert scheduler.stats()["hedged"] == 1
+    assert scheduler.stats()["hedge_wins"] == 1
+
+
+def test_fallbacks_are_not_cached(tmp_path):
+    generator = TextGenerator(
+        service_name="local", cache=GenerationCache("text", folder=str(tmp_path))
+    )
+    generator.service.generate_text = lambda prompt, word_limit: FallbackText(
+        f"Special offer for {prompt}!", "provider unavailable"
+    )
+
+    text = generator.generate_offer_text("spa weekend", 10)
+
+    assert is_fallback(text)
+    assert generator.cache.stats()["memory_entries"] == 0
+
+
+def test_image_service_only_falls_back_on_provider_failures(monkeypatch):
+    monkeypatch.setattr(Config, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(Config, "OPENAI_IMAGE_RESPONSE_FORMAT", "b64_json")
+    service = OpenAIImageService()
+    data = SimpleNamespace(b64_json=base64.b64encode(b"not an image").decode())
+    service.scheduler = SimpleNamespace(
+        call=lambda request: SimpleNamespace(data=[data])
+    )
+
+    assert is_fallback(service.generate_image("spa"))
+
+    data.b64_json = None
+    with pytest.raises(TypeError):
+        service.generate_image("spa")
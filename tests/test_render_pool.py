@@ -0,0 +1,107 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+from configs.config import Config
+from contaracts.image_store_contract import content_name
+from models import TextStyle
+from services.image_processor import ImageProcessor
+from services.image_store import LocalImageStore
+from services.image_writer import ImageWriter, encode_image
+from services.render_pool import RenderPool
+
+STYLE = TextStyle(
+    font_name=Config.DEFAULT_FONT,
+    font_size=32,
+    position="center",
+    text_color=(255, 255, 255),
+    bg_color=(0, 0, 0),
+    bg_opacity=0.5,
+)
+
+
+@pytest.fixture
+def images_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "IMAGES_FOLDER", str(tmp_path))
+    return str(tmp_path)
+
+
+@pytest.fixture
+def render_pool():
+    pool = RenderPool(workers=1, queue_size=1, min_pixels=64 * 64)
+    yield pool
+    pool.shutdown()
+
+
+def test_render_pool_matches_in_process_rendering(render_pool):
+    image = Image.new("RGB", (320, 200), color=(40, 90, 160))
+    expected = ImageProcessor().overlay_text_on_image(image.copy(), "Offer", STYLE)
+
+    rendered = render_pool.render(image, "Offer", STYLE, "JPEG")
+
+    assert rendered.image.tobytes() == expected.tobytes()
+    assert rendered.data == encode_image(expected, "JPEG")
+    # The base image is left untouched.
+    assert image.getpixel((160, 100)) == (40, 90, 160)
+    assert render_pool.stats()["submitted"] == 1
+
+
+def test_render_pool_renders_tiny_images_in_process(render_pool):
+    image = Image.new("RGB", (32, 32), color="white")
+
+    rendered = render_pool.render(image, "Hi", STYLE)
+
+    assert rendered.data is None
+    assert rendered.image.size == (32, 32)
+    assert render_pool.stats()["in_process"] == 1
+    assert render_pool.stats()["submitted"] == 0
+
+
+def test_restart_finishes_queued_renders():
+    render_pool = RenderPool(workers=1, queue_size=8, min_pixels=64 * 64)
+    render_pool.start()
+    images = [
+        Image.effect_noise((1024, 1024), 64 + index).convert("RGB")
+        for index in range(6)
+    ]
+    expected = ImageProcessor().overlay_text_on_image(images[0].copy(), "Offer", STYLE)
+
+    with ThreadPoolExecutor(max_workers=len(images)) as executor:
+        futures = [
+            executor.submit(render_pool.render, image, "Offer", STYLE, "PNG")
+            for image in images
+        ]
+        deadline = time.monotonic() + 10
+        while render_pool.stats()["submitted"] < len(images):
+            assert time.monotonic() < deadline, "renders were not submitted"
+            time.sleep(0.001)
+        # Referenced until the end, so shutting it down can't be skipped by
+        # collecting it first.
+        old_executor = render_pool.executor
+        render_pool.restart()
+        rendered = [future.result() for future in futures]
+    render_pool.shutdown()
+    old_executor.shutdown()
+
+    assert all(result.data is not None for result in rendered)
+    assert rendered[0].image.tobytes() == expected.tobytes()
+    stats = render_pool.stats()
+    assert stats["restarts"] == 1
+    assert stats["failed"] == 0
+
+
+def test_saving_reuses_the_pool_encoding(images_folder, render_pool):
+    processor = ImageProcessor(
+        writer=ImageWriter(store=LocalImageStore()), render_pool=render_pool
+    )
+    image = Image.new("RGB", (320, 200), color="white")
+
+    final_image = processor.render_text(image, "Offer", STYLE)
+    pool_encoding = processor._encoded[id(final_image)][1]
+
+    name = processor.save_image(final_image, "jpg")
+    assert name == content_name(pool_encoding, "jpg")
+    assert processor.writer.store.get(name) == pool_encoding
+    assert processor._encoded == {}
@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+
+from services.image_store import LocalImageStore
+from services.image_writer import ImageWriter
+from services.retention import (
+    KIND_BASE,
+    KIND_FINAL,
+    ImageIndex,
+    ImageRetention,
+    RetentionPolicy,
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalImageStore(str(tmp_path / "images"))
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = ImageIndex(str(tmp_path / "images" / ".index.sqlite3"))
+    yield index
+    index.close()
+
+
+def add(store, index, data, kind):
+    name = store.store(data, "jpg")
+    index.add(name, kind, len(data))
+    return name
+
+
+def test_policies_apply_per_kind(store, index):
+    base = add(store, index, b"base", KIND_BASE)
+    final = add(store, index, b"final", KIND_FINAL)
+    retention = ImageRetention(
+        store,
+        index,
+        policies={
+            KIND_BASE: RetentionPolicy(max_age=0),
+            KIND_FINAL: RetentionPolicy(max_idle=3600),
+        },
+    )
+
+    report = retention.collect()
+
+    assert report.deleted == {KIND_BASE: 1}
+    assert report.bytes_reclaimed == 4
+    assert not store.exists(base)
+    assert store.exists(final)
+    assert list(store.names()) == [final]
+
+
+def test_size_cap_deletes_least_recently_served(store, index):
+    names = []
+    for data in (b"a" * 10, b"b" * 10, b"c" * 10):
+        names.append(add(store, index, data, KIND_FINAL))
+        time.sleep(0.01)
+    index.touch(names[0])
+    retention = ImageRetention(store, index, policies={}, max_bytes=20)
+
+    dry_run = retention.collect(dry_run=True)
+    assert dry_run.deleted == {KIND_FINAL: 1}
+    assert all(store.exists(name) for name in names)
+
+    report = retention.collect()
+    assert report.bytes_reclaimed == 10
+    assert report.bytes_remaining == 20
+    assert [store.exists(name) for name in names] == [True, False, True]
+    assert retention.stats()["deleted"][KIND_FINAL] == 1
+
+
+def test_images_stored_again_are_kept(store, index):
+    name = add(store, index, b"offer", KIND_FINAL)
+    (row,) = index.least_recently_used()
+    time.sleep(0.01)
+    add(store, index, b"offer", KIND_FINAL)
+
+    assert not index.remove_unused(name, row[3])
+    assert store.exists(name)
+
+
+class SlowDeleteStore(LocalImageStore):
+    """Deletes only once resumed, to write while a pass is deleting."""
+
+    def __init__(self, folder):
+        super().__init__(folder)
+        self.deleting = threading.Event()
+        self.resume = threading.Event()
+
+    def delete(self, name):
+        self.deleting.set()
+        self.resume.wait(5)
+        return super().delete(name)
+
+
+def test_image_written_during_its_deletion_is_kept(tmp_path, index):
+    store = SlowDeleteStore(str(tmp_path / "images"))
+    writer = ImageWriter(workers=1, store=store, index=index)
+    name = add(store, index, b"offer", KIND_FINAL)
+    retention = ImageRetention(
+        store, index, policies={KIND_FINAL: RetentionPolicy(max_age=0)}
+    )
+
+    collecting = threading.Thread(target=retention.collect)
+    collecting.start()
+    assert store.deleting.wait(5)
+    writing = threading.Thread(target=writer.write, args=(None, "jpg", b"offer"))
+    writing.start()
+    time.sleep(0.05)
+    store.resume.set()
+    collecting.join()
+    writing.join()
+    writer.shutdown()
+
+    assert store.get(name) == b"offer"
+    assert index.total_bytes() == 5
+
+
+def test_new_index_learns_about_stored_images(store, tmp_path):
+    store.put("1700000000_spa_initial.jpg", b"base")
+    name = store.store(b"final", "jpg")
+    index = ImageIndex(str(tmp_path / "images" / ".index.sqlite3"))
+    retention = ImageRetention(
+        store, index, policies={KIND_BASE: RetentionPolicy(max_age=0)}
+    )
+
+    report = retention.collect()
+
+    assert report.deleted == {KIND_BASE: 1}
+    assert list(store.names()) == [name]
+    assert index.total_bytes() == 5
+    index.close()
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from generators.text_generator import TextGenerator
+from services.metrics import COALESCED_CALLS
+from services.single_flight import SingleFlight
+
+DELAY = 0.2
+
+
+class CountingCall:
+    def __init__(self, error: Exception = None):
+        self.calls = 0
+        self.error = error
+        self._lock = threading.Lock()
+
+    def __call__(self, value):
+        with self._lock:
+            self.calls += 1
+        time.sleep(DELAY)
+        if self.error:
+            raise self.error
+        return f"result for {value}"
+
+    async def acall(self, value):
+        with self._lock:
+            self.calls += 1
+        await asyncio.sleep(DELAY)
+        if self.error:
+            raise self.error
+        return f"result for {value}"
+
+
+def test_threads_share_one_call():
+    flight = SingleFlight("test")
+    call = CountingCall()
+    saved = COALESCED_CALLS.value(name="test")
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: flight.do("spa", call, "spa"), range(4)))
+
+    assert results == ["result for spa"] * 4
+    assert call.calls == 1
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 3}
+    assert COALESCED_CALLS.value(name="test") == saved + 3
+
+
+def test_callers_learn_whether_the_result_is_shared():
+    flight = SingleFlight("test")
+    call = CountingCall()
+
+    async def main():
+        return await asyncio.gather(
+            *(flight.ado_shared("spa", call.acall, "spa") for _ in range(2))
+        )
+
+    assert asyncio.run(main()) == [("result for spa", True)] * 2
+    assert flight.do_shared("spa", call, "spa") == ("result for spa", False)
+    assert flight.do_shared(None, call, "spa") == ("result for spa", False)
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight("test")
+    call = CountingCall(error=RuntimeError("provider unavailable"))
+
+    async def main():
+        return await asyncio.gather(
+            *(flight.ado("spa", call.acall, "spa") for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(main())
+
+    assert call.calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    # A failed call is not reused by later callers.
+    with pytest.raises(RuntimeError):
+        flight.do("spa", call, "spa")
+    assert call.calls == 2
+
+
+def test_cancelled_leader_does_not_fail_waiters():
+    flight = SingleFlight("test")
+    call = CountingCall()
+
+    async def main():
+        leader = asyncio.ensure_future(flight.ado("spa", call.acall, "spa"))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.ado("spa", call.acall, "spa"))
+        await asyncio.sleep(DELAY / 2)
+        leader.cancel()
+        return await waiter, leader.cancelled()
+
+    assert asyncio.run(main()) == ("result for spa", True)
+    assert call.calls == 1
+
+
+def test_call_is_cancelled_when_every_waiter_is():
+    flight = SingleFlight("test")
+    call = CountingCall()
+
+    async def main():
+        callers = [
+            asyncio.ensure_future(flight.ado("spa", call.acall, "spa"))
+            for _ in range(2)
+        ]
+        await asyncio.sleep(DELAY / 2)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        return await flight.ado("spa", call.acall, "spa")
+
+    assert asyncio.run(main()) == "result for spa"
+    assert call.calls == 2
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_threads_and_coroutines_share_one_call():
+    flight = SingleFlight("test")
+    call = CountingCall()
+
+    async def main():
+        waiter = asyncio.ensure_future(asyncio.to_thread(flight.do, "spa", call, "spa"))
+        await asyncio.sleep(DELAY / 4)
+        return await asyncio.gather(waiter, flight.ado("spa", call.acall, "spa"))
+
+    assert asyncio.run(main()) == ["result for spa", "result for spa"]
+    assert call.calls == 1
+
+
+def test_text_generator_coalesces_identical_prompts():
+    generator = TextGenerator(service_name="local")
+    generator.cache = None
+    calls = []
+    generate = generator.service.generate_text
+
+    def slow_generate(prompt, word_limit):
+        calls.append(prompt)
+        time.sleep(DELAY)
+        return generate(prompt, word_limit)
+
+    generator.service.generate_text = slow_generate
+    prompts = ["spa weekend"] * 3 + ["ski trip"]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        texts = list(executor.map(generator.generate_offer_text, prompts, [10] * 4))
+
+    assert sorted(calls) == ["ski trip", "spa weekend"]
+    assert texts[0] == texts[1] == texts[2] != texts[3]
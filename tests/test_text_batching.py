@@ -0,0 +1,179 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.schemas import OfferRequest
+from configs.config import Config
+from generators.text_generator import TextGenerator
+from services.batch import TextPrefetcher
+from services.concurrency import ConcurrencyLimiter
+from services.container import ServiceContainer
+from services.generation_cache import GenerationCache
+from services.metrics import TEXT_BATCH_ITEMS
+from services.openai_service import OpenAITextService
+
+
+def completion(*contents):
+    return SimpleNamespace(
+        choices=[
+            SimpleNamespace(index=index, message=SimpleNamespace(content=content))
+            for index, content in enumerate(contents)
+        ]
+    )
+
+
+class Completions:
+    """Chat completions client replying with the given completions in turn."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.replies.pop(0)
+
+
+class AsyncCompletions(Completions):
+    async def create(self, **kwargs):
+        return super().create(**kwargs)
+
+
+@pytest.fixture(autouse=True)
+def openai_key(monkeypatch):
+    # The clients are replaced, but building the service needs a key.
+    monkeypatch.setattr(Config, "OPENAI_API_KEY", "test-key")
+
+
+def openai_service(completions):
+    service = OpenAITextService()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    if isinstance(completions, AsyncCompletions):
+        service.async_client = client
+    else:
+        service.client = client
+    return service
+
+
+def test_batched_reply_is_split_per_prompt():
+    reply = {"offers": [{"id": 1, "offer": "Ski more"}, {"id": 0, "offer": '"Spa"'}]}
+    completions = Completions(
+        completion("```json\n" + json.dumps(reply) + "\n```"),
+        completion("Golf, one by one"),
+    )
+    service = openai_service(completions)
+    single = TEXT_BATCH_ITEMS.value(provider="openai", outcome="single")
+
+    texts = service.generate_texts([("spa", 5), ("ski", 5), ("golf", 5)])
+
+    assert texts == ["Spa", "Ski more", "Golf, one by one"]
+    assert len(completions.calls) == 2
+    assert '"prompt": "golf"' in completions.calls[0]["messages"][1]["content"]
+    assert TEXT_BATCH_ITEMS.value(provider="openai", outcome="single") == single + 1
+
+
+def test_unparsable_replies_fall_back_to_single_calls():
+    completions = AsyncCompletions(
+        completion("Here are your offers: ..."),
+        completion("Spa offer"),
+        completion("Ski offer"),
+    )
+    service = openai_service(completions)
+
+    texts = asyncio.run(service.agenerate_texts([("spa", 5), ("ski", 5)]))
+
+    assert sorted(texts) == ["Ski offer", "Spa offer"]
+    assert len(completions.calls) == 3
+
+
+def test_candidates_are_the_choices_of_one_call():
+    completions = Completions(completion("First", "  ", "Third"), completion("Second"))
+    service = openai_service(completions)
+
+    assert service.generate_candidates("spa", 5, 3) == ["First", "Second", "Third"]
+    assert completions.calls[0]["n"] == 3
+    assert "n" not in completions.calls[1]
+
+
+def test_uncached_texts_are_generated_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "TEXT_BATCH_SIZE", 2)
+    generator = TextGenerator(
+        service_name="local", cache=GenerationCache("text", folder=str(tmp_path))
+    )
+    batches = []
+    generate_texts = generator.service.generate_texts
+
+    def record(requests):
+        batches.append([prompt for prompt, _ in requests])
+        return generate_texts(requests)
+
+    monkeypatch.setattr(generator.service, "generate_texts", record)
+    cached = generator.generate_offer_text("spa", 5)
+    requests = [("spa", 5), ("ski", 5), ("golf", 5), ("ski", 5), ("dine", 5)]
+
+    texts = generator.generate_offer_texts(requests)
+
+    assert batches == [["ski", "golf"], ["dine"]]
+    assert texts[0] == cached
+    assert texts[1] == texts[3] == generator.service.generate_text("ski", 5)
+    generator.service.generate_text = pytest.fail
+    assert generator.generate_offer_text("golf", 5) == texts[2]
+
+
+def test_batch_texts_are_prefetched_a_window_ahead(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "TEXT_BATCH_SIZE", 1)
+    generator = TextGenerator(
+        service_name="local", cache=GenerationCache("text", folder=str(tmp_path))
+    )
+    limiter = ConcurrencyLimiter(provider_limits={"local": 1}, stage_limits={})
+    prompts, running, most_running = [], [0], [0]
+    agenerate_texts = generator.service.agenerate_texts
+
+    async def record(requests):
+        running[0] += 1
+        most_running[0] = max(most_running[0], running[0])
+        await asyncio.sleep(0.01)
+        prompts.extend(prompt for prompt, _ in requests)
+        running[0] -= 1
+        return await agenerate_texts(requests)
+
+    monkeypatch.setattr(generator.service, "agenerate_texts", record)
+    offer_requests = [OfferRequest(prompt=f"offer {n}", word_limit=5) for n in range(6)]
+    prefetcher = TextPrefetcher(generator, offer_requests, limiter=limiter, window=2)
+
+    async def work():
+        prefetching = asyncio.create_task(prefetcher.arun())
+        await prefetcher.aready(0)
+        await asyncio.sleep(0.1)
+        # The third window waits until an item of the second one starts.
+        assert sorted(prompts) == ["offer 0", "offer 1", "offer 2", "offer 3"]
+        await prefetcher.aready(2)
+        await prefetching
+
+    asyncio.run(work())
+
+    assert sorted(prompts) == [f"offer {n}" for n in range(6)]
+    # One provider slot per batched call, not one for the whole prefetch.
+    assert most_running[0] == 1
+    generator.service.generate_text = pytest.fail
+    assert generator.generate_offer_text("offer 5", 5)
+
+
+def test_offer_texts_api(monkeypatch):
+    import api.main as api
+
+    monkeypatch.setattr(api, "services", ServiceContainer(service_name="local"))
+    client = TestClient(api.app)
+
+    response = client.post(
+        "/generate-offer-texts", json={"prompt": "spa", "word_limit": 4, "count": 3}
+    )
+
+    candidates = response.json()["candidates"]
+    assert len(set(candidates)) == 3
+    assert all(len(text.split()) == 4 for text in candidates)
+    too_many = {"prompt": "spa", "count": Config.TEXT_MAX_CANDIDATES + 1}
+    assert client.post("/generate-offer-texts", json=too_many).status_code == 422
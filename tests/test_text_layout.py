@@ -0,0 +1,108 @@
+from dataclasses import replace
+
+import pytest
+from PIL import Image
+from pydantic import ValidationError
+
+from api.schemas import StyleRequest
+from configs.config import Config
+from models import TextStyle
+from services.font_cache import font_cache
+from services.image_processor import ImageProcessor
+from services.text_layout import (
+    balance_lines,
+    glyph_metrics_cache,
+    layout_text,
+    wrap_words,
+)
+
+LONG_TEXT = (
+    "Escape to our oceanfront suites this summer and enjoy breakfast, spa "
+    "access and a free room upgrade when you stay three nights or more"
+)
+STYLE = TextStyle(
+    font_name=Config.DEFAULT_FONT,
+    font_size=72,
+    position="center",
+    text_color=(255, 255, 255),
+    bg_color=(0, 0, 0),
+    bg_opacity=0.5,
+)
+
+
+def test_glyph_metrics_scale_with_the_font_size():
+    metrics = glyph_metrics_cache.get(Config.DEFAULT_FONT)
+    font = font_cache.get(Config.DEFAULT_FONT, 40)
+
+    estimate = metrics.width("Oceanfront suite") * 40
+
+    assert abs(estimate - font.getlength("Oceanfront suite")) < 3
+
+
+def test_wrap_words_respects_the_width():
+    metrics = glyph_metrics_cache.get(Config.DEFAULT_FONT)
+    words = LONG_TEXT.split()
+
+    lines = wrap_words(words, metrics, 8.0)
+
+    assert len(lines) > 1
+    assert " ".join(lines).split() == words
+    assert all(metrics.width(line) <= 8.0 for line in lines)
+
+
+def test_balance_lines_evens_out_the_lines():
+    metrics = glyph_metrics_cache.get(Config.DEFAULT_FONT)
+    words = "Two nights for the price of one".split()
+
+    greedy = wrap_words(words, metrics, 12.0)
+    balanced = balance_lines(words, metrics, 12.0)
+
+    def spread(lines):
+        widths = [metrics.width(line) for line in lines]
+        return max(widths) - min(widths)
+
+    assert len(balanced) == len(greedy) == 2
+    assert spread(balanced) < spread(greedy)
+
+
+def test_auto_fit_shrinks_long_text_into_the_box():
+    layout = layout_text(LONG_TEXT, STYLE, (1024, 512))
+    width, height = layout.size
+
+    # The box is 0.9 x 0.5 of the image, less the padding at size 72.
+    assert width <= 0.9 * 1024 - 28 and height <= 0.5 * 512 - 28
+    assert "\n" in layout.text
+    assert 48 <= layout.font_size < 72
+
+
+def test_short_text_keeps_the_font_size():
+    layout = layout_text("Stay 3, pay 2", STYLE, (1792, 1024))
+
+    assert layout.font_size == 72
+    assert layout.text == "Stay 3, pay 2"
+
+
+def test_layout_can_be_disabled():
+    style = replace(STYLE, wrap=False, auto_fit=False)
+
+    layout = layout_text(LONG_TEXT, style, (1024, 1024))
+
+    assert layout.font_size == 72
+    assert layout.text == LONG_TEXT
+
+
+def test_overlay_keeps_long_text_inside_the_image():
+    image = Image.new("RGB", (1024, 1024), color=(0, 0, 0))
+    style = replace(STYLE, bg_opacity=0, text_color=(255, 255, 255))
+
+    ImageProcessor().overlay_text_on_image(image, LONG_TEXT, style)
+
+    left, top, right, bottom = image.getbbox()
+    assert left > 0 and top > 0 and right < 1024 and bottom < 1024
+
+
+def test_style_requests_accept_the_configured_alignments():
+    for align in Config.TEXT_ALIGNMENTS:
+        assert StyleRequest(align=align).to_text_style().align == align
+    with pytest.raises(ValidationError):
+        StyleRequest(align="justify")
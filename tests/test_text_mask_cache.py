@@ -0,0 +1,82 @@
+from dataclasses import replace
+
+from PIL import Image, ImageChops, ImageDraw
+
+from configs.config import Config
+from models import TextStyle
+from services.image_processor import ImageProcessor
+from services.text_layout import layout_text
+from services.text_mask_cache import TextMaskCache, text_mask_cache
+
+STYLE = TextStyle(
+    font_name=Config.DEFAULT_FONT,
+    font_size=40,
+    position="center",
+    text_color=(255, 200, 0),
+    bg_color=(0, 0, 0),
+    bg_opacity=0.5,
+)
+
+
+def test_masks_are_reused_across_colors():
+    cache = TextMaskCache()
+    layout = layout_text("Stay 3, pay 2", STYLE, (800, 400))
+
+    first = cache.get(layout, STYLE.font_name, STYLE.align)
+    second = cache.get(layout, STYLE.font_name, STYLE.align)
+
+    assert first is second
+    assert first.mode == "L" and first.size == layout.size
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_cache_is_bounded_by_bytes():
+    layouts = [
+        layout_text(f"Offer number {index}", STYLE, (800, 400)) for index in range(3)
+    ]
+    mask_bytes = layouts[0].size[0] * layouts[0].size[1]
+    cache = TextMaskCache(max_bytes=int(mask_bytes * 2.5))
+
+    for layout in layouts:
+        cache.get(layout, STYLE.font_name, STYLE.align)
+
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+    cache.invalidate(STYLE.font_name)
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["bytes"] == 0
+
+
+def test_overlay_matches_drawing_the_text():
+    processor = ImageProcessor()
+    text = "Stay 3, pay 2 this summer"
+    for position in ("center", "top-left", "bottom-right"):
+        style = replace(STYLE, position=position)
+        base = Image.effect_noise((800, 400), 60).convert("RGB")
+
+        overlaid = processor.overlay_text_on_image(base.copy(), text, style)
+
+        expected = base.copy()
+        draw = ImageDraw.Draw(expected, "RGBA")
+        layout = layout_text(text, style, expected.size)
+        width, height = layout.size
+        padding = max(5, int(layout.font_size * 0.2))
+        x, y = processor.calculate_text_position((width, height), base.size, style)
+        draw.rectangle(
+            (x - padding, y - padding, x + width + padding, y + height + padding),
+            fill=style.bg_color + (int(style.bg_opacity * 255),),
+        )
+        draw.multiline_text(
+            (x - layout.bbox[0], y - layout.bbox[1]),
+            layout.text,
+            font=layout.font,
+            fill=style.text_color,
+            spacing=layout.spacing,
+            align=style.align,
+        )
+        assert ImageChops.difference(overlaid, expected).getbbox() is None
+
+    assert text_mask_cache.stats()["hits"] >= 2